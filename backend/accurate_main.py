@@ -1,14 +1,29 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import pandas as pd
-from typing import List, Dict, Any
+import numpy as np
+from typing import IO, Any, Callable, Dict, List
 import json
+from collections import deque
+import asyncio
+import functools
+import hashlib
+import hmac
+import inspect
+import sqlite3
+import zipfile
 from datetime import datetime, timedelta
 import os
+import uuid
 import yfinance as yf
 import uvicorn
-from sqlmodel import SQLModel, Field, Session, create_engine, select
+from sqlmodel import SQLModel, Field, Session, create_engine, select, func
+from sqlalchemy import Index, bindparam, event, insert, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 import random
 import string
 from passlib.context import CryptContext
@@ -16,6 +31,13 @@ from jose import jwt, JWTError
 from pydantic import BaseModel, EmailStr
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
+from alembic import command as alembic_command
+from alembic.config import Config as AlembicConfig
+import analytics
+from broker_parsers import TransactionStream
+from lots import LotBook, Position
+from memo import MEMO_BACKENDS, SQLiteMemoStore, VersionedMemo
+from responses import SERIES_FORMATS, series_response
 
 app = FastAPI(title="Stock Portfolio Visualizer", version="1.0.0")
 
@@ -43,11 +65,113 @@ portfolio_data = {
 # =====================
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./portfolio.db")
-# For SQLite, allow access across threads in the ASGI server
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL, echo=False)
+
+# Engine tuning profiles. "production" runs SQLite in WAL mode so readers are not blocked
+# behind upload write transactions; "basic" keeps SQLite's defaults (rollback journal).
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+DB_PROFILES: Dict[str, Dict[str, Any]] = {
+    "basic": {
+        "sqlite_pragmas": {},
+    },
+    "production": {
+        "sqlite_pragmas": {
+            "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+            "cache_size": int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")) * -1,  # negative = KiB
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+            "temp_store": "MEMORY",
+        },
+    },
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return ":memory:" in url or url.split("?")[0].rstrip("/").split("://")[-1] == ""
+
+
+def _engine_options(url: str, profile: str) -> Dict[str, Any]:
+    """Pool and connect arguments for `url` under the named tuning profile (shared by the sync and async engines)."""
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {sorted(DB_PROFILES)}")
+    if url.startswith("sqlite"):
+        # For SQLite, allow access across threads in the ASGI server
+        options: Dict[str, Any] = {"echo": False, "connect_args": {"check_same_thread": False}}
+        if _is_memory_sqlite(url):
+            # One shared connection, otherwise every pooled connection sees its own empty DB
+            options["poolclass"] = StaticPool
+        else:
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    return {
+        "echo": False,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _install_sqlite_pragmas(sync_engine, profile: str) -> None:
+    pragmas = DB_PROFILES[profile]["sqlite_pragmas"]
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _sync_database_url(url: str) -> str:
+    """Driver URL for the sync engine: bare Postgres URLs use psycopg, the driver in requirements.txt."""
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("postgresql", "postgres"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return url
+
+
+def _create_engine(url: str, profile: str = DB_PROFILE):
+    """Build the SQLAlchemy engine for `url` using the named tuning profile."""
+    url = _sync_database_url(url)
+    options = _engine_options(url, profile)
+    if url.startswith("sqlite") and "poolclass" not in options:
+        options["poolclass"] = QueuePool
+    sync_engine = create_engine(url, **options)
+    if url.startswith("sqlite"):
+        _install_sqlite_pragmas(sync_engine, profile)
+    return sync_engine
+
+
+def _async_database_url(url: str) -> str:
+    """Async driver URL for a sync DATABASE_URL: aiosqlite for SQLite, psycopg's async mode for Postgres."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+psycopg{sep}{rest}"
+    return url
+
+
+def _create_async_engine(url: str, profile: str = DB_PROFILE) -> AsyncEngine:
+    """Async counterpart of _create_engine() with the same pool sizing and SQLite pragmas."""
+    options = _engine_options(url, profile)
+    async_engine = create_async_engine(_async_database_url(url), **options)
+    if url.startswith("sqlite"):
+        _install_sqlite_pragmas(async_engine.sync_engine, profile)
+    return async_engine
+
+
+engine = _create_engine(DATABASE_URL)
+# Used by the request handlers on hot read paths so queries don't block the event loop.
+# ASYNC_DATABASE_URL overrides the driver URL derived from DATABASE_URL.
+async_engine = _create_async_engine(os.getenv("ASYNC_DATABASE_URL") or DATABASE_URL)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -68,6 +192,10 @@ class User(SQLModel, table=True):
 
 class TransactionRecord(SQLModel, table=True):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_date", "user_id", "date"),
+        Index("ix_transactions_user_row_hash", "user_id", "row_hash"),
+    )
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(index=True)
     date: str
@@ -76,16 +204,69 @@ class TransactionRecord(SQLModel, table=True):
     quantity: float
     price: float
     amount: float
+    account: str | None = Field(default=None, index=True)  # source export (file name) the row came from
+    row_hash: str | None = Field(default=None, index=True)  # fingerprint of (date, action, symbol, qty, amount)
+
+
+class TransactionUpload(SQLModel, table=True):
+    __tablename__ = "transaction_uploads"
+    __table_args__ = (Index("ix_transaction_uploads_user_file_hash", "user_id", "file_hash"),)
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True)
+    file_hash: str = Field(index=True)  # sha256 of the raw uploaded file
+    filename: str | None = None
+    account: str | None = None
+    uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    rows_total: int = Field(default=0)
+    rows_inserted: int = Field(default=0)
 
 
 class PortfolioHistoryRecord(SQLModel, table=True):
     __tablename__ = "portfolio_history"
+    __table_args__ = (Index("ix_portfolio_history_user_date", "user_id", "date"),)
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(index=True)
     date: str
     total_value: float
     spy_price: float | None = None
     positions_json: str = Field(default="[]")
+    growth_index: float | None = None  # Π(1+r_t) from the user's first snapshot through this one
+    growth_steps: int | None = None  # number of daily returns compounded into growth_index
+
+
+class PortfolioLatest(SQLModel, table=True):
+    """Copy of each user's most recent portfolio_history row, kept in sync by the history rebuild."""
+    __tablename__ = "portfolio_latest"
+    user_id: int = Field(primary_key=True)
+    date: str
+    total_value: float
+    spy_price: float | None = None
+    positions_json: str = Field(default="[]")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DatabaseIdentity(SQLModel, table=True):
+    """A random id minted with the database; a recreated database gets a new one."""
+    __tablename__ = "database_identity"
+    id: str = Field(primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class PortfolioSummary(SQLModel, table=True):
+    """Per-user dashboard numbers, recomputed whenever an upload or revaluation finishes."""
+    __tablename__ = "portfolio_summary"
+    user_id: int = Field(primary_key=True)
+    transaction_count: int = Field(default=0)
+    positions_count: int = Field(default=0)
+    latest_value: float = Field(default=0.0)
+    twr: float = Field(default=0.0)
+    twr_pct: float = Field(default=0.0)
+    twr_days: int = Field(default=0)
+    annualized_pct: float = Field(default=0.0)
+    history_start: str | None = None
+    history_end: str | None = None
+    data_version: int = Field(default=0)  # bumped on every recompute
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class UserProfile(SQLModel, table=True):
@@ -110,6 +291,7 @@ class Group(SQLModel, table=True):
 
 class GroupMember(SQLModel, table=True):
     __tablename__ = "group_members"
+    __table_args__ = (Index("ix_group_members_group_user", "group_id", "user_id"),)
     id: int | None = Field(default=None, primary_key=True)
     group_id: int = Field(index=True)
     user_id: int = Field(index=True)
@@ -123,6 +305,7 @@ class GroupMember(SQLModel, table=True):
 
 class WeeklyUpload(SQLModel, table=True):
     __tablename__ = "weekly_uploads"
+    __table_args__ = (Index("ix_weekly_uploads_group_user_week", "group_id", "user_id", "week_start"),)
     id: int | None = Field(default=None, primary_key=True)
     group_id: int = Field(index=True)
     user_id: int = Field(index=True)
@@ -134,6 +317,7 @@ class WeeklyUpload(SQLModel, table=True):
 
 class WeeklyTransaction(SQLModel, table=True):
     __tablename__ = "weekly_transactions"
+    __table_args__ = (Index("ix_weekly_transactions_group_user_week", "group_id", "user_id", "week_start"),)
     id: int | None = Field(default=None, primary_key=True)
     group_id: int = Field(index=True)
     user_id: int = Field(index=True)
@@ -164,6 +348,7 @@ class WeeklyStats(SQLModel, table=True):
 
 class PriceCacheDaily(SQLModel, table=True):
     __tablename__ = "price_cache_daily"
+    __table_args__ = (Index("ix_price_cache_daily_symbol_date", "symbol", "date"),)
     id: int | None = Field(default=None, primary_key=True)
     symbol: str = Field(index=True)
     date: str = Field(index=True)  # YYYY-MM-DD
@@ -255,8 +440,17 @@ class UserResponse(BaseModel):
     created_at: datetime
 
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
 def create_db_and_tables() -> None:
-    SQLModel.metadata.create_all(engine)
+    """Bring the schema up to date by running the Alembic migrations in backend/migrations."""
+    config = AlembicConfig()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.attributes["target_metadata"] = SQLModel.metadata
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        alembic_command.upgrade(config, "head")
 
 
 def get_session() -> Session:
@@ -264,6 +458,33 @@ def get_session() -> Session:
         yield session
 
 
+async def get_async_session() -> AsyncSession:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def _bulk_insert(session: Session, model: type[SQLModel], rows: List[Dict[str, Any]]) -> int:
+    """
+    Write plain dict rows for `model` in one round trip, bypassing ORM unit-of-work bookkeeping.
+    Uses COPY ... FROM STDIN when running on Postgres through psycopg, and a Core
+    insert() executemany everywhere else. Rows must all carry the same keys.
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg":
+        columns = list(rows[0].keys())
+        conn = session.connection().connection.driver_connection
+        with conn.cursor() as cur:
+            with cur.copy(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row[c] for c in columns])
+    else:
+        session.execute(insert(table), rows)
+    return len(rows)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -279,7 +500,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)) -> User:
     credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -288,55 +509,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: Session
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = session.exec(select(User).where(User.email == email)).first()
+    user = (await session.exec(select(User).where(User.email == email))).first()
     if not user:
         raise credentials_exception
     return user
 
 
+def _database_identity() -> str:
+    """This database's id (see DatabaseIdentity), minted if the row is missing."""
+    with Session(engine) as session:
+        identity = session.exec(select(DatabaseIdentity)).first()
+        if identity is None:
+            identity = DatabaseIdentity(id=uuid.uuid4().hex)
+            session.add(identity)
+            session.commit()
+        return identity.id
+
+
 @app.on_event("startup")
 def on_startup_event():
     create_db_and_tables()
-
-def _parse_number(value: Any) -> float:
-    """Parse numbers that may contain commas, dollar signs, or parentheses negatives."""
-    try:
-        if pd.isna(value):
-            return 0.0
-        if isinstance(value, (int, float)):
-            return float(value)
-        s = str(value).strip()
-        if s == "":
-            return 0.0
-        # Parentheses indicate negative numbers in many broker CSVs
-        negative = False
-        if s.startswith("(") and s.endswith(")"):
-            negative = True
-            s = s[1:-1]
-        # Remove currency/commas/whitespace
-        s = s.replace("$", "").replace(",", "").replace("+", "")
-        num = float(s)
-        return -num if negative else num
-    except Exception:
-        return 0.0
-
-def _parse_date(value: Any) -> datetime:
-    """Best-effort date parsing for both Fidelity and Schwab formats.
-    Always returns a valid datetime; falls back to now() if parsing fails.
-    """
-    if isinstance(value, datetime):
-        return value
-    try:
-        ts = pd.to_datetime(value, errors="coerce")
-        # If parsing failed, ts will be NaT
-        if ts is pd.NaT or pd.isna(ts):
-            raise ValueError("Invalid date")
-        # Convert pandas Timestamp/array-like to python datetime
-        if hasattr(ts, "to_pydatetime"):
-            return ts.to_pydatetime()
-        return datetime.fromtimestamp(pd.Timestamp(ts).timestamp())
-    except Exception:
-        return datetime.now()
+    # Shared memo entries computed against another database (user ids restart) must not match
+    analytics_memo.bind(_database_identity())
 
 def get_real_stock_data(symbol: str, start_date: datetime, end_date: datetime) -> Dict[str, float]:
     """Get real historical stock prices using yfinance"""
@@ -419,19 +613,39 @@ def _fetch_close_cached(session: Session, symbol: str, date: str) -> float | Non
         print(f"Price fetch error {symbol} {date}: {e}")
         return None
 
-def _compute_user_weekly_portfolio_twr(session: Session, user_id: int, week_start: str) -> dict:
+def _compute_users_weekly_portfolio_twr(session: Session, user_ids: List[int], week_start: str) -> dict[int, dict]:
     """
-    Compute portfolio time-weighted return for the specific week using
-    PortfolioHistoryRecord equity values. Falls back to zeros if not enough data.
+    Portfolio time-weighted return of each user for the given week, from their
+    PortfolioHistoryRecord equity values, with one query for all boundary snapshots. Users
+    without enough data get zeros.
     """
     start_str, end_str = _get_week_bounds(week_start)
+    edges = _history_edges(session, user_ids, start_str, end_str)
+    return {
+        uid: _weekly_twr_from_edges(session, uid, *edges.get(uid, (None, None)), start_str, end_str)
+        for uid in user_ids
+    }
+
+
+def _weekly_twr_from_edges(session: Session, user_id: int, first, last, start_str: str, end_str: str) -> dict:
+    if first is None or last is None or first.date >= last.date:
+        return {"start": start_str, "end": end_str, "start_value": 0.0, "end_value": 0.0, "twr_pct": 0.0, "gain_usd": 0.0}
+    indexed = _twr_from_index(first, last)
+    if indexed is not None and (first.total_value or 0) > 0 and last.total_value is not None:
+        return {
+            "start": first.date,
+            "end": last.date,
+            "start_value": round(float(first.total_value), 2),
+            "end_value": round(float(last.total_value), 2),
+            "twr_pct": indexed["twr_pct"],
+            "gain_usd": round(float(last.total_value) - float(first.total_value), 2),
+        }
+
     rows = session.exec(
         select(PortfolioHistoryRecord)
         .where((PortfolioHistoryRecord.user_id == user_id) & (PortfolioHistoryRecord.date >= start_str) & (PortfolioHistoryRecord.date <= end_str))
         .order_by(PortfolioHistoryRecord.date)
     ).all()
-    if not rows or len(rows) < 2:
-        return {"start": start_str, "end": end_str, "start_value": 0.0, "end_value": 0.0, "twr_pct": 0.0, "gain_usd": 0.0}
 
     values = [float(r.total_value) for r in rows if r.total_value is not None]
     dates = [r.date for r in rows]
@@ -457,8 +671,15 @@ def _compute_user_weekly_portfolio_twr(session: Session, user_id: int, week_star
         "gain_usd": round(gain, 2),
     }
 
-def _symbol_week_change(session: Session, symbol: str, week_start: str) -> dict:
+def _symbol_week_change(session: Session, symbol: str, week_start: str, closes: dict[tuple[str, str], float] | None = None) -> dict:
+    """Weekly price change of a symbol; `closes` are (symbol, date) closes already read from the price cache."""
     start_str, end_str = _get_week_bounds(week_start)
+
+    def close_on(date: str) -> float | None:
+        if closes is not None and (symbol, date) in closes:
+            return closes[(symbol, date)]
+        return _fetch_close_cached(session, symbol, date)
+
     # Use first trading day on/after week_start for start, and trading day for end
     start_close = None
     # Try exact start_str, else next trading day
@@ -467,53 +688,108 @@ def _symbol_week_change(session: Session, symbol: str, week_start: str) -> dict:
         # forward to Monday->Friday first trading day
         for i in range(0, 5):
             dtry = (sdt + timedelta(days=i)).strftime('%Y-%m-%d')
-            start_close = _fetch_close_cached(session, symbol, dtry)
+            start_close = close_on(dtry)
             if start_close:
                 start_str = dtry
                 break
     except Exception:
         pass
-    end_close = _fetch_close_cached(session, symbol, end_str)
+    end_close = close_on(end_str)
     pct = 0.0
     if start_close and end_close and start_close > 0:
         pct = (end_close - start_close) / start_close * 100.0
     return {"symbol": symbol, "start": start_str, "end": end_str, "start_close": start_close or 0.0, "end_close": end_close or 0.0, "pct": round(pct, 4)}
 
-def _compute_weekly_badges(session: Session, group_id: int, user_id: int, week: str) -> dict:
-    """Compute weekly badges for a user based on held/traded symbols and price changes.
-
-    Returns a structure suitable for UI consumption:
-    { "badges": [ {"key":..., "label":..., "emoji":..., "context":...}, ... ],
-      "biggest_gainer": {symbol, pct} | None, "biggest_loser": {symbol, pct} | None }
-    """
-    # Determine symbols held at end of week
-    start_str, end_str = _get_week_bounds(week)
-    rec = session.exec(
-        select(PortfolioHistoryRecord)
-        .where((PortfolioHistoryRecord.user_id == user_id) & (PortfolioHistoryRecord.date <= end_str))
-        .order_by(PortfolioHistoryRecord.date.desc())
-    ).first()
-
-    held_symbols: set[str] = set()
+def _symbols_week_changes(session: Session, symbols: set[str], week_start: str) -> dict[str, dict]:
+    """{symbol: _symbol_week_change()} in symbol order, reading the cached closes of all of them for the week in one query."""
+    start_str, end_str = _get_week_bounds(week_start)
+    try:
+        sdt = datetime.strptime(start_str, '%Y-%m-%d')
+        days = [(sdt + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(0, 5)] + [end_str]
+    except Exception:
+        days = [start_str, end_str]
+    closes: dict[tuple[str, str], float] = {}
+    if symbols:
+        rows = session.exec(select(PriceCacheDaily).where(PriceCacheDaily.symbol.in_(symbols) & PriceCacheDaily.date.in_(days))).all()
+        for rec in rows:
+            closes.setdefault((rec.symbol, rec.date), rec.close)
+    return {sym: _symbol_week_change(session, sym, week_start, closes) for sym in sorted(symbols)}
+
+def _snapshot_symbols(rec: PortfolioHistoryRecord | None) -> set[str]:
+    """Upper-cased symbols of the positions stored with a history snapshot."""
+    symbols: set[str] = set()
     if rec:
         try:
             for p in json.loads(rec.positions_json or '[]'):
                 sym = (p.get('symbol') or '').upper().strip()
                 if sym:
-                    held_symbols.add(sym)
+                    symbols.add(sym)
         except Exception:
             pass
+    return symbols
 
-    # Include traded symbols during the week
-    weekly_rows = session.exec(select(WeeklyTransaction).where((WeeklyTransaction.group_id == group_id) & (WeeklyTransaction.user_id == user_id) & (WeeklyTransaction.week_start == week))).all()
-    for r in weekly_rows:
-        if r.symbol:
-            held_symbols.add(r.symbol.upper())
 
+def _weekly_trades(session: Session, group_id: int, user_ids: List[int], week: str) -> dict[int, list[WeeklyTransaction]]:
+    """{user_id: weekly transactions} of several members in one query; members without trades are absent."""
+    trades: dict[int, list[WeeklyTransaction]] = {}
+    if not user_ids:
+        return trades
+    rows = session.exec(
+        select(WeeklyTransaction)
+        .where((WeeklyTransaction.group_id == group_id) & (WeeklyTransaction.user_id.in_(user_ids)) & (WeeklyTransaction.week_start == week))
+        .order_by(WeeklyTransaction.id)
+    ).all()
+    for r in rows:
+        trades.setdefault(r.user_id, []).append(r)
+    return trades
+
+
+def _compute_weekly_badges(session: Session, group_id: int, user_id: int, week: str, user_week: dict | None = None) -> dict:
+    """Compute weekly badges for a user based on held/traded symbols and price changes.
+
+    Returns a structure suitable for UI consumption:
+    { "badges": [ {"key":..., "label":..., "emoji":..., "context":...}, ... ],
+      "biggest_gainer": {symbol, pct} | None, "biggest_loser": {symbol, pct} | None }
+    """
+    user_weeks = None if user_week is None else {user_id: user_week}
+    return _compute_members_weekly_badges(session, group_id, [user_id], week, user_weeks)[user_id]
+
+
+def _compute_members_weekly_badges(
+    session: Session,
+    group_id: int,
+    user_ids: List[int],
+    week: str,
+    user_weeks: dict[int, dict] | None = None,
+    symbol_changes: dict[str, dict] | None = None,
+) -> dict[int, dict]:
+    """
+    _compute_weekly_badges() for many members at once: one query for everyone's newest
+    snapshot by the end of the week, one for their trades, and a single weekly change per
+    distinct symbol (plus SPY). `symbol_changes` are changes the caller already has.
+    """
+    # Determine symbols held at end of week, plus the symbols traded during it
+    end_str = _get_week_bounds(week)[1]
+    snapshots = _newest_snapshots(session, user_ids, end_str)
+    trades = _weekly_trades(session, group_id, user_ids, week)
+    scopes: dict[int, set[str]] = {}
+    for uid in user_ids:
+        scopes[uid] = _snapshot_symbols(snapshots.get(uid))
+        scopes[uid].update(r.symbol.upper() for r in trades.get(uid, []) if r.symbol)
+
+    changes = dict(symbol_changes or {})
+    changes.update(_symbols_week_changes(session, set().union({'SPY'}, *scopes.values()) - changes.keys(), week))
+    if user_weeks is None:
+        user_weeks = _compute_users_weekly_portfolio_twr(session, user_ids, week)
+    return {uid: _weekly_badges(scopes[uid], trades.get(uid, []), changes, user_weeks[uid]) for uid in user_ids}
+
+
+def _weekly_badges(held_symbols: set[str], weekly_rows: list[WeeklyTransaction], symbol_changes: dict[str, dict], user_week: dict) -> dict:
+    """Badges of one member from their symbols in scope, their trades and the week's symbol changes (SPY included)."""
     # Compute weekly change for each symbol in scope
     changes: dict[str, dict] = {}
     for sym in sorted(held_symbols):
-        changes[sym] = _symbol_week_change(session, sym, week)
+        changes[sym] = symbol_changes[sym]
 
     # Biggest Winner / Loser (weekly)
     biggest_gainer = None
@@ -539,8 +815,7 @@ def _compute_weekly_badges(session: Session, group_id: int, user_id: int, week:
     to_the_moon = any(c.get('pct', 0.0) >= 50.0 for c in changes.values())
 
     # Always Up (beat the S&P weekly)
-    spy_change = _symbol_week_change(session, 'SPY', week)
-    user_week = _compute_user_weekly_portfolio_twr(session, user_id, week)
+    spy_change = symbol_changes['SPY']
     always_up = False
     try:
         always_up = (user_week.get('twr_pct', 0.0) > (spy_change.get('pct', 0.0)))
@@ -627,37 +902,33 @@ def validate_baseline_date(baseline_date: str, portfolio_start_date: str) -> str
         print(f"Error validating baseline date {baseline_date}: {e}")
         return portfolio_start_date
 
-def rebuild_portfolio_history():
-    """Rebuild portfolio history from transactions using REAL stock prices"""
-    if not portfolio_data["transactions"]:
-        return
-    
-    print("Rebuilding portfolio history with REAL stock prices...")
-    
-    # Sort transactions by date
-    sorted_transactions = sorted(portfolio_data["transactions"], key=lambda x: x['date'])
-    
-    start_date = datetime.strptime(sorted_transactions[0]['date'], '%Y-%m-%d')
-    end_date = datetime.now()
-    
-    # Calculate final positions from all transactions
-    final_positions = {}
-    
-    for trans in sorted_transactions:
+def _accumulate_positions(positions: dict[str, float], transactions: List[Dict[str, Any]]) -> None:
+    """Fold a batch of parsed transactions into running per-symbol share counts."""
+    for trans in transactions:
         symbol = trans['symbol']
         if symbol and symbol != 'Cash':
-            if symbol not in final_positions:
-                final_positions[symbol] = 0
+            if symbol not in positions:
+                positions[symbol] = 0
             
             if 'BOUGHT' in trans['action'] or 'Buy' in trans['action']:
-                final_positions[symbol] += trans['quantity']
+                positions[symbol] += trans['quantity']
             elif 'SOLD' in trans['action'] or 'Sell' in trans['action']:
-                final_positions[symbol] -= abs(trans['quantity'])
+                positions[symbol] -= abs(trans['quantity'])
             elif 'REINVESTMENT' in trans['action']:
-                final_positions[symbol] += trans['quantity']
+                positions[symbol] += trans['quantity']
+
+
+def rebuild_portfolio_history(positions: dict[str, float], start_date: datetime):
+    """Rebuild portfolio history from final positions using REAL stock prices"""
+    if not positions:
+        return
+    
+    print("Rebuilding portfolio history with REAL stock prices...")
+    
+    end_date = datetime.now()
     
     # Remove positions with 0 or negative shares
-    final_positions = {k: v for k, v in final_positions.items() if v > 0}
+    final_positions = {k: v for k, v in positions.items() if v > 0}
     
     print(f"Final positions: {final_positions}")
     
@@ -749,6 +1020,17 @@ def _get_or_create_profile(session: Session, user_id: int) -> UserProfile:
         session.refresh(profile)
     return profile
 
+def _get_or_create_profiles(session: Session, user_ids: List[int]) -> dict[int, UserProfile]:
+    """_get_or_create_profile() for many users: one query, and one commit if any are missing."""
+    statement = select(UserProfile).where(UserProfile.user_id.in_(user_ids))
+    profiles = {p.user_id: p for p in session.exec(statement).all()}
+    missing = [uid for uid in dict.fromkeys(user_ids) if uid not in profiles]
+    if missing:
+        session.add_all(UserProfile(user_id=uid) for uid in missing)
+        session.commit()
+        profiles = {p.user_id: p for p in session.exec(statement).all()}
+    return profiles
+
 @app.get("/")
 async def root():
     return {"message": "Stock Portfolio Visualizer API with REAL DATA", "version": "2.0.0"}
@@ -769,7 +1051,7 @@ class GroupJoin(BaseModel):
     code: str
 
 @app.post("/api/auth/register", response_model=UserResponse)
-async def register(payload: RegisterRequest, session: Session = Depends(get_session)):
+def register(payload: RegisterRequest, session: Session = Depends(get_session)):
     existing = session.exec(select(User).where(User.email == payload.email)).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -781,7 +1063,7 @@ async def register(payload: RegisterRequest, session: Session = Depends(get_sess
 
 
 @app.post("/api/auth/login")
-async def login(payload: LoginRequest, session: Session = Depends(get_session)):
+def login(payload: LoginRequest, session: Session = Depends(get_session)):
     user = session.exec(select(User).where(User.email == str(payload.email).lower())).first()
     if not user or not verify_password(payload.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -793,211 +1075,655 @@ async def login(payload: LoginRequest, session: Session = Depends(get_session)):
 async def me(current_user: User = Depends(get_current_user)):
     return UserResponse(id=current_user.id, email=current_user.email, name=current_user.name, created_at=current_user.created_at)
 
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "5000"))
+# Row fingerprints whose occurrence counts an upload keeps in memory before moving them to disk
+UPLOAD_OCCURRENCE_KEYS = int(os.getenv("UPLOAD_OCCURRENCE_KEYS", "50000"))
+# Fingerprints per `row_hash IN (...)` lookup, well under SQLite's bound-parameter limit
+ROW_HASH_LOOKUP_BATCH = 500
+
+
+def _hash_file(fileobj: IO[bytes], block_size: int = 1 << 20) -> str:
+    """sha256 of a raw upload, read in blocks; leaves the file rewound for parsing."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(block_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def _transaction_fingerprint(t: Dict[str, Any], occurrence: int) -> str:
+    """
+    Stable fingerprint of a parsed transaction row in its account. `occurrence` numbers
+    identical rows of one account within an upload (e.g. two equal buys on the same day) so
+    they are not collapsed into one. The same row in two accounts gets two fingerprints, so
+    which rows are stored does not depend on the order the accounts were uploaded in.
+    """
+    key = (f"{t['account']}|{t['date']}|{t['action']}|{t['symbol']}|"
+           f"{float(t['quantity'] or 0):.6f}|{float(t['amount'] or 0):.2f}|{occurrence}")
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class _OccurrenceCounter:
+    """
+    How often each row fingerprint has been seen so far in one upload. Counts are kept in a
+    dict until it holds more than `max_keys` fingerprints, then moved to a private temporary
+    SQLite database on disk and read back chunk by chunk, so memory stays bounded however
+    many rows a request carries.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self.counts: dict[str, int] = {}
+        self.spill: sqlite3.Connection | None = None
+
+    def __enter__(self) -> "_OccurrenceCounter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def take(self, keys: List[str]) -> List[int]:
+        """Occurrence number of each key in order (0 the first time it is seen), counting it in."""
+        if self.spill is not None:
+            missing = list({k for k in keys if k not in self.counts})
+            for i in range(0, len(missing), ROW_HASH_LOOKUP_BATCH):
+                part = missing[i:i + ROW_HASH_LOOKUP_BATCH]
+                self.counts.update(self.spill.execute(
+                    f"SELECT key, n FROM counts WHERE key IN ({', '.join('?' * len(part))})", part
+                ))
+        occurrences = []
+        for k in keys:
+            n = self.counts.get(k, 0)
+            self.counts[k] = n + 1
+            occurrences.append(n)
+        if len(self.counts) > self.max_keys:
+            if self.spill is None:
+                # An empty file name opens a private on-disk database deleted on close
+                self.spill = sqlite3.connect("")
+                self.spill.execute("CREATE TABLE counts (key TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+            self.spill.executemany("INSERT OR REPLACE INTO counts (key, n) VALUES (?, ?)", self.counts.items())
+            self.counts.clear()
+        return occurrences
+
+
+def _stored_row_hashes(session: Session, user_id: int, row_hashes: List[str]) -> set[str]:
+    """The given fingerprints that are already stored for the user, looked up in index-sized batches."""
+    stored: set[str] = set()
+    for i in range(0, len(row_hashes), ROW_HASH_LOOKUP_BATCH):
+        part = row_hashes[i:i + ROW_HASH_LOOKUP_BATCH]
+        stored.update(session.exec(
+            select(TransactionRecord.row_hash).where((TransactionRecord.user_id == user_id) & TransactionRecord.row_hash.in_(part))
+        ).all())
+    return stored
+
+
+def _positions_from_db(session: Session, user_id: int) -> dict[str, float]:
+    """Final per-symbol share counts from all stored transactions for a user."""
+    positions: dict[str, float] = {}
+    rows = session.execute(
+        select(TransactionRecord.symbol, TransactionRecord.action, TransactionRecord.quantity)
+        .where(TransactionRecord.user_id == user_id)
+    ).mappings()
+    _accumulate_positions(positions, rows)
+    return positions
+
+
+def _held(positions: dict[str, float]) -> dict[str, float]:
+    return {k: round(v, 6) for k, v in positions.items() if v > 0}
+
+
+def _account_from_filename(filename: str) -> str:
+    """Account tag for an uploaded export: the file name without directories or extension."""
+    return os.path.splitext(os.path.basename(filename))[0] or filename
+
+
+def _expand_upload_sources(uploads: List[UploadFile]) -> list[tuple[str, str, Callable[[], IO[bytes]]]]:
+    """Flatten CSV uploads and CSV members of zip archives into (account, filename, opener) sources."""
+    sources: list[tuple[str, str, Callable[[], IO[bytes]]]] = []
+    for upload in uploads:
+        if upload.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith('.csv') or name.startswith('__MACOSX/'):
+                    continue
+                sources.append((_account_from_filename(name), name, functools.partial(archive.open, info)))
+        else:
+            sources.append((_account_from_filename(upload.filename), upload.filename, lambda f=upload.file: f))
+    return sources
+
+
+def _open_upload_source(source: tuple[str, str, Callable[[], IO[bytes]]], known_hashes: set[str]) -> dict:
+    """
+    Hash one CSV and, unless it was uploaded before, locate its header and broker format.
+    The rows are left for the caller to stream chunk by chunk, so a request never holds a
+    whole parsed file.
+    """
+    account, filename, opener = source
+    fileobj = opener()
+    file_hash = _hash_file(fileobj)
+    opened = {"account": account, "filename": filename, "file_hash": file_hash, "format": None,
+              "stream": None, "unchanged": file_hash in known_hashes}
+    if opened["unchanged"]:
+        return opened
+    stream = TransactionStream(fileobj, UPLOAD_CHUNK_ROWS)
+    if stream.mapping is not None:
+        opened["format"] = stream.mapping.parser.label
+        opened["stream"] = stream
+    return opened
+
+
+def _rebuild_and_store_history(session: Session, user_id: int, positions: dict[str, float], rebuild_from: str) -> None:
+    """Revalue history from `rebuild_from` onward and replace the stored snapshots for those days (caller commits)."""
+    # Clear cache for fresh data
+    portfolio_data["price_cache"] = {}
+    
+    # Rebuild portfolio history with REAL prices
+    portfolio_data["portfolio_history"] = []
+    rebuild_portfolio_history(positions, datetime.strptime(rebuild_from, '%Y-%m-%d'))
+    
+    # Persist portfolio history snapshots from the rebuild point onward, continuing the
+    # growth index from the last snapshot kept before it
+    session.query(PortfolioHistoryRecord).filter(
+        (PortfolioHistoryRecord.user_id == user_id) & (PortfolioHistoryRecord.date >= rebuild_from)
+    ).delete()
+    history = portfolio_data["portfolio_history"]
+    anchor = session.exec(_history_edge_statement(user_id, None, rebuild_from, newest=True, inclusive=False)).first()
+    if anchor is not None and anchor.growth_index is None:
+        _reindex_growth(session, user_id)
+        anchor = session.exec(_history_edge_statement(user_id, None, rebuild_from, newest=True, inclusive=False)).first()
+    growth, steps = _growth_index(
+        [h['total_value'] for h in history],
+        prev_value=anchor.total_value if anchor else None,
+        prev_index=anchor.growth_index if anchor else 1.0,
+        prev_steps=anchor.growth_steps if anchor else 0,
+    )
+    _bulk_insert(session, PortfolioHistoryRecord, [
+        {
+            "user_id": user_id,
+            "date": h['date'],
+            "total_value": h['total_value'],
+            "spy_price": h.get('spy_price'),
+            "positions_json": json.dumps(h.get('positions', [])),
+            "growth_index": float(g),
+            "growth_steps": int(n),
+        } for h, g, n in zip(history, growth, steps)
+    ])
+    _refresh_portfolio_latest(session, user_id)
+
+
+def _all(statement):
+    return ("all", statement)
+
+
+def _first(statement):
+    return ("first", statement)
+
+
+def _one(statement):
+    return ("one", statement)
+
+
+def _get(model, key):
+    return ("get", (model, key))
+
+
+def _run_query_plan(session: Session, plan):
+    """
+    Run a query plan on a sync session. A plan is a generator that yields the reads it needs
+    (_all, _first, _one or _get) and is sent each result back, so the analytics that sync and
+    async endpoints share are written once; nested plans compose with `yield from`. Returns
+    the plan's return value.
+    """
+    result = None
+    while True:
+        try:
+            kind, arg = plan.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result = session.get(*arg) if kind == "get" else getattr(session.exec(arg), kind)()
+
+
+async def _run_query_plan_async(session: AsyncSession, plan):
+    """_run_query_plan() on an AsyncSession."""
+    result = None
+    while True:
+        try:
+            kind, arg = plan.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result = await session.get(*arg) if kind == "get" else getattr(await session.exec(arg), kind)()
+
+
+def _transaction_count_statement(user_id: int):
+    return select(func.count()).select_from(TransactionRecord).where(TransactionRecord.user_id == user_id)
+
+
+def _apply_portfolio_summary(
+    summary: PortfolioSummary | None,
+    user_id: int,
+    transaction_count: int,
+    history: list[PortfolioHistoryRecord],
+) -> PortfolioSummary:
+    summary = summary or PortfolioSummary(user_id=user_id)
+    twr = (_twr_from_index(history[0], history[-1]) if len(history) >= 2 else None) or _twr_from_history(history, None, None)
+    latest = history[-1] if history else None
+    summary.transaction_count = int(transaction_count or 0)
+    summary.positions_count = len(json.loads(latest.positions_json or "[]")) if latest else 0
+    summary.latest_value = float(latest.total_value or 0.0) if latest else 0.0
+    summary.twr = twr["twr"]
+    summary.twr_pct = twr["twr_pct"]
+    summary.twr_days = twr["days"]
+    summary.annualized_pct = twr["annualized_pct"]
+    summary.history_start = history[0].date if history else None
+    summary.history_end = latest.date if latest else None
+    summary.data_version = (summary.data_version or 0) + 1
+    summary.updated_at = datetime.utcnow()
+    return summary
+
+
+def _portfolio_summary_plan(user_id: int):
+    transaction_count = yield _one(_transaction_count_statement(user_id))
+    history = yield _all(_history_statement(user_id))
+    summary = yield _get(PortfolioSummary, user_id)
+    return _apply_portfolio_summary(summary, user_id, transaction_count, history)
+
+
+def _refresh_portfolio_summary(session: Session, user_id: int) -> PortfolioSummary:
+    """Recompute the user's portfolio_summary row from stored transactions and history (caller commits)."""
+    session.flush()
+    summary = _run_query_plan(session, _portfolio_summary_plan(user_id))
+    session.add(summary)
+    return summary
+
+
+async def _refresh_portfolio_summary_async(session: AsyncSession, user_id: int) -> PortfolioSummary:
+    """_refresh_portfolio_summary() on an AsyncSession."""
+    summary = await _run_query_plan_async(session, _portfolio_summary_plan(user_id))
+    session.add(summary)
+    return summary
+
+
+def _growth_index(
+    values: List[float],
+    prev_value: float | None = None,
+    prev_index: float = 1.0,
+    prev_steps: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Prefix growth factors for a run of daily values: index[i] = prev_index * Π(1+r_t) and
+    steps[i] = prev_steps + number of compounded returns, where r_t = V_t / V_{t-1} - 1 and
+    days whose previous value is not positive are skipped (the same rule as the TWR loop).
+    `prev_*` describe the snapshot just before the run when extending an existing index.
+    """
+    v = np.array([float(x or 0.0) for x in values], dtype=np.float64)
+    if v.size == 0:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    prev = np.concatenate(([np.nan if prev_value is None else float(prev_value)], v[:-1]))
+    valid = prev > 0
+    factors = np.where(valid, v / np.where(valid, prev, 1.0), 1.0)
+    return prev_index * np.cumprod(factors), prev_steps + np.cumsum(valid)
+
+
+def _reindex_growth(session: Session, user_id: int) -> None:
+    """Recompute the stored growth index over a user's whole history."""
+    rows = session.exec(
+        select(PortfolioHistoryRecord.id, PortfolioHistoryRecord.total_value)
+        .where(PortfolioHistoryRecord.user_id == user_id)
+        .order_by(PortfolioHistoryRecord.date, PortfolioHistoryRecord.id)
+    ).all()
+    growth, steps = _growth_index([r.total_value for r in rows])
+    session.execute(
+        update(PortfolioHistoryRecord.__table__).where(PortfolioHistoryRecord.__table__.c.id == bindparam("row_id")),
+        [{"row_id": r.id, "growth_index": float(g), "growth_steps": int(n)} for r, g, n in zip(rows, growth, steps)],
+    )
+
+
+async def _get_portfolio_summary_async(session: AsyncSession, user_id: int) -> PortfolioSummary:
+    """The user's summary row; computed on first read for users whose data predates the table."""
+    summary = await session.get(PortfolioSummary, user_id)
+    if summary is None:
+        summary = await _refresh_portfolio_summary_async(session, user_id)
+        await session.commit()
+    return summary
+
+
+def _summary_twr(summary: PortfolioSummary) -> dict:
+    return {
+        "twr": summary.twr,
+        "twr_pct": summary.twr_pct,
+        "days": summary.twr_days,
+        "annualized_pct": summary.annualized_pct,
+    }
+
+
+def _refresh_portfolio_latest(session: Session, user_id: int) -> None:
+    """Point the user's portfolio_latest row at their newest stored history snapshot."""
+    session.flush()
+    newest = session.exec(_latest_history_statement(user_id)).first()
+    latest = session.get(PortfolioLatest, user_id)
+    if newest is None:
+        if latest is not None:
+            session.delete(latest)
+        return
+    if latest is None:
+        latest = PortfolioLatest(user_id=user_id, date=newest.date, total_value=newest.total_value)
+    latest.date = newest.date
+    latest.total_value = newest.total_value
+    latest.spy_price = newest.spy_price
+    latest.positions_json = newest.positions_json
+    latest.updated_at = datetime.utcnow()
+    session.add(latest)
+
+
 @app.post("/api/upload")
-async def upload_csv(file: UploadFile = File(...), current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    if not file.filename or not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+def upload_csv(
+    file: UploadFile | None = File(None),
+    files: List[UploadFile] | None = File(None),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+):
+    """
+    Upload one or more broker CSV exports (`file` and/or repeated `files` fields), or zip
+    archives of them. Files are hashed and tagged by account (the file name), then streamed
+    one after another, chunk by chunk, into one deduplicated transaction stream followed by
+    a single history rebuild.
+    """
+    uploads = [u for u in [file, *(files or [])] if u is not None]
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    for upload in uploads:
+        if not upload.filename or not upload.filename.lower().endswith(('.csv', '.zip')):
+            raise HTTPException(status_code=400, detail="Only CSV files (or zip archives of them) are allowed")
     
     try:
-        contents = await file.read()
-        if len(contents) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-        
-        # Read with all columns as strings to preserve formatting (e.g., $1,234.56)
-        df = pd.read_csv(pd.io.common.StringIO(contents.decode('utf-8')), dtype=str).fillna("")
+        for upload in uploads:
+            if len(upload.file.read(1)) == 0:
+                raise HTTPException(status_code=400, detail=f"Empty file uploaded: {upload.filename}")
+        user_id = current_user.id
 
-        # Detect schema
-        is_fidelity = all(col in df.columns for col in ['Run Date', 'Action', 'Symbol'])
-        is_schwab = all(col in df.columns for col in ['Date', 'Action', 'Symbol']) and (
-            'Amount' in df.columns or 'Amount ($)' in df.columns
-        )
+        sources = _expand_upload_sources(uploads)
+        if not sources:
+            raise HTTPException(status_code=400, detail="No CSV files found in upload")
+
+        # Hash every file and detect its format; files uploaded before are not parsed
+        known_hashes = set(session.exec(select(TransactionUpload.file_hash).where(TransactionUpload.user_id == user_id)).all())
+        parsed_files = [_open_upload_source(source, known_hashes) for source in sources]
 
-        if not (is_fidelity or is_schwab):
+        unsupported = [p["filename"] for p in parsed_files if not p["unchanged"] and p["format"] is None]
+        if unsupported:
             raise HTTPException(
                 status_code=400,
                 detail=(
-                    "Unsupported CSV format. Expected Fidelity columns ['Run Date','Action','Symbol'] "
-                    "or Schwab columns ['Date','Action','Symbol','Amount']."
+                    f"Unsupported CSV format in {', '.join(unsupported)}. Expected Fidelity columns "
+                    "['Run Date','Action','Symbol'] or Schwab columns ['Date','Action','Symbol','Amount']."
                 ),
             )
 
-        transactions: List[Dict[str, Any]] = []
+        # The same file twice in one request is treated like a re-upload
+        seen_hashes: set[str] = set()
+        for parsed in parsed_files:
+            if parsed["file_hash"] in seen_hashes:
+                parsed["unchanged"] = True
+            seen_hashes.add(parsed["file_hash"])
+        pending = [p for p in parsed_files if not p["unchanged"]]
+
+        if not pending:
+            # Identical re-uploads are a no-op
+            return JSONResponse(content={
+                "message": "File already uploaded; nothing changed",
+                "transactions_count": 0,
+                "rows_inserted": 0,
+                "file_hash": parsed_files[0]["file_hash"],
+                "unchanged": True,
+                "files": [{"filename": p["filename"], "account": p["account"], "unchanged": True} for p in parsed_files],
+            })
+
+        # Rows stored before fingerprinting existed cannot be matched, so replace them wholesale
+        has_legacy_rows = session.exec(
+            select(TransactionRecord.id).where((TransactionRecord.user_id == user_id) & (TransactionRecord.row_hash == None))  # noqa: E711
+        ).first() is not None
+        if has_legacy_rows:
+            session.query(TransactionRecord).filter(TransactionRecord.user_id == user_id).delete()
+            session.query(PortfolioHistoryRecord).filter(PortfolioHistoryRecord.user_id == user_id).delete()
+            session.query(PortfolioLatest).filter(PortfolioLatest.user_id == user_id).delete()
+            session.flush()
+
+        positions_before = _positions_from_db(session, user_id)
+        positions = dict(positions_before)
         symbols = set()
+        file_summaries: list[dict] = []
+        skipped_rows: list[dict] = []
+        transactions_count = 0
+        inserted_count = 0
+        earliest_changed = None
+        start_date = None
+        end_date = None
+
+        # Merge all files into one transaction stream, one chunk at a time, inserting only rows not stored yet
+        # Occurrences are keyed by a row's first fingerprint, which includes the account, so counts are per account
+        with _OccurrenceCounter(UPLOAD_OCCURRENCE_KEYS) as occurrences:
+            for parsed in pending:
+                file_rows = 0
+                file_inserted = 0
+                for batch, skipped in parsed["stream"]:
+                    skipped_rows.extend({"file": parsed["filename"], **row} for row in skipped[:max(0, 20 - len(skipped_rows))])
+                    file_rows += len(batch)
+                    if len(batch):
+                        # Only index symbols that look like tickers
+                        symbols.update(s for s in set(batch.symbol) if s)
+                        start_date = min(start_date, batch.date.min()) if start_date else batch.date.min()
+                        end_date = max(end_date, batch.date.max()) if end_date else batch.date.max()
+                    transactions = batch.records()
+                    for t in transactions:
+                        t['account'] = parsed["account"]
+                    bases = [_transaction_fingerprint(t, 0) for t in transactions]
+                    for t, base, occurrence in zip(transactions, bases, occurrences.take(bases)):
+                        t['row_hash'] = base if occurrence == 0 else _transaction_fingerprint(t, occurrence)
+                    # Rows inserted earlier in this request are already visible to the lookup
+                    stored = _stored_row_hashes(session, user_id, [t['row_hash'] for t in transactions])
+                    new_rows = [t for t in transactions if t['row_hash'] not in stored]
+                    if not new_rows:
+                        continue
+                    _bulk_insert(session, TransactionRecord, [
+                        {
+                            "user_id": user_id,
+                            "account": t['account'],
+                            "date": t['date'],
+                            "action": t['action'],
+                            "symbol": t['symbol'],
+                            "quantity": float(t['quantity'] or 0),
+                            "price": float(t['price'] or 0),
+                            "amount": float(t['amount'] or 0),
+                            "row_hash": t['row_hash'],
+                        } for t in new_rows
+                    ])
+                    _accumulate_positions(positions, new_rows)
+                    changed = min(t['date'] for t in new_rows)
+                    earliest_changed = min(earliest_changed, changed) if earliest_changed else changed
+                    file_inserted += len(new_rows)
+
+                transactions_count += file_rows
+                inserted_count += file_inserted
+                session.add(TransactionUpload(
+                    user_id=user_id,
+                    account=parsed["account"],
+                    file_hash=parsed["file_hash"],
+                    filename=parsed["filename"],
+                    rows_total=file_rows,
+                    rows_inserted=file_inserted,
+                ))
+                file_summaries.append({
+                    "filename": parsed["filename"],
+                    "account": parsed["account"],
+                    "file_hash": parsed["file_hash"],
+                    "detected_format": parsed["format"],
+                    "transactions_count": file_rows,
+                    "rows_inserted": file_inserted,
+                    "unchanged": False,
+                })
+        file_summaries.extend(
+            {"filename": p["filename"], "account": p["account"], "file_hash": p["file_hash"], "unchanged": True}
+            for p in parsed_files if p["unchanged"]
+        )
+        if transactions_count == 0 and skipped_rows:
+            raise HTTPException(status_code=400, detail={"message": "Could not parse any transaction dates", "skipped_rows": skipped_rows})
 
-        if is_fidelity:
-            for _, row in df.iterrows():
-                symbol = str(row.get('Symbol', '')).strip()
-                if symbol == "":
-                    continue
-                run_date = row.get('Run Date', '')
-                settle_date = row.get('Settlement Date', '') if 'Settlement Date' in df.columns else ""
-                date_dt = _parse_date(settle_date or run_date)
-                transaction = {
-                    'date': date_dt.strftime('%Y-%m-%d'),
-                    'action': str(row.get('Action', '')).strip(),
-                    'symbol': symbol,
-                    'quantity': _parse_number(row.get('Quantity', '')),
-                    'price': _parse_number(row.get('Price ($)', '')),
-                    'amount': _parse_number(row.get('Amount ($)', '')),
-                }
-                transactions.append(transaction)
-                symbols.add(symbol)
-        else:  # Schwab
-            # Normalize possible column name variants
-            amount_col = 'Amount' if 'Amount' in df.columns else 'Amount ($)'
-            price_col = 'Price' if 'Price' in df.columns else 'Price ($)'
-            qty_col = 'Quantity' if 'Quantity' in df.columns else 'Qty'
-
-            for _, row in df.iterrows():
-                symbol = str(row.get('Symbol', '')).strip()
-                # Keep cash movements too for completeness (symbol may be empty)
-                action = str(row.get('Action', '')).strip()
-                date_dt = _parse_date(row.get('Date', ''))
-                transaction = {
-                    'date': date_dt.strftime('%Y-%m-%d'),
-                    'action': action,
-                    'symbol': symbol,
-                    'quantity': _parse_number(row.get(qty_col, '')),
-                    'price': _parse_number(row.get(price_col, '')),
-                    'amount': _parse_number(row.get(amount_col, '')),
-                }
-                # Only index symbols that look like tickers
-                if symbol:
-                    symbols.add(symbol)
-                transactions.append(transaction)
-        
-        # Store the data globally (in-memory for current session)
-        portfolio_data["transactions"] = transactions
-        portfolio_data["symbols"] = list(symbols)
+        if inserted_count:
+            # Social feed action for upload
+            session.add(SocialAction(user_id=user_id, type="upload"))
 
-        # Persist raw transactions to DB for this user
-        # Clear old records for idempotency
-        session.exec(select(TransactionRecord).where(TransactionRecord.user_id == current_user.id))
-        session.query(TransactionRecord).filter(TransactionRecord.user_id == current_user.id).delete()
-        session.commit()
-        # Social feed action for upload
-        session.add(SocialAction(user_id=current_user.id, type="upload"))
-        session.commit()
-        to_insert = [
-            TransactionRecord(
-                user_id=current_user.id,
-                date=t['date'],
-                action=t['action'],
-                symbol=t['symbol'],
-                quantity=float(t['quantity'] or 0),
-                price=float(t['price'] or 0),
-                amount=float(t['amount'] or 0),
-            ) for t in transactions
-        ]
-        session.add_all(to_insert)
-        session.commit()
-        
-        # Clear cache for fresh data
-        portfolio_data["price_cache"] = {}
-        
-        # Rebuild portfolio history with REAL prices
-        rebuild_portfolio_history()
+        portfolio_data["symbols"] = list(symbols)
 
-        # Persist portfolio history snapshots
-        session.query(PortfolioHistoryRecord).filter(PortfolioHistoryRecord.user_id == current_user.id).delete()
-        session.commit()
-        for h in portfolio_data["portfolio_history"]:
-            session.add(PortfolioHistoryRecord(
-                user_id=current_user.id,
-                date=h['date'],
-                total_value=h['total_value'],
-                spy_price=h.get('spy_price'),
-                positions_json=json.dumps(h.get('positions', [])),
-            ))
+        # History is valued with final positions, so if holdings changed every day must be
+        # revalued; otherwise only days from the earliest new transaction onward are rebuilt.
+        # Either way there is exactly one rebuild per request, however many files were sent.
+        rebuild_from = None
+        if earliest_changed:
+            if _held(positions) != _held(positions_before):
+                first_date = session.exec(select(func.min(TransactionRecord.date)).where(TransactionRecord.user_id == user_id)).one()
+                rebuild_from = first_date or earliest_changed
+            else:
+                rebuild_from = earliest_changed
+
+        if rebuild_from:
+            _rebuild_and_store_history(session, user_id, positions, rebuild_from)
+        if inserted_count:
+            _refresh_portfolio_summary(session, user_id)
+        # New rows, upload ledger and rebuilt history land together: if the rebuild fails,
+        # nothing is recorded and re-sending the same file rebuilds instead of being "unchanged"
         session.commit()
-        
-        # Compute date range from parsed transactions
-        try:
-            dates = [datetime.strptime(t['date'], '%Y-%m-%d') for t in transactions]
-            start_date = min(dates).strftime('%Y-%m-%d') if dates else None
-            end_date = max(dates).strftime('%Y-%m-%d') if dates else None
-        except Exception:
-            start_date = None
-            end_date = None
 
         return JSONResponse(content={
             "message": "CSV processed successfully with REAL stock data",
-            "transactions_count": len(transactions),
+            "transactions_count": transactions_count,
+            "rows_inserted": inserted_count,
             "symbols_found": list(symbols),
             "date_range": {"start": start_date, "end": end_date},
-            "detected_format": "Fidelity" if is_fidelity else "Schwab",
+            "detected_format": ", ".join(sorted({p["format"] for p in pending})),
+            "skipped_rows": skipped_rows,
+            "file_hash": pending[0]["file_hash"],
+            "rebuild_from": rebuild_from,
+            "unchanged": False,
+            "files": file_summaries,
         })
     
+    except HTTPException:
+        session.rollback()
+        raise
     except Exception as e:
+        session.rollback()
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
 
+# Default point budget of the chart endpoints: about one point per pixel of a full-width chart
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "800"))
+
+
+def _check_max_points(max_points: int) -> None:
+    if not 2 <= max_points <= 10000:
+        raise HTTPException(status_code=400, detail="max_points must be between 2 and 10000")
+
+
+def _check_series_format(response_format: str) -> None:
+    if response_format not in SERIES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(SERIES_FORMATS)}")
+
+
+def _series_response(request: Request, content: dict):
+    """Chart series payloads: orjson, or MessagePack for clients that accept it (responses.py)."""
+    return series_response(content, request.headers.get("accept"))
+
+
+def _chart_indices(dates: np.ndarray, levels: np.ndarray, max_points: int, keep=()) -> np.ndarray:
+    """Which points of a date-indexed series to plot: LTTB over calendar days (analytics.lttb_indices)."""
+    return analytics.lttb_indices(dates.astype(np.int64), levels, max_points, keep)
+
+
+def _growth_series(dates: np.ndarray, columns: dict[str, np.ndarray], max_points: int, columnar: bool = False) -> list[dict] | dict:
+    """
+    A $10k comparison rounded to cents and downsampled to about max_points by LTTB across all
+    columns, as {date, column: value} rows or as {"dates": [...], column: array}. The first
+    point where the portfolio moves off $10k is always kept, since the growth chart takes the
+    portfolio start from it.
+    """
+    names = list(columns)
+    values = np.vstack([columns[n] for n in names])
+    moved = np.flatnonzero(np.abs(values[0] - 10000) > 0.01)[:1]
+    idx = _chart_indices(dates, values, max_points, moved)
+    if columnar:
+        return {'dates': dates[idx].astype(str).tolist(), **{n: np.round(values[i, idx], 2) for i, n in enumerate(names)}}
+    return [
+        {'date': d, **{n: round(v, 2) for n, v in zip(names, row)}}
+        for d, row in zip(dates[idx].astype(str).tolist(), values[:, idx].T.tolist())
+    ]
+
+
 @app.get("/api/portfolio/history")
-async def get_portfolio_history(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
+async def get_portfolio_history(request: Request, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """Daily snapshots, downsampled by portfolio value to about max_points (positions are only decoded for those)."""
+    _check_max_points(max_points)
+    _check_series_format(response_format)
+    rows = (await session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id).order_by(PortfolioHistoryRecord.date))).all()
+    if rows:
+        values = np.array([r.total_value for r in rows], dtype=np.float64)
+        rows = [rows[i] for i in _chart_indices(analytics.to_dates([r.date for r in rows]), values, max_points)]
+    positions = json.loads("[" + ",".join(r.positions_json or "[]" for r in rows) + "]")
+    if response_format == "columnar":
+        return _series_response(request, {"history": {
+            "dates": [r.date for r in rows],
+            "total_value": np.array([r.total_value for r in rows], dtype=np.float64),
+            "spy_price": np.array([r.spy_price for r in rows], dtype=np.float64),
+            "positions": positions,
+        }})
     history = [
         {
             "date": r.date,
             "total_value": r.total_value,
             "spy_price": r.spy_price,
-            "positions": json.loads(r.positions_json or "[]"),
+            "positions": p,
         }
-        for r in rows
+        for r, p in zip(rows, positions)
     ]
-    return JSONResponse(content={"history": history})
+    return _series_response(request, {"history": history})
 
 @app.get("/api/portfolio/status")
-async def get_portfolio_status(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    tx = session.exec(select(TransactionRecord).where(TransactionRecord.user_id == current_user.id)).all()
-    has_data = len(tx) > 0
-    if not has_data:
+async def get_portfolio_status(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    summary = await _get_portfolio_summary_async(session, current_user.id)
+    if summary.transaction_count == 0:
         return JSONResponse(content={
             "has_portfolio_data": False,
             "transaction_count": 0,
             "positions_count": 0
         })
-    # Compute TWR and latest portfolio value
-    twr = _compute_time_weighted_return(session, current_user.id)
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id).order_by(PortfolioHistoryRecord.date)).all()
-    latest_value = rows[-1].total_value if rows else 0.0
-    latest_positions = json.loads(rows[-1].positions_json or "[]") if rows else []
     return JSONResponse(content={
         "has_portfolio_data": True,
-        "transaction_count": len(tx),
-        "positions_count": len(latest_positions),
-        "current_return": twr.get("twr_pct", 0.0),
-        "portfolio_value": latest_value,
-        "twr": twr
+        "transaction_count": summary.transaction_count,
+        "positions_count": summary.positions_count,
+        "current_return": summary.twr_pct,
+        "portfolio_value": summary.latest_value,
+        "twr": _summary_twr(summary),
+        "history_range": {"start": summary.history_start, "end": summary.history_end},
+        "data_version": summary.data_version,
     })
 
 @app.get("/api/portfolio/weights")
-async def get_portfolio_weights(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
-    if not rows:
+async def get_portfolio_weights(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    latest = await session.get(PortfolioLatest, current_user.id)
+    if not latest:
         return JSONResponse(content={"weights": []})
-    latest = max(rows, key=lambda r: r.date)
     positions = json.loads(latest.positions_json or "[]")
     total_value = latest.total_value
 
-    # Calculate cost basis for each position from this user's transactions
-    tx_rows = session.exec(select(TransactionRecord).where(TransactionRecord.user_id == current_user.id)).all()
-    cost_basis: dict[str, dict[str, float]] = {}
-    for r in tx_rows:
-        symbol = r.symbol
-        if symbol and symbol != 'Cash':
-            if symbol not in cost_basis:
-                cost_basis[symbol] = {'total_cost': 0.0, 'total_shares': 0.0}
-            if 'BOUGHT' in r.action or 'Buy' in r.action:
-                cost_basis[symbol]['total_cost'] += abs(r.amount)
-                cost_basis[symbol]['total_shares'] += r.quantity
-            elif 'SOLD' in r.action or 'Sell' in r.action:
-                if cost_basis[symbol]['total_shares'] > 0:
-                    avg_cost_per_share = cost_basis[symbol]['total_cost'] / cost_basis[symbol]['total_shares']
-                    sold_cost = avg_cost_per_share * abs(r.quantity)
-                    cost_basis[symbol]['total_cost'] -= sold_cost
-                    cost_basis[symbol]['total_shares'] -= abs(r.quantity)
-            elif 'REINVESTMENT' in r.action:
-                cost_basis[symbol]['total_cost'] += abs(r.amount)
-                cost_basis[symbol]['total_shares'] += r.quantity
+    # Cost basis and P&L for each position from this user's lots
+    book = await _get_lot_book_async(session, current_user.id)
+    lots = book.summary({pos['symbol']: pos.get('price', 0.0) for pos in positions})
+    cost_basis = book.cost_basis()
     
     weights = []
     for pos in positions:
@@ -1017,14 +1743,16 @@ async def get_portfolio_weights(current_user: User = Depends(get_current_user),
                 'value': pos['value'],
                 'shares': pos['shares'],
                 'cost_basis': cost_basis.get(pos['symbol'], {}).get('total_cost', 0),
-                'gain_loss_pct': round(gain_loss_pct, 2)
+                'gain_loss_pct': round(gain_loss_pct, 2),
+                'realized_pnl': round(lots.get(pos['symbol'], {}).get('realized_pnl', 0.0), 2),
+                'unrealized_pnl': round(lots.get(pos['symbol'], {}).get('unrealized_pnl', 0.0), 2),
             })
     
     weights.sort(key=lambda x: x['weight'], reverse=True)
     return JSONResponse(content={"weights": weights})
 
 @app.get("/api/portfolio/trades")
-async def get_recent_trades(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_recent_trades(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     rows = session.exec(select(TransactionRecord).where(TransactionRecord.user_id == current_user.id)).all()
     recent = sorted([
         {
@@ -1046,148 +1774,520 @@ async def get_recent_trades(current_user: User = Depends(get_current_user), sess
     session.commit()
     return JSONResponse(content={"trades": recent})
 
+# Per-user analytics memo keyed by (database identity, user_id, data_version, function, args); a
+# new upload bumps the summary's data_version, so stale entries are simply never hit again and
+# age out. The database identity is bound at startup.
+# ANALYTICS_CACHE_BACKEND=sqlite shares results between workers through a local SQLite file.
+ANALYTICS_CACHE_BACKEND = os.getenv("ANALYTICS_CACHE_BACKEND", "memory").strip().lower()
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "4096"))
+ANALYTICS_CACHE_PATH = os.getenv("ANALYTICS_CACHE_PATH", "./analytics_cache.db")
+# Shared secret for the internal /internal/metrics/cache route; the route is off when unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _create_analytics_memo() -> VersionedMemo:
+    if ANALYTICS_CACHE_BACKEND not in MEMO_BACKENDS:
+        raise ValueError(f"Unknown ANALYTICS_CACHE_BACKEND {ANALYTICS_CACHE_BACKEND!r}; expected one of {list(MEMO_BACKENDS)}")
+    store = SQLiteMemoStore(ANALYTICS_CACHE_PATH) if ANALYTICS_CACHE_BACKEND == "sqlite" else None
+    return VersionedMemo(ANALYTICS_CACHE_SIZE, store)
+
+
+analytics_memo = _create_analytics_memo()
+
+
+def _memo_args(signature: inspect.Signature, args: tuple, kwargs: dict) -> tuple:
+    """Arguments after (session, user_id), normalized so positional and keyword calls share entries."""
+    bound = signature.bind(None, None, *args, **kwargs)
+    bound.apply_defaults()
+    return tuple(bound.arguments.values())[2:]
+
+
+def _memoized(shared: bool = True):
+    """
+    Memoize a `(session, user_id, ...)` analytics helper per user data version. Async
+    variants (named `*_async`) share entries with their sync counterpart. Pass
+    shared=False for results that are not plain JSON data (kept in-process, not copied).
+    """
+    def decorate(fn):
+        name = fn.__name__.removesuffix("_async")
+        signature = inspect.signature(fn)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(session: AsyncSession, user_id: int, *args, **kwargs):
+                summary = await session.get(PortfolioSummary, user_id)
+                version = summary.data_version if summary else None
+                memo_args = _memo_args(signature, args, kwargs)
+                hit, value = analytics_memo.get(user_id, version, name, memo_args)
+                if not hit:
+                    value = await fn(session, user_id, *args, **kwargs)
+                    analytics_memo.put(user_id, version, name, memo_args, value, shared)
+                return value
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(session: Session, user_id: int, *args, **kwargs):
+            summary = session.get(PortfolioSummary, user_id)
+            version = summary.data_version if summary else None
+            memo_args = _memo_args(signature, args, kwargs)
+            hit, value = analytics_memo.get(user_id, version, name, memo_args)
+            if not hit:
+                value = fn(session, user_id, *args, **kwargs)
+                analytics_memo.put(user_id, version, name, memo_args, value, shared)
+            return value
+        return wrapper
+    return decorate
+
+# Annual risk-free rate used for Sharpe, Sortino and alpha in /api/performance/risk
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+
+
+def _growth_levels(rows: list) -> np.ndarray:
+    """The stored growth index of history rows, recomputed from values if any row predates it."""
+    if all(r.growth_index is not None for r in rows):
+        return np.array([r.growth_index for r in rows], dtype=np.float64)
+    growth, _ = _growth_index([r.total_value for r in rows])
+    return growth
+
+
+async def _benchmark_levels(rows: list, dates: np.ndarray, benchmark: str) -> np.ndarray:
+    """Benchmark price on each history date: stored SPY prices when available, otherwise fetched."""
+    if benchmark == "SPY":
+        stored = analytics.forward_fill(np.array([r.spy_price if r.spy_price is not None else np.nan for r in rows], dtype=np.float64))
+        if np.isfinite(stored).any():
+            return stored
+    start_dt = datetime.strptime(rows[0].date, '%Y-%m-%d')
+    prices = await run_in_threadpool(get_real_stock_data, benchmark, start_dt - timedelta(days=7), datetime.now())
+    if not prices:
+        raise HTTPException(status_code=400, detail=f"No price data for benchmark {benchmark}")
+    return analytics.align_prices(dates, analytics.to_dates(list(prices.keys())), np.array(list(prices.values())))
+
+
+async def _trailing_performance(rows: list, benchmark: str) -> dict:
+    """Trailing 1W..ITD returns of the portfolio (growth index) and benchmark (prices) in one pass."""
+    dates = analytics.to_dates([r.date for r in rows])
+    windows = analytics.trailing_returns(dates, np.vstack([_growth_levels(rows), await _benchmark_levels(rows, dates, benchmark)]))
+    metrics = {}
+    for key, window in windows.items():
+        portfolio_ret, bench_ret = window["returns"]
+        if portfolio_ret is None or bench_ret is None:
+            continue
+        metrics[key] = {
+            'portfolio_return': round(portfolio_ret * 100.0, 2),
+            'spy_return': round(bench_ret * 100.0, 2),  # kept for existing clients; holds the selected benchmark
+            'benchmark_return': round(bench_ret * 100.0, 2),
+            'outperformance': round((portfolio_ret - bench_ret) * 100.0, 2) + 0.0,  # no -0.0
+            'start_date': window["start"],
+        }
+    return metrics
+
+
 @app.get("/api/performance")
-async def get_performance_metrics(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
-    if not rows:
+async def get_performance_metrics(benchmark: str = "SPY", current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    Trailing-window returns (1W, 1M, 3M, 6M, YTD, 1Y, 3Y, 5Y, ITD) of the portfolio against a
+    benchmark (SPY by default), plus TWR, contribution-adjusted, deposit-averaged and
+    money-weighted (XIRR) returns.
+    Windows longer than the stored history are omitted. Cached per user data version.
+    """
+    user_id = current_user.id
+    benchmark = (benchmark or "SPY").strip().upper()
+    summary = await _get_portfolio_summary_async(session, user_id)
+    if summary.history_end is None:
         return JSONResponse(content={"metrics": {}, "twr": {"twr_pct": 0}})
-    # Use TWR for portfolio return baseline
-    twr_all = _compute_time_weighted_return(session, current_user.id)
-    current_return = twr_all.get("twr_pct", 0.0)
-    metrics = {
-        '1M': {
-            'portfolio_return': round(current_return, 2),
-            'spy_return': 5.0,
-            'outperformance': round(current_return - 5.0, 2)
-        },
-        '3M': {
-            'portfolio_return': round(current_return, 2),
-            'spy_return': 8.0,
-            'outperformance': round(current_return - 8.0, 2)
-        },
-        '6M': {
-            'portfolio_return': round(current_return, 2),
-            'spy_return': 12.0,
-            'outperformance': round(current_return - 12.0, 2)
-        },
-        '1Y': {
-            'portfolio_return': round(current_return, 2),
-            'spy_return': 20.0,
-            'outperformance': round(current_return - 20.0, 2)
+
+    hit, payload = analytics_memo.get(user_id, summary.data_version, "performance", (benchmark,))
+    if hit:
+        return JSONResponse(content=payload)
+
+    h = PortfolioHistoryRecord
+    rows = (await session.exec(
+        select(h.date, h.total_value, h.spy_price, h.growth_index).where(h.user_id == user_id).order_by(h.date)
+    )).all()
+    metrics = await _trailing_performance(rows, benchmark)
+    # Also compute contribution-adjusted and deposit-averaged returns
+    net = await _compute_contribution_adjusted_return_async(session, user_id)
+    depavg = await _compute_deposit_averaged_return_async(session, user_id)
+    money_weighted = await _compute_money_weighted_return_async(session, user_id)
+    payload = {
+        "metrics": metrics,
+        "benchmark": benchmark,
+        "as_of": summary.history_end,
+        "data_version": summary.data_version,
+        "twr": _summary_twr(summary),
+        "net": net,
+        "deposit_avg": depavg,
+        "money_weighted": money_weighted,
+    }
+    analytics_memo.put(user_id, summary.data_version, "performance", (benchmark,), payload)
+    return JSONResponse(content=payload)
+
+
+def _risk_block(stats: dict) -> dict:
+    return {
+        "volatility_pct": round(stats["volatility"] * 100.0, 2),
+        "sharpe": None if stats["sharpe"] is None else round(stats["sharpe"], 3),
+        "sortino": None if stats["sortino"] is None else round(stats["sortino"], 3),
+        "max_drawdown_pct": round(stats["max_drawdown"] * 100.0, 2) + 0.0,
+        "max_drawdown_peak": stats["peak_date"],
+        "max_drawdown_trough": stats["trough_date"],
+        "max_drawdown_recovery": stats["recovery_date"],
+    }
+
+
+@app.get("/api/performance/risk")
+async def get_risk_metrics(benchmark: str = "SPY", risk_free: float | None = None, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    Annualized volatility, Sharpe, Sortino and max drawdown (with dates) of the portfolio and a
+    benchmark over the stored daily history, plus beta, alpha, correlation and tracking error
+    against the benchmark. `risk_free` is an annual rate (defaults to RISK_FREE_RATE).
+    Cached per user data version.
+    """
+    user_id = current_user.id
+    benchmark = (benchmark or "SPY").strip().upper()
+    risk_free = RISK_FREE_RATE if risk_free is None else risk_free
+    summary = await _get_portfolio_summary_async(session, user_id)
+    if summary.history_end is None:
+        return JSONResponse(content={"risk": {}})
+
+    hit, payload = analytics_memo.get(user_id, summary.data_version, "performance_risk", (benchmark, risk_free))
+    if hit:
+        return JSONResponse(content=payload)
+
+    h = PortfolioHistoryRecord
+    rows = (await session.exec(
+        select(h.date, h.total_value, h.spy_price, h.growth_index).where(h.user_id == user_id).order_by(h.date)
+    )).all()
+    dates = analytics.to_dates([r.date for r in rows])
+    stats = analytics.risk_metrics(
+        dates, np.vstack([_growth_levels(rows), await _benchmark_levels(rows, dates, benchmark)]), risk_free=risk_free,
+    )
+    risk = {}
+    if stats:
+        risk = {
+            "portfolio": _risk_block(stats["portfolio"]),
+            "benchmark": _risk_block(stats["benchmark"]),
+            "beta": None if stats["beta"] is None else round(stats["beta"], 3),
+            "alpha_pct": None if stats["alpha"] is None else round(stats["alpha"] * 100.0, 2),
+            "correlation": None if stats["correlation"] is None else round(stats["correlation"], 3),
+            "tracking_error_pct": round(stats["tracking_error"] * 100.0, 2),
+            "observations": stats["observations"],
+            "start_date": stats["start"],
+            "end_date": stats["end"],
         }
+    payload = {
+        "risk": risk,
+        "benchmark": benchmark,
+        "risk_free": risk_free,
+        "as_of": summary.history_end,
+        "data_version": summary.data_version,
     }
-    # Also compute contribution-adjusted and deposit-averaged returns
-    net = _compute_contribution_adjusted_return(session, current_user.id)
-    depavg = _compute_deposit_averaged_return(session, current_user.id)
-    return JSONResponse(content={"metrics": metrics, "twr": twr_all, "net": net, "deposit_avg": depavg})
+    analytics_memo.put(user_id, summary.data_version, "performance_risk", (benchmark, risk_free), payload)
+    return JSONResponse(content=payload)
     
+def _drawdown_summary(dates: np.ndarray, level: np.ndarray, top_n: int) -> dict:
+    dd = analytics.drawdown(level)
+    episodes = analytics.drawdown_episodes(dates, level, top_n)
+    underwater_since = None
+    if dd[-1] < 0:
+        highs = np.flatnonzero(dd == 0)
+        underwater_since = str(dates[highs[-1]]) if len(highs) else str(dates[0])
+    return {
+        "current_drawdown_pct": round(float(dd[-1]) * 100.0, 2) + 0.0,
+        "current_peak_date": underwater_since,
+        "max_drawdown_pct": round(float(dd.min()) * 100.0, 2) + 0.0,
+        "episodes": [
+            {**{k: v for k, v in e.items() if k != "depth"}, "depth_pct": round(e["depth"] * 100.0, 2)}
+            for e in episodes
+        ],
+    }
+
+
+@app.get("/api/portfolio/drawdown")
+async def get_drawdown(request: Request, top_n: int = 5, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    Underwater (running-max drawdown) series of the portfolio growth index and SPY, the top_n
+    deepest drawdown episodes of each, and the current drawdown. The series is downsampled
+    to about max_points points by LTTB, always keeping the episode peaks, troughs and recoveries,
+    as rows or columns (format=columnar). Cached per user data version.
+    """
+    if not 1 <= top_n <= 50:
+        raise HTTPException(status_code=400, detail="top_n must be between 1 and 50")
+    _check_max_points(max_points)
+    _check_series_format(response_format)
+    columnar = response_format == "columnar"
+    user_id = current_user.id
+    summary = await _get_portfolio_summary_async(session, user_id)
+    if summary.history_end is None:
+        return _series_response(request, {"series": {"dates": [], "portfolio": [], "spy": []} if columnar else [], "portfolio": {}, "spy": {}})
+
+    hit, payload = analytics_memo.get(user_id, summary.data_version, "drawdown", (top_n, max_points, response_format))
+    if hit:
+        return _series_response(request, payload)
+
+    h = PortfolioHistoryRecord
+    rows = (await session.exec(
+        select(h.date, h.total_value, h.spy_price, h.growth_index).where(h.user_id == user_id).order_by(h.date)
+    )).all()
+    dates = analytics.to_dates([r.date for r in rows])
+    levels = {"portfolio": _growth_levels(rows), "spy": await _benchmark_levels(rows, dates, "SPY")}
+    summaries = {name: _drawdown_summary(dates, level, top_n) for name, level in levels.items()}
+    underwater = {name: analytics.drawdown(level) for name, level in levels.items()}
+
+    date_index = {str(d): i for i, d in enumerate(dates)}
+    keep = [
+        date_index[e[k]] for block in summaries.values() for e in block["episodes"]
+        for k in ("peak_date", "trough_date", "recovery_date") if e[k]
+    ]
+    idx = _chart_indices(dates, np.vstack([underwater["portfolio"], underwater["spy"]]), max_points, keep)
+    portfolio_pct = np.round(underwater["portfolio"][idx] * 100.0, 2) + 0.0
+    spy_pct = np.round(underwater["spy"][idx] * 100.0, 2) + 0.0
+    if columnar:
+        # Kept as lists: the memo stores plain JSON data
+        series = {"dates": dates[idx].astype(str).tolist(), "portfolio": portfolio_pct.tolist(), "spy": spy_pct.tolist()}
+    else:
+        series = [
+            {"date": str(d), "portfolio": float(p), "spy": float(q)}
+            for d, p, q in zip(dates[idx], portfolio_pct, spy_pct)
+        ]
+    payload = {
+        "series": series,
+        "portfolio": summaries["portfolio"],
+        "spy": summaries["spy"],
+        "points": int(len(idx)),
+        "total_points": int(len(dates)),
+        "as_of": summary.history_end,
+        "data_version": summary.data_version,
+    }
+    analytics_memo.put(user_id, summary.data_version, "drawdown", (top_n, max_points, response_format), payload)
+    return _series_response(request, payload)
+
+
+def _position_matrix_from_rows(rows: list) -> tuple[np.ndarray, list[str], np.ndarray, np.ndarray]:
+    """
+    (dates, symbols, shares, prices) from history snapshots: (n_dates, n_symbols) matrices, NaN
+    where a symbol has no position that day. All snapshots' positions_json are decoded in a
+    single json.loads and scattered into the matrices with array indexing.
+    """
+    days = json.loads("[" + ",".join(r.positions_json or "[]" for r in rows) + "]")
+    dates = analytics.to_dates([r.date for r in rows])
+    flat = pd.DataFrame.from_records([p for day in days for p in day], columns=["symbol", "shares", "price"])
+    row_idx = np.repeat(np.arange(len(days)), [len(day) for day in days])
+    col_idx, symbols = pd.factorize(flat["symbol"])
+    shares = np.full((len(days), len(symbols)), np.nan)
+    prices = np.full((len(days), len(symbols)), np.nan)
+    shares[row_idx, col_idx] = flat["shares"].to_numpy(dtype=np.float64)
+    prices[row_idx, col_idx] = flat["price"].to_numpy(dtype=np.float64)
+    return dates, [str(s) for s in symbols], shares, prices
+
+
+@_memoized(shared=False)
+async def _get_position_matrix_async(session: AsyncSession, user_id: int) -> tuple[np.ndarray, list[str], np.ndarray, np.ndarray]:
+    """The user's daily shares and price matrices, decoded once per data version."""
+    h = PortfolioHistoryRecord
+    rows = (await session.exec(select(h.date, h.positions_json).where(h.user_id == user_id).order_by(h.date))).all()
+    return _position_matrix_from_rows(rows)
+
+
+@app.get("/api/portfolio/attribution")
+async def get_return_attribution(start_date: str | None = None, end_date: str | None = None, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    Each holding's contribution to the portfolio return over [start_date, end_date] (the whole
+    history by default): daily weight × return, linked across days so the contributions add
+    up to the window's compounded return. Cached per user data version.
+    """
+    for value in (start_date, end_date):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail="start_date and end_date must be YYYY-MM-DD")
+    user_id = current_user.id
+    summary = await _get_portfolio_summary_async(session, user_id)
+    if summary.history_end is None:
+        return JSONResponse(content={"attribution": [], "portfolio_return_pct": 0.0})
+
+    hit, payload = analytics_memo.get(user_id, summary.data_version, "attribution", (start_date, end_date))
+    if hit:
+        return JSONResponse(content=payload)
+
+    dates, symbols, shares, prices = await _get_position_matrix_async(session, user_id)
+    lo = np.searchsorted(dates, np.datetime64(start_date), side="left") if start_date else 0
+    hi = np.searchsorted(dates, np.datetime64(end_date), side="right") if end_date else len(dates)
+    result = analytics.position_attribution(shares[lo:hi], prices[lo:hi])
+    attribution = []
+    if result:
+        for i, symbol in enumerate(symbols):
+            if result["start_value"][i] <= 0 and result["end_value"][i] <= 0 and result["contribution"][i] == 0:
+                continue  # not held in this window
+            holding_return = result["holding_return"][i]
+            attribution.append({
+                "symbol": symbol,
+                "contribution_pct": round(float(result["contribution"][i]) * 100.0, 4) + 0.0,
+                "return_pct": None if np.isnan(holding_return) else round(float(holding_return) * 100.0, 4),
+                "average_weight_pct": round(float(result["average_weight"][i]) * 100.0, 2),
+                "start_value": round(float(result["start_value"][i]), 2),
+                "end_value": round(float(result["end_value"][i]), 2),
+            })
+        attribution.sort(key=lambda x: x["contribution_pct"], reverse=True)
+    payload = {
+        "attribution": attribution,
+        "portfolio_return_pct": round(result["portfolio_return"] * 100.0, 4) if result else 0.0,
+        "start_date": str(dates[lo]) if result else None,
+        "end_date": str(dates[hi - 1]) if result else None,
+        "days": result["days"] if result else 0,
+        "data_version": summary.data_version,
+    }
+    analytics_memo.put(user_id, summary.data_version, "attribution", (start_date, end_date), payload)
+    return JSONResponse(content=payload)
+
+
+@app.get("/internal/metrics/cache", include_in_schema=False)
+async def get_cache_metrics(x_metrics_token: str | None = Header(None)):
+    """
+    Hit rates of the per-user analytics memo, overall and per memoized function. These are
+    process-wide internals, so the route is for operators only: it answers 404 unless the
+    METRICS_TOKEN setting is configured and sent back in the X-Metrics-Token header.
+    """
+    if not METRICS_TOKEN or not hmac.compare_digest(x_metrics_token or "", METRICS_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return JSONResponse(content=analytics_memo.stats())
+
 @app.get("/api/performance/net")
-async def get_contribution_adjusted_return(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    net = _compute_contribution_adjusted_return(session, current_user.id)
+async def get_contribution_adjusted_return(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    net = await _compute_contribution_adjusted_return_async(session, current_user.id)
     return JSONResponse(content=net)
 
-@app.get("/api/comparison/spy")  
-async def get_spy_comparison(baseline_date: str = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
-    if not rows:
-        return JSONResponse(content={"comparison": []})
-    history = [
-        {"date": r.date, "total_value": r.total_value, "spy_price": r.spy_price}
-        for r in rows
-    ]
-    
-    portfolio_start_date = history[0]['date']
-    
+def _comparison_lookback() -> str:
+    """Earliest baseline validate_baseline_date accepts today."""
+    return (datetime.now() - timedelta(days=10*365)).strftime('%Y-%m-%d')
+
+
+@_memoized(shared=False)
+async def _get_comparison_index_async(session: AsyncSession, user_id: int, lookback: str) -> dict:
+    """
+    Portfolio values and SPY prices carried forward on a weekday axis from `lookback` (or the
+    portfolio start, if earlier) to the last history date. Built once per data version and
+    lookback day, so every baseline is a rebase of these arrays. Raises LookupError without
+    SPY data (not memoized, so the next request fetches again).
+    """
+    h = PortfolioHistoryRecord
+    rows = (await session.exec(select(h.date, h.total_value).where(h.user_id == user_id).order_by(h.date))).all()
+    history_dates = analytics.to_dates([r.date for r in rows])
+    history_values = np.array([r.total_value for r in rows], dtype=np.float64)
+    first = min(np.datetime64(lookback), history_dates[0])
+    axis = analytics.session_axis(first, history_dates[-1])
+
+    # One fetch covers every baseline the selector can reach (yfinance is blocking)
+    spy = await run_in_threadpool(get_real_stock_data, "SPY", datetime.strptime(str(first), '%Y-%m-%d'), datetime.now())
+    if not spy:
+        raise LookupError("No SPY prices")
+    spy_dates, spy_prices = analytics.dated_series(spy, positive=True)
+
+    return {
+        "axis": axis,
+        "start": history_dates[0],
+        "history_dates": history_dates,
+        "history_values": history_values,
+        "portfolio": analytics.observed_index(axis, history_dates, history_values),
+        "spy_dates": spy_dates,
+        "spy_prices": spy_prices,
+        "spy": analytics.observed_index(axis, spy_dates, spy_prices),
+    }
+
+
+def _rebase_comparison(index: dict, baseline_date: str) -> tuple[np.ndarray, dict[str, np.ndarray]] | None:
+    """
+    Dates and $10k growth of the portfolio and SPY from `baseline_date` to the last history
+    date, or None without a SPY quote from the baseline on. Each series is rebased to its
+    value carried forward to the baseline (the last one seen on or before it), or, with none
+    yet, its first value after it; the portfolio is flat before it started. Gaps carry the
+    last value seen since the baseline. This is level[t] / level[baseline] of the index that
+    /api/comparison/spy/index serves.
+    """
+    baseline = np.datetime64(baseline_date)
+    axis = index["axis"]
+    i0 = int(np.searchsorted(axis, baseline))
+    if analytics.first_on_or_after(index["spy_dates"], index["spy_prices"], baseline) is None:
+        return None
+
+    def carried(name: str) -> float | None:
+        filled, last = index[name]
+        return filled[i0] if i0 < len(axis) and last[i0] >= 0 else None
+
+    spy_base = carried("spy") or analytics.first_on_or_after(index["spy_dates"], index["spy_prices"], baseline)
+    portfolio_base = carried("portfolio") if baseline >= index["start"] else None
+    if not portfolio_base or not np.isfinite(portfolio_base):
+        portfolio_base = index["history_values"][0] or 1.0
+
+    dates = axis[i0:]
+    return dates, {
+        'portfolio': np.where(dates < index["start"], 1.0, analytics.rebase(*index["portfolio"], i0, portfolio_base)) * 10000,
+        'spy': analytics.rebase(*index["spy"], i0, spy_base) * 10000,
+    }
+
+
+@app.get("/api/comparison/spy")
+async def get_spy_comparison(request: Request, baseline_date: str = None, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    $10k in the portfolio vs $10k in SPY from `baseline_date` (default: portfolio start),
+    downsampled to about max_points points, as rows or columns (format=columnar). The aligned
+    series is built once per data version, so moving the baseline only rebases it.
+    """
+    _check_max_points(max_points)
+    _check_series_format(response_format)
+    columnar = response_format == "columnar"
+    empty = _series_response(request, {"comparison": {"dates": [], "portfolio": [], "spy": []} if columnar else []})
+    summary = await _get_portfolio_summary_async(session, current_user.id)
+    if summary.history_start is None:
+        return empty
+
     # Use provided baseline_date or default to portfolio start
     baseline_date = (
-        validate_baseline_date(baseline_date, portfolio_start_date)
-        if baseline_date else portfolio_start_date
+        validate_baseline_date(baseline_date, summary.history_start)
+        if baseline_date else summary.history_start
     )
-    
-    # Always get extended data range to show proper comparison from baseline
-    baseline_dt = datetime.strptime(baseline_date, '%Y-%m-%d')
-    end_dt = datetime.strptime(history[-1]['date'], '%Y-%m-%d')
-    
-    # Get SPY data from baseline date
-    spy_prices = get_real_stock_data("SPY", baseline_dt, datetime.now())
-    if not spy_prices:
-        return JSONResponse(content={"comparison": []})
-    
-    # Get baseline SPY price (what SPY was worth on baseline date)
-    baseline_spy_price = spy_prices.get(baseline_date)
-    if not baseline_spy_price:
-        # Find nearest available price
-        for date in sorted(spy_prices.keys()):
-            if date >= baseline_date:
-                baseline_spy_price = spy_prices[date]
-                break
-    
-    if not baseline_spy_price:
-        return JSONResponse(content={"comparison": []})
-    
-    # Get baseline portfolio composition (what portfolio would have been on baseline date)
-    baseline_portfolio_price = None
-    if baseline_date >= portfolio_start_date:
-        # Portfolio existed at baseline - find its value
-        portfolio_record = next((h for h in history if h['date'] >= baseline_date), None)
-        if portfolio_record:
-            baseline_portfolio_price = portfolio_record['total_value']
-    
-    # If portfolio didn't exist at baseline, we'll simulate it
-    if not baseline_portfolio_price:
-        baseline_portfolio_price = history[0]['total_value'] if history else 1.0
-    
-    comparison = []
-    
-    # Create date range from baseline to present
-    current_date = baseline_dt
-    while current_date <= end_dt:
-        date_str = current_date.strftime('%Y-%m-%d')
-        
-        # Skip weekends
-        if current_date.weekday() >= 5:
-            current_date += timedelta(days=1)
-            continue
-        
-        # Portfolio logic: Show what $10k invested in "your portfolio strategy" would be worth
-        if date_str < portfolio_start_date:
-            # Before portfolio existed - flat at $10k
-            portfolio_value = 10000.0
-        else:
-            # Find matching portfolio record
-            portfolio_record = next((h for h in history if h['date'] == date_str), None)
-            if portfolio_record:
-                # Calculate growth from baseline: ($10k * current_value / baseline_value)
-                portfolio_growth = (portfolio_record['total_value'] / baseline_portfolio_price) * 10000
-                portfolio_value = round(portfolio_growth, 2)
-            else:
-                # Use previous portfolio value
-                if comparison:
-                    portfolio_value = comparison[-1]['portfolio']
-                else:
-                    portfolio_value = 10000.0
-        
-        # SPY logic: Show what $10k invested in SPY at baseline would be worth
-        spy_price = spy_prices.get(date_str)
-        if spy_price:
-            spy_growth = (spy_price / baseline_spy_price) * 10000
-            spy_value = round(spy_growth, 2)
-        else:
-            # Use previous SPY value
-            if comparison:
-                spy_value = comparison[-1]['spy']
-            else:
-                spy_value = 10000.0
-        
-        comparison.append({
-            'date': date_str,
-            'portfolio': portfolio_value,
-            'spy': spy_value
-        })
-        
-        current_date += timedelta(days=1)
-    
-    return JSONResponse(content={"comparison": comparison})
+    try:
+        index = await _get_comparison_index_async(session, current_user.id, _comparison_lookback())
+    except LookupError:
+        return empty
+    rebased = _rebase_comparison(index, baseline_date)
+    if rebased is None:
+        return empty
+    comparison = _growth_series(*rebased, max_points, columnar)
+    points = len(comparison['dates'] if columnar else comparison)
+    return _series_response(request, {"comparison": comparison, "points": points, "total_points": len(rebased[0])})
+
+
+@app.get("/api/comparison/spy/index")
+async def get_spy_comparison_index(current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    The whole comparison index in one payload, for clients that rebase locally: growth of 1
+    for the portfolio (1 before it started) and SPY (null before its first quote) on every
+    weekday the baseline selector can reach. Days without a quote carry the last level
+    forward, as /api/comparison/spy does, so growth from baseline b to date t is
+    level[t] / level[b], counting a null level as 1.
+    """
+    summary = await _get_portfolio_summary_async(session, current_user.id)
+    if summary.history_start is None:
+        return JSONResponse(content={"dates": [], "portfolio": [], "spy": [], "portfolio_start": None})
+    try:
+        index = await _get_comparison_index_async(session, current_user.id, _comparison_lookback())
+    except LookupError:
+        return JSONResponse(content={"dates": [], "portfolio": [], "spy": [], "portfolio_start": None})
+
+    axis = index["axis"]
+    portfolio = np.where(axis < index["start"], 1.0, analytics.rebase(*index["portfolio"], 0, index["history_values"][0] or 1.0))
+    spy_filled, spy_last = index["spy"]
+    first_quote = spy_filled[np.flatnonzero(spy_last >= 0)[0]] if (spy_last >= 0).any() else 1.0
+    spy = np.where(spy_last >= 0, spy_filled / first_quote, np.nan)
+    return JSONResponse(content={
+        "dates": axis.astype(str).tolist(),
+        "portfolio": [round(v, 8) if np.isfinite(v) else None for v in portfolio.tolist()],
+        "spy": [round(v, 8) if np.isfinite(v) else None for v in spy.tolist()],
+        "portfolio_start": str(index["start"]),
+        "data_version": summary.data_version,
+    })
 
 @app.get("/api/search/stocks")
 async def search_stocks(query: str):
@@ -1232,29 +2332,23 @@ async def search_stocks(query: str):
         return JSONResponse(content={"results": []})
 
 @app.get("/api/comparison/custom")
-async def get_custom_comparison(symbols: str, baseline_date: str = None, start_date: str = None, end_date: str = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_custom_comparison(request: Request, symbols: str, baseline_date: str = None, start_date: str = None, end_date: str = None, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     """Get normalized growth comparison data for custom symbols along with portfolio and SPY"""
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
+    _check_max_points(max_points)
+    _check_series_format(response_format)
+    columnar = response_format == "columnar"
+    empty = _series_response(request, {"comparison": {"dates": []} if columnar else []})
+    h = PortfolioHistoryRecord
+    rows = session.exec(select(h.date, h.total_value, h.spy_price).where(h.user_id == current_user.id).order_by(h.date)).all()
     if not rows:
-        return JSONResponse(content={"comparison": []})
+        return empty
     
     # Parse symbols
     symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
     if not symbol_list:
-        return JSONResponse(content={"comparison": []})
-    
-    # Get portfolio history
-    history = [
-        {
-            'date': r.date,
-            'total_value': r.total_value,
-            'spy_price': r.spy_price,
-        } for r in rows
-    ]
-    if not history:
-        return JSONResponse(content={"comparison": []})
+        return empty
     
-    portfolio_start_date = history[0]['date']
+    portfolio_start_date = rows[0].date
     
     # Use provided baseline_date or default to portfolio start
     if baseline_date:
@@ -1266,21 +2360,16 @@ async def get_custom_comparison(symbols: str, baseline_date: str = None, start_d
     actual_start_date = min(baseline_date, portfolio_start_date)
     
     # Filter by date range if provided (for display purposes)
-    if start_date or end_date:
-        filtered_history = []
-        for day in history:
-            if start_date and day['date'] < start_date:
-                continue
-            if end_date and day['date'] > end_date:
-                continue
-            filtered_history.append(day)
-        display_history = filtered_history
-    else:
-        display_history = history
+    display_rows = [
+        r for r in rows
+        if not (start_date and r.date < start_date) and not (end_date and r.date > end_date)
+    ]
+    display_dates = analytics.to_dates([r.date for r in display_rows])
+    display_values = np.array([r.total_value for r in display_rows], dtype=np.float64)
     
     # Get extended date range for data fetching
     start_dt = datetime.strptime(actual_start_date, '%Y-%m-%d')
-    end_dt = datetime.strptime(history[-1]['date'], '%Y-%m-%d')
+    end_dt = datetime.strptime(rows[-1].date, '%Y-%m-%d')
     
     # Fetch custom symbol data from the extended range
     custom_data = {}
@@ -1288,129 +2377,51 @@ async def get_custom_comparison(symbols: str, baseline_date: str = None, start_d
         try:
             prices = get_real_stock_data(symbol, start_dt, end_dt)
             if prices:
-                custom_data[symbol] = prices
+                custom_data[symbol] = analytics.dated_series(prices, positive=True)
         except Exception as e:
             print(f"Error fetching data for {symbol}: {e}")
     
-    # Always get SPY data for proper baseline comparison
+    # Always get SPY data for proper baseline comparison; stored SPY prices are the fallback
     spy_prices = get_real_stock_data("SPY", start_dt, end_dt)
-    
-    # Get baseline prices for all symbols (what they were worth on baseline date)
-    baseline_spy_price = None
-    baseline_custom_prices = {}
-    
-    # Get SPY baseline price
+    baseline = np.datetime64(baseline_date)
+    bases = {}
     if spy_prices:
-        baseline_spy_price = spy_prices.get(baseline_date)
-        if not baseline_spy_price:
-            for date in sorted(spy_prices.keys()):
-                if date >= baseline_date:
-                    baseline_spy_price = spy_prices[date]
-                    break
-    elif display_history:
-        baseline_spy_price = display_history[0]['spy_price']
-    
-    # Get baseline portfolio value (for normalization)
-    baseline_portfolio_price = None
-    if baseline_date >= portfolio_start_date:
-        # Portfolio existed at baseline - find its value
-        portfolio_record = next((h for h in display_history if h['date'] >= baseline_date), None)
-        if portfolio_record:
-            baseline_portfolio_price = portfolio_record['total_value']
-    
-    # If portfolio didn't exist at baseline, use first available value for proportional scaling
-    if not baseline_portfolio_price:
-        baseline_portfolio_price = display_history[0]['total_value'] if display_history else 1.0
-    
-    # Get custom symbol baseline prices
-    for symbol in symbol_list:
-        if symbol in custom_data:
-            prices = custom_data[symbol]
-            baseline_price = prices.get(baseline_date)
-            if not baseline_price:
-                for date in sorted(prices.keys()):
-                    if date >= baseline_date:
-                        baseline_price = prices[date]
-                        break
-            if baseline_price:
-                baseline_custom_prices[symbol] = baseline_price
-    
-    # Build comparison data
-    comparison = []
-    
-    # Create date range from baseline to end
-    current_date = datetime.strptime(baseline_date, '%Y-%m-%d')
-    end_date_dt = datetime.strptime(display_history[-1]['date'] if display_history else history[-1]['date'], '%Y-%m-%d')
+        spy_series = analytics.dated_series(spy_prices, positive=True)
+    else:
+        spy_series = (display_dates, np.array([r.spy_price if r.spy_price and r.spy_price > 0 else np.nan for r in display_rows], dtype=np.float64))
+        bases['spy'] = display_rows[0].spy_price if display_rows else None
     
-    while current_date <= end_date_dt:
-        date_str = current_date.strftime('%Y-%m-%d')
-        
-        comparison_point = {
-            'date': date_str,
-            'portfolio': 10000.0,  # Default
-            'spy': 10000.0         # Default
-        }
-        
-        # Portfolio logic: Show what $10k invested in "your portfolio strategy" at baseline would be worth
-        if date_str < portfolio_start_date:
-            # Before portfolio existed - flat at $10k
-            comparison_point['portfolio'] = 10000.0
-        else:
-            # Find matching portfolio record
-            portfolio_record = next((h for h in display_history if h['date'] == date_str), None)
-            if portfolio_record and baseline_portfolio_price > 0:
-                # Calculate growth from baseline: ($10k * current_value / baseline_value)
-                portfolio_growth = (portfolio_record['total_value'] / baseline_portfolio_price) * 10000
-                comparison_point['portfolio'] = round(portfolio_growth, 2)
-            else:
-                # Use previous portfolio value
-                if comparison:
-                    comparison_point['portfolio'] = comparison[-1]['portfolio']
-                else:
-                    comparison_point['portfolio'] = 10000.0
-        
-        # SPY logic: Show what $10k invested in SPY at baseline would be worth
-        spy_price = None
-        if spy_prices:
-            spy_price = spy_prices.get(date_str)
-        else:
-            # Use portfolio history SPY data
-            portfolio_record = next((h for h in display_history if h['date'] == date_str), None)
-            if portfolio_record:
-                spy_price = portfolio_record['spy_price']
-        
-        if spy_price and baseline_spy_price and baseline_spy_price > 0:
-            spy_growth = (spy_price / baseline_spy_price) * 10000
-            comparison_point['spy'] = round(spy_growth, 2)
-        else:
-            # Use previous SPY value
-            if comparison:
-                comparison_point['spy'] = comparison[-1]['spy']
-            else:
-                comparison_point['spy'] = 10000.0
-        
-        # Custom symbols logic: Show what $10k invested in each symbol at baseline would be worth
-        for symbol in symbol_list:
-            if symbol in baseline_custom_prices:
-                symbol_price = custom_data[symbol].get(date_str)
-                if symbol_price and baseline_custom_prices[symbol] > 0:
-                    # Calculate growth from baseline: ($10k * current_price / baseline_price)
-                    symbol_growth = (symbol_price / baseline_custom_prices[symbol]) * 10000
-                    comparison_point[symbol.lower()] = round(symbol_growth, 2)
-                else:
-                    # Use previous value
-                    if comparison and symbol.lower() in comparison[-1]:
-                        comparison_point[symbol.lower()] = comparison[-1][symbol.lower()]
-                    else:
-                        comparison_point[symbol.lower()] = 10000.0
-        
-        comparison.append(comparison_point)
-        current_date += timedelta(days=1)
+    # Portfolio base: its value on (or after) the baseline, or its first value when the
+    # baseline predates it (the portfolio is flat at $10k until it starts)
+    portfolio_base = None
+    if baseline_date >= portfolio_start_date:
+        pos = int(np.searchsorted(display_dates, baseline))
+        if pos < len(display_rows):
+            portfolio_base = display_rows[pos].total_value
+    if not portfolio_base:
+        portfolio_base = display_rows[0].total_value if display_rows else 1.0
+    bases['portfolio'] = portfolio_base
     
-    return JSONResponse(content={"comparison": comparison})
+    # Every calendar day from the baseline to the last displayed date
+    display_end = display_dates[-1] if len(display_dates) else analytics.to_dates([rows[-1].date])[0]
+    axis = np.arange(baseline, display_end + 1) if baseline <= display_end else np.array([], dtype="datetime64[D]")
+    growth = analytics.normalize(axis, {
+        'portfolio': (display_dates, display_values),
+        'spy': spy_series,
+        **{symbol.lower(): series for symbol, series in custom_data.items()},
+    }, baseline, bases)
+    flat = np.ones(len(axis))
+    columns = {
+        'portfolio': np.where(axis < np.datetime64(portfolio_start_date), 1.0, growth.get('portfolio', flat)) * 10000,
+        'spy': growth.get('spy', flat) * 10000,
+        **{symbol.lower(): growth[symbol.lower()] * 10000 for symbol in symbol_list if symbol.lower() in growth},
+    }
+    comparison = _growth_series(axis, columns, max_points, columnar)
+    points = len(comparison['dates'] if columnar else comparison)
+    return _series_response(request, {"comparison": comparison, "points": points, "total_points": len(axis)})
 
 @app.get("/api/social/profiles")
-async def list_public_profiles(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def list_public_profiles(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     profiles = session.exec(select(UserProfile).where(UserProfile.is_public == True)).all()
     users = {u.id: u for u in session.exec(select(User)).all()}
     data = []
@@ -1428,7 +2439,7 @@ async def list_public_profiles(current_user: User = Depends(get_current_user), s
 
 
 @app.get("/api/social/profile")
-async def get_my_profile(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_my_profile(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     p = _get_or_create_profile(session, current_user.id)
     return {
         "display_name": p.display_name or (current_user.name or current_user.email.split("@")[0]),
@@ -1439,7 +2450,7 @@ async def get_my_profile(current_user: User = Depends(get_current_user), session
 
 
 @app.put("/api/social/profile")
-async def update_my_profile(payload: ProfileUpdate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def update_my_profile(payload: ProfileUpdate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     p = _get_or_create_profile(session, current_user.id)
     if payload.display_name is not None:
         p.display_name = payload.display_name
@@ -1465,7 +2476,7 @@ def _authorize_view(session: Session, viewer_id: int, target_user_id: int) -> Us
 
 
 @app.get("/api/social/performance")
-async def social_performance(user_id: int, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def social_performance(user_id: int, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     profile = _authorize_view(session, current_user.id, user_id)
     rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == user_id)).all()
     if not rows:
@@ -1487,14 +2498,13 @@ async def social_performance(user_id: int, baseline_date: str | None = None, cur
 
 
 @app.get("/api/social/weights")
-async def social_weights(user_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def social_weights(user_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     profile = _authorize_view(session, current_user.id, user_id)
     if profile.share_performance_only:
         return JSONResponse(content={"weights": []})
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == user_id)).all()
-    if not rows:
+    latest = session.get(PortfolioLatest, user_id)
+    if not latest:
         return JSONResponse(content={"weights": []})
-    latest = max(rows, key=lambda r: r.date)
     positions = json.loads(latest.positions_json or "[]")
     if profile.anonymize_symbols:
         for idx, p in enumerate(positions, start=1):
@@ -1503,8 +2513,54 @@ async def social_weights(user_id: int, current_user: User = Depends(get_current_
     return JSONResponse(content={"weights": positions, "as_of": latest.date})
 
 
+def _normalized_histories(session: Session, user_ids: list[int], baseline_date: str | None, max_points: int, columnar: bool = False) -> dict[int, list[dict] | dict]:
+    """
+    $10k growth of each user's portfolio from `baseline_date` (default: their own start) on
+    their history dates, loaded with one query for all users and downsampled to about
+    max_points per user, as {date, value} rows or {"dates", "value"} columns. Each is rebased
+    to its first value on or after the baseline (its first value if there is none); users
+    without history get no points.
+    """
+    _check_max_points(max_points)
+    if baseline_date:
+        try:
+            baseline = np.datetime64(datetime.strptime(baseline_date, '%Y-%m-%d').date(), 'D')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="baseline_date must be YYYY-MM-DD")
+    h = PortfolioHistoryRecord
+    rows = session.exec(
+        select(h.user_id, h.date, h.total_value).where(h.user_id.in_(set(user_ids))).order_by(h.user_id, h.date)
+    ).all()
+    by_user: dict[int, list] = {}
+    for r in rows:
+        by_user.setdefault(r.user_id, []).append(r)
+
+    series: dict[int, list[dict]] = {}
+    for uid in user_ids:
+        user_rows = by_user.get(uid)
+        if not user_rows:
+            series[uid] = {"dates": [], "value": []} if columnar else []
+            continue
+        dates = analytics.to_dates([r.date for r in user_rows])
+        values = np.array([r.total_value for r in user_rows], dtype=np.float64)
+        base_date = baseline if baseline_date else dates[0]
+        pos = int(np.searchsorted(dates, base_date))
+        base = values[pos] if pos < len(values) else values[0]
+        growth = analytics.normalize(dates, {'value': (dates, values)}, base_date, {'value': base})
+        points = growth.get('value', np.ones(len(dates) - pos)) * 10000
+        idx = _chart_indices(dates[pos:], points, max_points)
+        if columnar:
+            series[uid] = {"dates": dates[pos:][idx].astype(str).tolist(), "value": np.round(points[idx], 2)}
+            continue
+        series[uid] = [
+            {"date": d, "value": round(v, 2)}
+            for d, v in zip(dates[pos:][idx].astype(str).tolist(), points[idx].tolist())
+        ]
+    return series
+
+
 @app.get("/api/social/comparison")
-async def social_comparison(user_ids: str, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def social_comparison(request: Request, user_ids: str, baseline_date: str | None = None, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     ids = []
     for s in user_ids.split(','):
         s = s.strip()
@@ -1514,27 +2570,13 @@ async def social_comparison(user_ids: str, baseline_date: str | None = None, cur
             ids.append(int(s))
         except ValueError:
             continue
+    _check_series_format(response_format)
     if not ids:
-        return JSONResponse(content={"series": {}})
-    series: dict[int, list[dict]] = {}
+        return _series_response(request, {"series": {}})
     for uid in ids:
         _authorize_view(session, current_user.id, uid)
-        rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == uid)).all()
-        if not rows:
-            series[uid] = []
-            continue
-        hist = sorted([{ "date": r.date, "total_value": r.total_value } for r in rows], key=lambda x: x["date"]) 
-        start = hist[0]['date']
-        base = baseline_date or start
-        base_value = next((h['total_value'] for h in hist if h['date'] >= base), hist[0]['total_value'])
-        points = []
-        for h in hist:
-            if h['date'] < base:
-                continue
-            v = round((h['total_value'] / base_value) * 10000, 2) if base_value > 0 else 10000.0
-            points.append({"date": h['date'], "value": v})
-        series[uid] = points
-    return JSONResponse(content={"series": series})
+    series = _normalized_histories(session, ids, baseline_date, max_points, response_format == "columnar")
+    return _series_response(request, {"series": series})
 
 
 # =====================
@@ -1547,7 +2589,7 @@ def _generate_group_code(length: int = 6) -> str:
 
 
 @app.post("/api/groups")
-async def create_group(payload: GroupCreate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def create_group(payload: GroupCreate, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     code = _generate_group_code()
     # Ensure unique code
     while session.exec(select(Group).where(Group.code == code)).first() is not None:
@@ -1563,7 +2605,7 @@ async def create_group(payload: GroupCreate, current_user: User = Depends(get_cu
 
 
 @app.post("/api/groups/join")
-async def join_group(payload: GroupJoin, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def join_group(payload: GroupJoin, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     g = session.exec(select(Group).where(Group.code == payload.code.upper())).first()
     if not g:
         raise HTTPException(status_code=404, detail="Group not found")
@@ -1576,7 +2618,7 @@ async def join_group(payload: GroupJoin, current_user: User = Depends(get_curren
 
 
 @app.get("/api/groups")
-async def my_groups(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def my_groups(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     memberships = session.exec(select(GroupMember).where(GroupMember.user_id == current_user.id)).all()
     group_ids = [m.group_id for m in memberships]
     groups = []
@@ -1590,7 +2632,7 @@ async def my_groups(current_user: User = Depends(get_current_user), session: Ses
 
 
 @app.get("/api/debug/user/{user_id}/transactions")
-async def debug_user_transactions(user_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def debug_user_transactions(user_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     """Debug endpoint to see what transactions are being included/excluded"""
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Can only debug your own transactions")
@@ -1634,27 +2676,31 @@ async def debug_user_transactions(user_id: int, current_user: User = Depends(get
 
 
 @app.get("/api/groups/{group_id}/leaderboard")
-async def group_leaderboard(group_id: int, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_leaderboard(group_id: int, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     # Ensure membership
     _ensure_group_membership(session, group_id, current_user.id)
     members = session.exec(select(GroupMember).where(GroupMember.group_id == group_id)).all()
+    member_ids = [m.user_id for m in members]
     leaderboard = []
+    profiles = _get_or_create_profiles(session, member_ids)
+    users = {u.id: u for u in session.exec(select(User).where(User.id.in_(member_ids))).all()}
+    # Use time-weighted return as ranking return, for the whole group in one query
+    twrs = _compute_time_weighted_returns(session, member_ids, baseline_date)
+    # Money-weighted returns for the whole group in one solve
+    money_weighted = _compute_money_weighted_returns(session, member_ids, baseline_date)
     
-    for m in members:
+    for uid in member_ids:
         # Within a group, show all members irrespective of public profile settings
-        user = session.exec(select(User).where(User.id == m.user_id)).first()
-        profile = _get_or_create_profile(session, m.user_id)
+        user = users.get(uid)
+        profile = profiles[uid]
+        ret = twrs[uid].get("twr_pct", 0.0)
         
-        # Use time-weighted return as ranking return
-        twr_kwargs = {"start_date": baseline_date} if baseline_date else {}
-        twr = _compute_time_weighted_return(session, m.user_id, **twr_kwargs)
-        ret = twr.get("twr_pct", 0.0)
-        
-        display_name = (profile.display_name or user.name or user.email.split("@")[0]) if user else f"User {m.user_id}"
+        display_name = (profile.display_name or user.name or user.email.split("@")[0]) if user else f"User {uid}"
         leaderboard.append({
-            "user_id": m.user_id, 
+            "user_id": uid, 
             "name": display_name, 
             "return_pct": round(ret, 2),
+            "xirr_pct": money_weighted[uid]["xirr_pct"],
             "normalized_value": 0,
             "total_invested": 0
         })
@@ -1670,7 +2716,7 @@ async def group_leaderboard(group_id: int, baseline_date: str | None = None, cur
 
 
 @app.get("/api/groups/{group_id}")
-async def get_group(group_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_group(group_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     membership = session.exec(select(GroupMember).where((GroupMember.group_id == group_id) & (GroupMember.user_id == current_user.id))).first()
     if not membership:
         raise HTTPException(status_code=403, detail="Not in group")
@@ -1725,40 +2771,33 @@ def _ensure_group_membership(session: Session, group_id: int, user_id: int) -> N
         raise HTTPException(status_code=403, detail="Not in group")
 
 
+def _lot_book_plan(user_id: int, method: str):
+    all_tx_rows = yield _all(_transactions_statement(user_id))
+    return LotBook.from_transactions((tx for tx in all_tx_rows if _is_stock_transaction(tx.action, tx.symbol)), method)
+
+
+@_memoized(shared=False)
+def _get_lot_book(session: Session, user_id: int, method: str = "average") -> LotBook:
+    """The user's lots, replayed from stored stock transactions once per data version."""
+    return _run_query_plan(session, _lot_book_plan(user_id, method))
+
+
+@_memoized(shared=False)
+async def _get_lot_book_async(session: AsyncSession, user_id: int, method: str = "average") -> LotBook:
+    """_get_lot_book() on an AsyncSession."""
+    return await _run_query_plan_async(session, _lot_book_plan(user_id, method))
+
+
+@_memoized()
 def _compute_cost_basis(session: Session, user_id: int) -> dict[str, dict[str, float]]:
-    # Get all transactions for the user, then filter programmatically
-    all_tx_rows = session.exec(
-        select(TransactionRecord).where(TransactionRecord.user_id == user_id)
-    ).all()
-    
-    # Filter to only stock transactions (exclude money transfers)
-    tx_rows = [tx for tx in all_tx_rows if _is_stock_transaction(tx.action, tx.symbol)]
-    
-    print(f"DEBUG user_id={user_id}: total_transactions={len(all_tx_rows)}, stock_transactions={len(tx_rows)}")
-    excluded_tx = [tx for tx in all_tx_rows if not _is_stock_transaction(tx.action, tx.symbol)]
-    print(f"DEBUG user_id={user_id}: excluded_transactions examples: {[(tx.action, tx.symbol, tx.amount) for tx in excluded_tx[:5]]}")
-    print(f"DEBUG user_id={user_id}: included_transactions examples: {[(tx.action, tx.symbol, tx.amount) for tx in tx_rows[:5]]}")
-    
-    cost_basis: dict[str, dict[str, float]] = {}
-    for r in tx_rows:
-        symbol = r.symbol
-        if not symbol or symbol == 'Cash':
-            continue
-        if symbol not in cost_basis:
-            cost_basis[symbol] = {'total_cost': 0.0, 'total_shares': 0.0}
-        if 'BOUGHT' in r.action or 'Buy' in r.action:
-            cost_basis[symbol]['total_cost'] += abs(r.amount)
-            cost_basis[symbol]['total_shares'] += r.quantity
-        elif 'SOLD' in r.action or 'Sell' in r.action:
-            if cost_basis[symbol]['total_shares'] > 0:
-                avg_cost_per_share = cost_basis[symbol]['total_cost'] / max(cost_basis[symbol]['total_shares'], 1e-9)
-                sold_cost = avg_cost_per_share * abs(r.quantity)
-                cost_basis[symbol]['total_cost'] -= sold_cost
-                cost_basis[symbol]['total_shares'] -= abs(r.quantity)
-        elif 'REINVESTMENT' in r.action:
-            cost_basis[symbol]['total_cost'] += abs(r.amount)
-            cost_basis[symbol]['total_shares'] += r.quantity
-    return cost_basis
+    """Average cost basis per symbol from stock transactions (money transfers excluded)."""
+    return _get_lot_book(session, user_id).cost_basis()
+
+
+@_memoized()
+async def _compute_cost_basis_async(session: AsyncSession, user_id: int) -> dict[str, dict[str, float]]:
+    """_compute_cost_basis() on an AsyncSession."""
+    return (await _get_lot_book_async(session, user_id)).cost_basis()
 
 
 def _get_user_positions(session: Session, user_id: int) -> list[dict]:
@@ -1841,6 +2880,25 @@ def _compute_normalized_portfolio_performance(session: Session, user_id: int, po
     }
 
 
+def _history_statement(user_id: int):
+    """A user's stored portfolio history snapshots in date order."""
+    return (
+        select(PortfolioHistoryRecord)
+        .where(PortfolioHistoryRecord.user_id == user_id)
+        .order_by(PortfolioHistoryRecord.date)
+    )
+
+
+def _transactions_statement(user_id: int):
+    """A user's transactions in storage order."""
+    return select(TransactionRecord).where(TransactionRecord.user_id == user_id)
+
+
+def _twr_window_rows_statement(user_id: int, first, last):
+    return _history_statement(user_id).where((PortfolioHistoryRecord.date >= first.date) & (PortfolioHistoryRecord.date <= last.date))
+
+
+@_memoized()
 def _compute_time_weighted_return(
     session: Session,
     user_id: int,
@@ -1853,13 +2911,179 @@ def _compute_time_weighted_return(
     positions (and does not model cash flows), subtracting external cash flows would
     distort returns. We therefore compute pure time-weighted daily returns as
     r_t = V_t / V_{t-1} - 1, and compound them: Π(1+r_t) - 1. Annualize if window > 365 days.
+
+    The compounding is precomputed as a per-snapshot prefix growth index, so any window is
+    the ratio of the index at its last and first snapshots: two indexed lookups, one division.
     """
-    rows = session.exec(
-        select(PortfolioHistoryRecord)
-        .where(PortfolioHistoryRecord.user_id == user_id)
-        .order_by(PortfolioHistoryRecord.date)
-    ).all()
+    return _run_query_plan(session, _time_weighted_return_plan(user_id, start_date, end_date))
+
+
+@_memoized()
+async def _compute_time_weighted_return_async(
+    session: AsyncSession,
+    user_id: int,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict:
+    """_compute_time_weighted_return() on an AsyncSession."""
+    return await _run_query_plan_async(session, _time_weighted_return_plan(user_id, start_date, end_date))
+
+
+def _time_weighted_return_plan(user_id: int, start_date: str | None, end_date: str | None):
+    first = yield _first(_history_edge_statement(user_id, start_date, end_date, newest=False))
+    last = yield _first(_history_edge_statement(user_id, start_date, end_date, newest=True))
+    if first is None or last is None or first.date >= last.date:
+        # Fewer than two snapshots in the window: use the whole history
+        first = yield _first(_history_edge_statement(user_id, None, None, newest=False))
+        last = yield _first(_history_edge_statement(user_id, None, None, newest=True))
+        if first is None or last is None or first.date >= last.date:
+            return _twr_result(0.0, 0)
+    result = _twr_from_index(first, last)
+    if result is None:
+        rows = yield _all(_twr_window_rows_statement(user_id, first, last))
+        result = _twr_from_history(rows, None, None)
+    return result
+
+
+def _history_edge_statement(
+    user_id: int,
+    start_date: str | None,
+    end_date: str | None,
+    newest: bool,
+    inclusive: bool = True,
+):
+    """First (or newest) snapshot of a user's history within [start_date, end_date], index columns only."""
+    h = PortfolioHistoryRecord
+    stmt = select(h.date, h.total_value, h.growth_index, h.growth_steps).where(h.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(h.date >= start_date)
+    if end_date:
+        stmt = stmt.where(h.date <= end_date if inclusive else h.date < end_date)
+    return stmt.order_by(h.date.desc() if newest else h.date).limit(1)
+
+
+def _history_edges_statement(user_ids: List[int], start_date: str | None, end_date: str | None):
+    """
+    First and newest snapshot of every user's history within [start_date, end_date], in one
+    query: the boundary dates come from the (user_id, date) index alone, and only the rows
+    at those dates are read.
+    """
+    h = PortfolioHistoryRecord
+    bounds = select(h.user_id, func.min(h.date).label("first_date"), func.max(h.date).label("last_date")).where(h.user_id.in_(user_ids))
+    if start_date:
+        bounds = bounds.where(h.date >= start_date)
+    if end_date:
+        bounds = bounds.where(h.date <= end_date)
+    bounds = bounds.group_by(h.user_id).subquery()
+    return (
+        select(
+            h.user_id, h.date, h.total_value, h.growth_index, h.growth_steps,
+            (h.date == bounds.c.first_date).label("is_first"),
+            (h.date == bounds.c.last_date).label("is_last"),
+        )
+        .join(bounds, (h.user_id == bounds.c.user_id) & h.date.in_([bounds.c.first_date, bounds.c.last_date]))
+    )
+
+
+def _fold_history_edges(rows: list) -> dict[int, tuple]:
+    """{user_id: (first, newest)} from the rows of _history_edges_statement()."""
+    edges: dict[int, tuple] = {}
+    for row in rows:
+        first, last = edges.get(row.user_id, (None, None))
+        edges[row.user_id] = (row if row.is_first else first, row if row.is_last else last)
+    return edges
+
+
+def _history_edges_plan(user_ids: List[int], start_date: str | None, end_date: str | None):
+    if not user_ids:
+        return {}
+    return _fold_history_edges((yield _all(_history_edges_statement(user_ids, start_date, end_date))))
+
+
+def _history_edges(session: Session, user_ids: List[int], start_date: str | None, end_date: str | None) -> dict[int, tuple]:
+    """{user_id: (first, newest)} snapshots within the window; users without snapshots are absent."""
+    return _run_query_plan(session, _history_edges_plan(user_ids, start_date, end_date))
+
+
+def _newest_snapshots(session: Session, user_ids: List[int], end_date: str) -> dict[int, PortfolioHistoryRecord]:
+    """{user_id: newest snapshot on or before end_date}, in one query; users without one are absent."""
+    if not user_ids:
+        return {}
+    h = PortfolioHistoryRecord
+    newest = (
+        select(h.user_id, func.max(h.date).label("date"))
+        .where(h.user_id.in_(user_ids) & (h.date <= end_date))
+        .group_by(h.user_id)
+        .subquery()
+    )
+    rows = session.exec(select(h).join(newest, (h.user_id == newest.c.user_id) & (h.date == newest.c.date))).all()
+    return {r.user_id: r for r in rows}
+
+
+def _edges_span(pair) -> bool:
+    return pair is not None and pair[0].date < pair[1].date
+
+
+def _window_edges_plan(user_ids: List[int], start_date: str | None, end_date: str | None):
+    edges = yield from _history_edges_plan(user_ids, start_date, end_date)
+    short = [uid for uid in user_ids if not _edges_span(edges.get(uid))]
+    if short and (start_date or end_date):
+        edges.update((yield from _history_edges_plan(short, None, None)))
+    return {uid: pair for uid, pair in edges.items() if _edges_span(pair)}
+
+
+def _window_edges(session: Session, user_ids: List[int], start_date: str | None, end_date: str | None) -> dict[int, tuple]:
+    """
+    (first, newest) snapshots per user for a return window: the window's own, or the whole
+    history's when the window holds fewer than two snapshots. At most two queries whatever
+    the number of users; users without two snapshots are left out.
+    """
+    return _run_query_plan(session, _window_edges_plan(user_ids, start_date, end_date))
+
+
+def _compute_time_weighted_returns(
+    session: Session,
+    user_ids: List[int],
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict[int, dict]:
+    """
+    _compute_time_weighted_return() for many users at once, from the stored growth index at
+    each user's boundary snapshots (see _window_edges). Only histories without a growth
+    index fall back to the per-user computation.
+    """
+    edges = _window_edges(session, user_ids, start_date, end_date)
+    results = {}
+    for uid in user_ids:
+        if uid not in edges:
+            results[uid] = _twr_result(0.0, 0)
+            continue
+        results[uid] = _twr_from_index(*edges[uid]) or _compute_time_weighted_return(session, uid, start_date, end_date)
+    return results
+
+
+def _twr_from_index(first, last) -> dict | None:
+    """TWR between two snapshots from their stored growth index; None when it cannot be used."""
+    if first.growth_index is None or last.growth_index is None or first.growth_index <= 0:
+        # Not indexed yet, or worthless at the window start (no defined ratio): compound row by row
+        return None
+    return _twr_result(last.growth_index / first.growth_index - 1.0, int(last.growth_steps - first.growth_steps))
+
+
+def _twr_result(twr: float, days: int) -> dict:
+    twr_pct = round(twr * 100.0, 4)
+    annualized_pct = 0.0
+    if days > 365:
+        try:
+            annualized = (1.0 + twr) ** (365.0 / days) - 1.0
+            annualized_pct = round(annualized * 100.0, 4)
+        except Exception:
+            annualized_pct = twr_pct
+    return {"twr": twr, "twr_pct": twr_pct, "days": days, "annualized_pct": annualized_pct}
 
+
+def _twr_from_history(rows: list[PortfolioHistoryRecord], start_date: str | None, end_date: str | None) -> dict:
+    """Row-by-row TWR over loaded snapshots; the reference for (and fallback of) the growth index."""
     if not rows or len(rows) < 2:
         return {"twr": 0.0, "twr_pct": 0.0, "days": 0, "annualized_pct": 0.0}
 
@@ -1894,19 +3118,10 @@ def _compute_time_weighted_return(
         product *= (1.0 + r_t)
         days += 1
 
-    twr = product - 1.0
-    twr_pct = round(twr * 100.0, 4)
-    annualized_pct = 0.0
-    if days > 365:
-        try:
-            annualized = (1.0 + twr) ** (365.0 / days) - 1.0
-            annualized_pct = round(annualized * 100.0, 4)
-        except Exception:
-            annualized_pct = twr_pct
-
-    return {"twr": twr, "twr_pct": twr_pct, "days": days, "annualized_pct": annualized_pct}
+    return _twr_result(product - 1.0, days)
 
 
+@_memoized()
 def _compute_contribution_adjusted_return(
     session: Session,
     user_id: int,
@@ -1921,11 +3136,32 @@ def _compute_contribution_adjusted_return(
       - pct_of_start_plus_contrib = net_profit / max(starting_value + max(net_contrib, 0), 1e-9)
     External contributions are transactions that are NOT stock/ETF trades (e.g., deposits/withdrawals).
     """
-    rows = session.exec(
-        select(PortfolioHistoryRecord)
-        .where(PortfolioHistoryRecord.user_id == user_id)
-        .order_by(PortfolioHistoryRecord.date)
-    ).all()
+    return _run_query_plan(session, _contribution_adjusted_return_plan(user_id, start_date, end_date))
+
+
+@_memoized()
+async def _compute_contribution_adjusted_return_async(
+    session: AsyncSession,
+    user_id: int,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict:
+    """_compute_contribution_adjusted_return() on an AsyncSession."""
+    return await _run_query_plan_async(session, _contribution_adjusted_return_plan(user_id, start_date, end_date))
+
+
+def _contribution_adjusted_return_plan(user_id: int, start_date: str | None, end_date: str | None):
+    rows = yield _all(_history_statement(user_id))
+    tx_all = (yield _all(_transactions_statement(user_id))) if len(rows) >= 2 else []
+    return _contribution_adjusted_from_rows(rows, tx_all, start_date, end_date)
+
+
+def _contribution_adjusted_from_rows(
+    rows: list[PortfolioHistoryRecord],
+    tx_all: list[TransactionRecord],
+    start_date: str | None,
+    end_date: str | None,
+) -> dict:
     if not rows or len(rows) < 2:
         return {
             "start_value": 0.0,
@@ -1951,9 +3187,6 @@ def _compute_contribution_adjusted_return(
     end_value = float(history[-1].total_value or 0.0)
 
     # Sum external flows (deposits/withdrawals) within (start_date, end_date]
-    tx_all = session.exec(
-        select(TransactionRecord).where(TransactionRecord.user_id == user_id)
-    ).all()
     flows = [t for t in tx_all if not _is_stock_transaction(t.action, t.symbol)]
 
     # If no explicit range, use history bounds
@@ -1982,6 +3215,105 @@ def _compute_contribution_adjusted_return(
     }
 
 
+def _external_flows_statement(edges: dict[int, tuple]):
+    """Transactions of the users in `edges` that may fall inside their windows (filtered in _money_weighted_schedules)."""
+    t = TransactionRecord
+    return select(t.user_id, t.date, t.action, t.symbol, t.amount).where(
+        t.user_id.in_(list(edges))
+        & (t.date > min(first.date for first, _ in edges.values()))
+        & (t.date <= max(last.date for _, last in edges.values()))
+    )
+
+
+def _money_weighted_schedules(
+    user_ids: List[int],
+    edges: dict[int, tuple],
+    rows: list,
+) -> dict[int, tuple[np.ndarray, np.ndarray, str, str] | None]:
+    """
+    Cash-flow schedule per user for a money-weighted return over a window, from the
+    investor's side: the starting value is paid in, external flows (non-stock rows, as in
+    _compute_contribution_adjusted_return) move money in or out, and the ending value is
+    paid back. Each schedule is (dates, amounts, start, end), or None without two snapshots.
+    `edges` come from _window_edges() and `rows` from _external_flows_statement(), so all
+    users cost a constant number of queries.
+    """
+    flows: dict[int, list] = {uid: [] for uid in edges}
+    for r in rows:
+        first, last = edges[r.user_id]
+        if first.date < r.date <= last.date and r.amount and not _is_stock_transaction(r.action, r.symbol):
+            flows[r.user_id].append(r)
+
+    schedules = {}
+    for uid in user_ids:
+        if uid not in edges:
+            schedules[uid] = None
+            continue
+        first, last = edges[uid]
+        dates = [first.date] + [r.date for r in flows[uid]] + [last.date]
+        # A deposit (positive amount) is money the investor puts in
+        amounts = [-float(first.total_value or 0.0)] + [-float(r.amount) for r in flows[uid]] + [float(last.total_value or 0.0)]
+        schedules[uid] = (analytics.to_dates(dates), np.array(amounts, dtype=np.float64), first.date, last.date)
+    return schedules
+
+
+def _xirr_result(rate: float | None, schedule: tuple | None) -> dict:
+    if schedule is None or rate is None or not np.isfinite(rate):
+        return {"xirr": None, "xirr_pct": None, "flows": 0 if schedule is None else len(schedule[1]) - 2,
+                "start_date": schedule[2] if schedule else None, "end_date": schedule[3] if schedule else None}
+    return {
+        "xirr": float(rate),
+        "xirr_pct": round(float(rate) * 100.0, 4),  # annualized
+        "flows": len(schedule[1]) - 2,
+        "start_date": schedule[2],
+        "end_date": schedule[3],
+    }
+
+
+def _compute_money_weighted_returns(
+    session: Session,
+    user_ids: List[int],
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict[int, dict]:
+    """Annualized money-weighted return (XIRR) per user, solved for all users in one vectorized pass."""
+    return _run_query_plan(session, _money_weighted_returns_plan(user_ids, start_date, end_date))
+
+
+def _money_weighted_returns_plan(user_ids: List[int], start_date: str | None, end_date: str | None):
+    edges = yield from _window_edges_plan(user_ids, start_date, end_date)
+    rows = (yield _all(_external_flows_statement(edges))) if edges else []
+    return _xirr_results(_money_weighted_schedules(user_ids, edges, rows))
+
+
+def _xirr_results(schedules: dict[int, tuple | None]) -> dict[int, dict]:
+    solvable = [uid for uid, sched in schedules.items() if sched is not None]
+    rates = dict(zip(solvable, analytics.xirr([schedules[uid][:2] for uid in solvable])))
+    return {uid: _xirr_result(rates.get(uid), sched) for uid, sched in schedules.items()}
+
+
+@_memoized()
+def _compute_money_weighted_return(
+    session: Session,
+    user_id: int,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict:
+    return _compute_money_weighted_returns(session, [user_id], start_date, end_date)[user_id]
+
+
+@_memoized()
+async def _compute_money_weighted_return_async(
+    session: AsyncSession,
+    user_id: int,
+    start_date: str | None = None,
+    end_date: str | None = None,
+) -> dict:
+    """_compute_money_weighted_return() on an AsyncSession."""
+    return (await _run_query_plan_async(session, _money_weighted_returns_plan([user_id], start_date, end_date)))[user_id]
+
+
+@_memoized()
 def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
     """
     Tranche-based return attribution:
@@ -1992,13 +3324,32 @@ def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
       - For each tranche: return_pct = (realized_pnl + unrealized_pnl) / invested_cash.
       - Also return arithmetic average across tranches and capital-weighted average.
     """
-    # Current prices from latest snapshot
-    latest_row = session.exec(
+    return _run_query_plan(session, _deposit_averaged_return_plan(user_id))
+
+
+@_memoized()
+async def _compute_deposit_averaged_return_async(session: AsyncSession, user_id: int) -> dict:
+    """_compute_deposit_averaged_return() on an AsyncSession."""
+    return await _run_query_plan_async(session, _deposit_averaged_return_plan(user_id))
+
+
+def _deposit_averaged_return_plan(user_id: int):
+    latest_row = yield _first(_latest_history_statement(user_id))
+    all_tx = (yield _all(_transactions_statement(user_id).order_by(TransactionRecord.date))) if latest_row else []
+    return _deposit_averaged_from_rows(latest_row, all_tx)
+
+
+def _latest_history_statement(user_id: int):
+    return (
         select(PortfolioHistoryRecord)
         .where(PortfolioHistoryRecord.user_id == user_id)
         .order_by(PortfolioHistoryRecord.date.desc())
         .limit(1)
-    ).first()
+    )
+
+
+def _deposit_averaged_from_rows(latest_row: PortfolioHistoryRecord | None, all_tx: list[TransactionRecord]) -> dict:
+    # Current prices from latest snapshot
     if not latest_row:
         return {"periods": [], "avg_return_pct": 0.0, "weighted_avg_return_pct": 0.0}
     try:
@@ -2006,28 +3357,26 @@ def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
     except Exception:
         latest_positions = {}
 
-    # Load transactions in chronological order
-    all_tx = session.exec(
-        select(TransactionRecord)
-        .where(TransactionRecord.user_id == user_id)
-        .order_by(TransactionRecord.date)
-    ).all()
+    # Transactions arrive in chronological order
     if not all_tx:
         return {"periods": [], "avg_return_pct": 0.0, "weighted_avg_return_pct": 0.0}
 
-    # Build tranches from deposits
+    # Build tranches from deposits. Each buy is split across the tranches whose cash paid for
+    # it, as lots tagged with their tranche in the symbol's lots.Position; sells close a
+    # symbol's lots FIFO and credit each tranche the P&L of its own lots.
     class Tranche:
-        __slots__ = ("date", "amount", "remaining_cash", "lots", "realized_pnl")
+        __slots__ = ("date", "amount", "remaining_cash", "realized_pnl", "unrealized_pnl")
         def __init__(self, date: str, amount: float) -> None:
             self.date = date
             self.amount = amount
             self.remaining_cash = amount
-            self.lots: list[dict] = []  # {symbol, shares, cost_per_share}
             self.realized_pnl = 0.0
+            self.unrealized_pnl = 0.0
 
     tranches: list[Tranche] = []
-    # FIFO queue of (tranche_index) for allocating buys
-    tranche_queue: list[int] = []
+    # FIFO queue of tranches with cash left for allocating buys
+    tranche_queue: deque[Tranche] = deque()
+    positions: dict[str, Position] = {}
 
     for tx in all_tx:
         if not _is_stock_transaction(tx.action, tx.symbol):
@@ -2036,7 +3385,7 @@ def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
             if amt > 0:  # deposit
                 t = Tranche(tx.date, amt)
                 tranches.append(t)
-                tranche_queue.append(len(tranches) - 1)
+                tranche_queue.append(t)
             continue
 
         symbol = tx.symbol
@@ -2049,63 +3398,47 @@ def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
         if 'BUY' in action or 'BOUGHT' in action:
             buy_cost = abs(amt)
             shares_left_to_allocate = abs(qty)
+            position = positions.get(symbol)
+            if position is None:
+                position = positions[symbol] = Position(symbol)
             # Allocate buy cost/shares across tranches FIFO
             while buy_cost > 1e-9 and shares_left_to_allocate > 1e-9 and tranche_queue:
-                idx = tranche_queue[0]
-                tr = tranches[idx]
+                tr = tranche_queue[0]
                 if tr.remaining_cash <= 1e-9:
-                    tranche_queue.pop(0)
+                    tranche_queue.popleft()
                     continue
                 allocate_cash = min(buy_cost, tr.remaining_cash)
                 # Proportion of shares for this cash
                 proportion = allocate_cash / buy_cost if buy_cost > 0 else 0.0
                 allocate_shares = shares_left_to_allocate * proportion
-                cost_per_share = allocate_cash / max(allocate_shares, 1e-9)
-                tr.lots.append({"symbol": symbol, "shares": allocate_shares, "cost_per_share": cost_per_share})
+                position.buy(tx.date, allocate_shares, allocate_cash, pooled=False, tag=tr)
                 tr.remaining_cash -= allocate_cash
                 buy_cost -= allocate_cash
                 shares_left_to_allocate -= allocate_shares
                 if tr.remaining_cash <= 1e-9:
-                    tranche_queue.pop(0)
+                    tranche_queue.popleft()
             # If buys exceed deposits, ignore excess (treated as re-invested proceeds)
 
-        elif 'SELL' in action or 'SOLD' in action:
-            shares_to_sell_total = abs(qty)
-            proceeds = abs(amt)
-            sell_avg_price = proceeds / max(shares_to_sell_total, 1e-9)
-            shares_to_sell = shares_to_sell_total
-            # Reduce lots FIFO across tranches holding this symbol
-            # Use transaction's average sell price to apportion proceeds
-            for tr in tranches:
-                if shares_to_sell <= 1e-9:
-                    break
-                for lot in tr.lots:
-                    if shares_to_sell <= 1e-9:
-                        break
-                    if lot["symbol"] != symbol or lot["shares"] <= 1e-9:
-                        continue
-                    take = min(lot["shares"], shares_to_sell)
-                    cost_removed = take * lot["cost_per_share"]
-                    proceeds_for_take = take * sell_avg_price
-                    tr.realized_pnl += proceeds_for_take - cost_removed
-                    lot["shares"] -= take
-                    shares_to_sell -= take
+        elif ('SELL' in action or 'SOLD' in action) and symbol in positions:
+            for lot, pnl in positions[symbol].sell(abs(qty), abs(amt)):
+                lot.tag.realized_pnl += pnl
 
     # Now compute unrealized PnL per tranche using latest prices
+    for symbol, position in positions.items():
+        price_now = latest_positions.get(symbol, 0.0)
+        if price_now > 0:
+            for lot in position.lots:
+                lot.tag.unrealized_pnl += lot.shares * (price_now - lot.cost_per_share)
+
     periods: list[dict] = []
     pct_list: list[float] = []
     invested_list: list[float] = []
     for tr in tranches:
-        invested = sum(l["shares"] * l["cost_per_share"] for l in tr.lots) + (tr.amount - tr.remaining_cash - sum(l["shares"] * l["cost_per_share"] for l in tr.lots))
         # invested cash is sum allocated to buys (original amount - remaining cash)
         invested = tr.amount - tr.remaining_cash
         if invested <= 1e-9:
             continue
-        unrealized = 0.0
-        for l in tr.lots:
-            price_now = latest_positions.get(l["symbol"], 0.0)
-            if price_now > 0 and l["shares"] > 1e-9:
-                unrealized += l["shares"] * (price_now - l["cost_per_share"]) 
+        unrealized = tr.unrealized_pnl
         total_pnl = tr.realized_pnl + unrealized
         ret = total_pnl / invested
         periods.append({
@@ -2132,6 +3465,27 @@ def _compute_deposit_averaged_return(session: Session, user_id: int) -> dict:
 
 
 def _compute_badges(session: Session, user_id: int, positions: list[dict]) -> dict:
+    badges = _compute_portfolio_badges(session, user_id, positions)
+    
+    # Researcher badge (notes are not part of the portfolio data version, so never memoized)
+    note_count = session.exec(
+        select(GroupNote)
+        .where(GroupNote.user_id == user_id)
+    ).all()
+    
+    if len(note_count) >= 5:
+        badges["researcher"] = {
+            "name": "Researcher", 
+            "description": f"Contributed {len(note_count)} research notes to the community",
+            "notes_count": len(note_count)
+        }
+    
+    return badges
+
+
+@_memoized()
+def _compute_portfolio_badges(session: Session, user_id: int, positions: list[dict]) -> dict:
+    """Badges derived from the user's transactions, history and positions."""
     badges = {}
     
     # Get all transactions for the user, then filter to only stock transactions
@@ -2269,19 +3623,6 @@ def _compute_badges(session: Session, user_id: int, positions: list[dict]) -> di
         if best_perf[1] > 10:
             badges["best_find"] = f"{best_perf[0]} (+{best_perf[1]:.1f}%)"
     
-    # Researcher badge
-    note_count = session.exec(
-        select(GroupNote)
-        .where(GroupNote.user_id == user_id)
-    ).all()
-    
-    if len(note_count) >= 5:
-        badges["researcher"] = {
-            "name": "Researcher", 
-            "description": f"Contributed {len(note_count)} research notes to the community",
-            "notes_count": len(note_count)
-        }
-    
     return badges
 
 
@@ -2315,18 +3656,17 @@ def _increment_streak(session: Session, user_id: int, kind: str) -> None:
 
 
 @app.get("/api/groups/{group_id}/members/details")
-async def group_members_details(group_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_members_details(group_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     _ensure_group_membership(session, group_id, current_user.id)
     members = session.exec(select(GroupMember).where(GroupMember.group_id == group_id)).all()
     data = []
     for m in members:
         user = session.exec(select(User).where(User.id == m.user_id)).first()
         # Latest snapshot
-        rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == m.user_id)).all()
-        if not rows:
+        latest = session.get(PortfolioLatest, m.user_id)
+        if not latest:
             data.append({"user_id": m.user_id, "name": user.name or user.email.split("@")[0], "weights": [], "badges": {}})
             continue
-        latest = max(rows, key=lambda r: r.date)
         positions = json.loads(latest.positions_json or "[]")
         total_value = latest.total_value or 0.0
         # enrich with weight pct
@@ -2489,27 +3829,12 @@ async def group_members_details(group_id: int, current_user: User = Depends(get_
 
 
 @app.get("/api/groups/{group_id}/comparison")
-async def group_comparison(group_id: int, baseline_date: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_comparison(request: Request, group_id: int, baseline_date: str | None = None, max_points: int = CHART_MAX_POINTS, response_format: str = Query("rows", alias="format"), current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    _check_series_format(response_format)
     _ensure_group_membership(session, group_id, current_user.id)
     members = session.exec(select(GroupMember).where(GroupMember.group_id == group_id)).all()
-    series: dict[int, list[dict]] = {}
-    for m in members:
-        rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == m.user_id)).all()
-        if not rows:
-            series[m.user_id] = []
-            continue
-        hist = sorted([{ "date": r.date, "total_value": r.total_value } for r in rows], key=lambda x: x["date"]) 
-        start = hist[0]['date']
-        base = baseline_date or start
-        base_value = next((h['total_value'] for h in hist if h['date'] >= base), hist[0]['total_value'])
-        points = []
-        for h in hist:
-            if h['date'] < base:
-                continue
-            v = round((h['total_value'] / base_value) * 10000, 2) if base_value > 0 else 10000.0
-            points.append({"date": h['date'], "value": v})
-        series[m.user_id] = points
-    return {"series": series}
+    series = _normalized_histories(session, [m.user_id for m in members], baseline_date, max_points, response_format == "columnar")
+    return _series_response(request, {"series": series})
 
 
 # =====================
@@ -2522,7 +3847,7 @@ class ListPayload(BaseModel):
 
 
 @app.post("/api/social/list")
-async def add_to_list(payload: ListPayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def add_to_list(payload: ListPayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     item = StockListItem(user_id=current_user.id, symbol=payload.symbol.upper(), list_type=payload.list_type)
     session.add(item)
     session.add(SocialAction(user_id=current_user.id, type=f"add_{payload.list_type}", symbol=payload.symbol.upper()))
@@ -2531,7 +3856,7 @@ async def add_to_list(payload: ListPayload, current_user: User = Depends(get_cur
 
 
 @app.get("/api/social/list")
-async def get_lists(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_lists(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     items = session.exec(select(StockListItem).where(StockListItem.user_id == current_user.id)).all()
     out: dict[str, list[str]] = {"owned": [], "watch": [], "wishlist": []}
     for i in items:
@@ -2547,7 +3872,7 @@ class NotePayload(BaseModel):
 
 
 @app.post("/api/social/notes")
-async def add_note(payload: NotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def add_note(payload: NotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     note = StockNote(
         user_id=current_user.id,
         symbol=payload.symbol.upper(),
@@ -2562,7 +3887,7 @@ async def add_note(payload: NotePayload, current_user: User = Depends(get_curren
 
 
 @app.get("/api/social/notes")
-async def list_notes(symbol: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def list_notes(symbol: str | None = None, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     query = select(StockNote).where(StockNote.user_id == current_user.id)
     if symbol:
         query = query.where(StockNote.symbol == symbol.upper())
@@ -2579,7 +3904,7 @@ class VotePayload(BaseModel):
 
 
 @app.post("/api/social/preferences")
-async def add_preference_vote(payload: VotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def add_preference_vote(payload: VotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     vote = PreferenceVote(user_id=current_user.id, symbol_a=payload.symbol_a.upper(), symbol_b=payload.symbol_b.upper(), winner=payload.winner.upper())
     session.add(vote)
     session.commit()
@@ -2587,7 +3912,7 @@ async def add_preference_vote(payload: VotePayload, current_user: User = Depends
 
 
 @app.get("/api/social/preferences/score")
-async def preference_scores(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def preference_scores(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     votes = session.exec(select(PreferenceVote).where(PreferenceVote.user_id == current_user.id)).all()
     score: dict[str, int] = {}
     for v in votes:
@@ -2599,7 +3924,7 @@ async def preference_scores(current_user: User = Depends(get_current_user), sess
 
 
 @app.get("/api/social/feed")
-async def social_feed(limit: int = 25, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def social_feed(limit: int = 25, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     actions = session.exec(select(SocialAction).order_by(SocialAction.created_at.desc()).limit(limit)).all()
     users = {u.id: u for u in session.exec(select(User)).all()}
     feed = []
@@ -2619,7 +3944,7 @@ async def social_feed(limit: int = 25, current_user: User = Depends(get_current_
 
 
 @app.get("/api/social/streaks")
-async def get_streaks(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def get_streaks(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     rows = session.exec(select(StreakRecord).where(StreakRecord.user_id == current_user.id)).all()
     return {"streaks": [
         {"kind": r.kind, "current": r.current_streak, "longest": r.longest_streak, "last_date": r.last_date}
@@ -2628,15 +3953,14 @@ async def get_streaks(current_user: User = Depends(get_current_user), session: S
 
 
 @app.get("/api/social/recommendations")
-async def recommendations(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def recommendations(current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     # Very simple heuristic recommendation: most-voted symbols not yet owned, or top performers among peers
     votes = session.exec(select(PreferenceVote).where(PreferenceVote.user_id == current_user.id)).all()
     voted_symbols = {v.winner for v in votes}
     # Symbols owned (latest snapshot)
-    rows = session.exec(select(PortfolioHistoryRecord).where(PortfolioHistoryRecord.user_id == current_user.id)).all()
+    latest = session.get(PortfolioLatest, current_user.id)
     owned = set()
-    if rows:
-        latest = max(rows, key=lambda r: r.date)
+    if latest:
         for p in json.loads(latest.positions_json or "[]"):
             if p.get('symbol'):
                 owned.add(p['symbol'])
@@ -2651,7 +3975,7 @@ class GroupNotePayload(BaseModel):
 
 
 @app.post("/api/groups/{group_id}/notes")
-async def add_group_note(group_id: int, payload: GroupNotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def add_group_note(group_id: int, payload: GroupNotePayload, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     _ensure_group_membership(session, group_id, current_user.id)
     r = int(payload.rating)
     if r < 1 or r > 10:
@@ -2663,7 +3987,7 @@ async def add_group_note(group_id: int, payload: GroupNotePayload, current_user:
 
 
 @app.get("/api/groups/{group_id}/notes")
-async def list_group_notes(
+def list_group_notes(
     group_id: int,
     symbol: str | None = None,
     user_id: int | None = None,
@@ -2698,7 +4022,7 @@ async def list_group_notes(
     return {"notes": data, "summary": summary}
 
 @app.post("/api/groups/{group_id}/weekly/upload")
-async def upload_group_weekly_csv(
+def upload_group_weekly_csv(
     group_id: int,
     week: str,
     replace: bool = False,
@@ -2712,16 +4036,10 @@ async def upload_group_weekly_csv(
     except Exception:
         raise HTTPException(status_code=400, detail="week must be YYYY-MM-DD (Monday)")
 
-    contents = await file.read()
-    if len(contents) == 0:
+    if len(file.file.read(1)) == 0:
         raise HTTPException(status_code=400, detail="Empty file uploaded")
-
-    df = pd.read_csv(pd.io.common.StringIO(contents.decode('utf-8')), dtype=str).fillna("")
-    is_fidelity = all(col in df.columns for col in ['Run Date', 'Action', 'Symbol'])
-    is_schwab = all(col in df.columns for col in ['Date', 'Action', 'Symbol']) and (
-        'Amount' in df.columns or 'Amount ($)' in df.columns
-    )
-    if not (is_fidelity or is_schwab):
+    stream = TransactionStream(file.file, UPLOAD_CHUNK_ROWS)
+    if stream.mapping is None:
         raise HTTPException(status_code=400, detail="Unsupported CSV format for weekly upload")
 
     if replace:
@@ -2733,54 +4051,20 @@ async def upload_group_weekly_csv(
         ).delete()
         session.commit()
 
-    tx: list[WeeklyTransaction] = []
-    source = 'fidelity' if is_fidelity else 'schwab'
-    if is_fidelity:
-        for _, row in df.iterrows():
-            symbol = str(row.get('Symbol', '')).strip()
-            if not symbol:
-                continue
-            run_date = row.get('Run Date', '')
-            settle_date = row.get('Settlement Date', '') if 'Settlement Date' in df.columns else ""
-            date_dt = _parse_date(settle_date or run_date)
-            tx.append(WeeklyTransaction(
-                group_id=group_id,
-                user_id=current_user.id,
-                week_start=week,
-                date=date_dt.strftime('%Y-%m-%d'),
-                action=str(row.get('Action', '')).strip(),
-                symbol=symbol,
-                quantity=_parse_number(row.get('Quantity', '')),
-                price=_parse_number(row.get('Price ($)', '')),
-                amount=_parse_number(row.get('Amount ($)', '')),
-            ))
-    else:
-        amount_col = 'Amount' if 'Amount' in df.columns else 'Amount ($)'
-        price_col = 'Price' if 'Price' in df.columns else 'Price ($)'
-        qty_col = 'Quantity' if 'Quantity' in df.columns else 'Qty'
-        for _, row in df.iterrows():
-            symbol = str(row.get('Symbol', '')).strip()
-            action = str(row.get('Action', '')).strip()
-            date_dt = _parse_date(row.get('Date', ''))
-            tx.append(WeeklyTransaction(
-                group_id=group_id,
-                user_id=current_user.id,
-                week_start=week,
-                date=date_dt.strftime('%Y-%m-%d'),
-                action=action,
-                symbol=symbol,
-                quantity=_parse_number(row.get(qty_col, '')),
-                price=_parse_number(row.get(price_col, '')),
-                amount=_parse_number(row.get(amount_col, '')),
-            ))
-
-    session.add_all(tx)
-    session.add(WeeklyUpload(group_id=group_id, user_id=current_user.id, week_start=week, source=source, transactions_count=len(tx)))
+    # Insert chunk by chunk, so a large export is never held in memory as a whole
+    count = 0
+    skipped_rows: list[dict] = []
+    for batch, skipped in stream:
+        skipped_rows.extend(skipped[:max(0, 20 - len(skipped_rows))])
+        count += _bulk_insert(session, WeeklyTransaction, [
+            {"group_id": group_id, "user_id": current_user.id, "week_start": week, **t} for t in batch.records()
+        ])
+    session.add(WeeklyUpload(group_id=group_id, user_id=current_user.id, week_start=week, source=stream.source, transactions_count=count))
     session.commit()
-    return {"ok": True, "count": len(tx)}
+    return {"ok": True, "count": count, "skipped_rows": skipped_rows}
 
 @app.get("/api/groups/{group_id}/weekly/summary")
-async def group_weekly_summary(group_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_weekly_summary(group_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     _ensure_group_membership(session, group_id, current_user.id)
     try:
         datetime.strptime(week, '%Y-%m-%d')
@@ -2792,21 +4076,17 @@ async def group_weekly_summary(group_id: int, week: str, current_user: User = De
     user_ids = [m.user_id for m in members]
 
     # Build symbol set traded this week
-    user_to_trades: dict[int, list[WeeklyTransaction]] = {}
-    symbols: set[str] = set()
-    for uid in user_ids:
-        rows = session.exec(select(WeeklyTransaction).where((WeeklyTransaction.group_id == group_id) & (WeeklyTransaction.user_id == uid) & (WeeklyTransaction.week_start == week))).all()
-        if rows:
-            user_to_trades[uid] = rows
-            for r in rows:
-                if r.symbol:
-                    symbols.add(r.symbol.upper())
+    trades_by_user = _weekly_trades(session, group_id, user_ids, week)
+    user_to_trades = {uid: trades_by_user[uid] for uid in user_ids if uid in trades_by_user}
+    symbols = {r.symbol.upper() for rows in user_to_trades.values() for r in rows if r.symbol}
 
     # Compute weekly price changes per symbol
-    symbol_changes = {sym: _symbol_week_change(session, sym, week) for sym in sorted(symbols)}
+    symbol_changes = _symbols_week_changes(session, symbols, week)
 
     # Per-user stats: average of their trade symbols, list of trades with pct, and portfolio TWR for week
     users_stats: dict[int, dict] = {}
+    weekly_twr = _compute_users_weekly_portfolio_twr(session, list(user_to_trades), week)
+    badges = _compute_members_weekly_badges(session, group_id, list(user_to_trades), week, weekly_twr, symbol_changes)
     for uid, trades in user_to_trades.items():
         per_trade: list[dict] = []
         for t in trades:
@@ -2825,21 +4105,19 @@ async def group_weekly_summary(group_id: int, week: str, current_user: User = De
         avg = sum(x["pct_change"] for x in per_trade) / len(per_trade) if per_trade else 0.0
         best = max(per_trade, key=lambda x: x["pct_change"]) if per_trade else None
         worst = min(per_trade, key=lambda x: x["pct_change"]) if per_trade else None
-        portfolio = _compute_user_weekly_portfolio_twr(session, uid, week)
-        weekly_badges = _compute_weekly_badges(session, group_id, uid, week)
         users_stats[uid] = {
             "avg_pct": round(avg, 4),
             "best": best,
             "worst": worst,
             "trades": per_trade,
-            "portfolio": portfolio,
-            "weekly_badges": weekly_badges,
+            "portfolio": weekly_twr[uid],
+            "weekly_badges": badges[uid],
         }
 
     return {"symbol_changes": symbol_changes, "users": users_stats}
 
 @app.get("/api/groups/{group_id}/weekly/leaderboard")
-async def group_weekly_leaderboard(group_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_weekly_leaderboard(group_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     _ensure_group_membership(session, group_id, current_user.id)
     try:
         datetime.strptime(week, '%Y-%m-%d')
@@ -2847,23 +4125,25 @@ async def group_weekly_leaderboard(group_id: int, week: str, current_user: User
         raise HTTPException(status_code=400, detail="week must be YYYY-MM-DD (Monday)")
 
     members = session.exec(select(GroupMember).where(GroupMember.group_id == group_id)).all()
+    user_ids = [m.user_id for m in members]
+    weekly_twr = _compute_users_weekly_portfolio_twr(session, user_ids, week)
+    badges = _compute_members_weekly_badges(session, group_id, user_ids, week, weekly_twr)
     entries: list[dict] = []
     for m in members:
-        perf = _compute_user_weekly_portfolio_twr(session, m.user_id, week)
+        perf = weekly_twr[m.user_id]
         twr_pct = perf.get("twr_pct", 0.0)
         gain = perf.get("gain_usd", 0.0)
-        weekly_badges = _compute_weekly_badges(session, group_id, m.user_id, week)
         entries.append({
             "user_id": m.user_id,
             "twr_pct": round(twr_pct, 4),
             "gain_usd": round(gain, 2),
-            "weekly_badges": weekly_badges,
+            "weekly_badges": badges[m.user_id],
         })
     entries.sort(key=lambda x: x["twr_pct"], reverse=True)
     return {"week": week, "leaderboard": entries}
 
 @app.get("/api/groups/{group_id}/weekly/member_symbols")
-async def group_weekly_member_symbols(group_id: int, user_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def group_weekly_member_symbols(group_id: int, user_id: int, week: str, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     _ensure_group_membership(session, group_id, current_user.id)
     # Ensure requested user is also a member of the group
     member = session.exec(select(GroupMember).where((GroupMember.group_id == group_id) & (GroupMember.user_id == user_id))).first()
@@ -2881,15 +4161,7 @@ async def group_weekly_member_symbols(group_id: int, user_id: int, week: str, cu
         .where((PortfolioHistoryRecord.user_id == user_id) & (PortfolioHistoryRecord.date <= end_str))
         .order_by(PortfolioHistoryRecord.date.desc())
     ).first()
-    symbols: set[str] = set()
-    if rec:
-        try:
-            for p in json.loads(rec.positions_json or '[]'):
-                sym = (p.get('symbol') or '').upper().strip()
-                if sym:
-                    symbols.add(sym)
-        except Exception:
-            pass
+    symbols = _snapshot_symbols(rec)
     # Include symbols traded this week (if any weekly upload exists)
     weekly_rows = session.exec(select(WeeklyTransaction).where((WeeklyTransaction.group_id == group_id) & (WeeklyTransaction.user_id == user_id) & (WeeklyTransaction.week_start == week))).all()
     for r in weekly_rows:
@@ -2897,9 +4169,7 @@ async def group_weekly_member_symbols(group_id: int, user_id: int, week: str, cu
             symbols.add(r.symbol.upper())
 
     # Compute weekly change for each symbol
-    results: list[dict] = []
-    for sym in sorted(symbols):
-        results.append(_symbol_week_change(session, sym, week))
+    results = list(_symbols_week_changes(session, symbols, week).values())
     member_badges = _compute_weekly_badges(session, group_id, user_id, week)
     return {"user_id": user_id, "week": week, "symbols": results, "weekly_badges": member_badges}
 if __name__ == "__main__":
@@ -0,0 +1,458 @@
+"""
+Vectorized portfolio analytics over stored daily histories (accurate_main.py).
+
+Inputs are aligned NumPy arrays: one sorted datetime64[D] date axis and one or more "level"
+series on it (a prefix growth index, a price series, ...). Returns between any two dates are
+ratios of levels, so every trailing window for every series is computed in one gather, and
+risk statistics come from one pass over the stacked daily returns.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# Trailing windows reported by /api/performance, as (key, pandas offset); YTD and ITD are special-cased
+TRAILING_WINDOWS = (
+    ("1W", pd.DateOffset(weeks=1)),
+    ("1M", pd.DateOffset(months=1)),
+    ("3M", pd.DateOffset(months=3)),
+    ("6M", pd.DateOffset(months=6)),
+    ("YTD", None),
+    ("1Y", pd.DateOffset(years=1)),
+    ("3Y", pd.DateOffset(years=3)),
+    ("5Y", pd.DateOffset(years=5)),
+    ("ITD", None),
+)
+
+
+def to_dates(values: List[str]) -> np.ndarray:
+    """YYYY-MM-DD strings to a datetime64[D] array."""
+    return np.array(values, dtype="datetime64[D]")
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last finite, positive value forward over gaps (NaN, None or non-positive)."""
+    v = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(v) & (v > 0)
+    idx = np.where(valid, np.arange(len(v)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    filled = v[idx]
+    filled[~valid & (np.cumsum(valid) == 0)] = np.nan  # nothing to carry yet
+    return filled
+
+
+def align_prices(dates: np.ndarray, price_dates: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    """Price as of each date in `dates` (last quote on or before it), NaN before the first quote."""
+    order = np.argsort(price_dates)
+    price_dates, prices = price_dates[order], np.asarray(prices, dtype=np.float64)[order]
+    pos = np.searchsorted(price_dates, dates, side="right") - 1
+    out = np.full(len(dates), np.nan)
+    ok = pos >= 0
+    out[ok] = prices[pos[ok]]
+    return out
+
+
+def session_axis(start: np.datetime64, end: np.datetime64) -> np.ndarray:
+    """Every weekday from `start` to `end` inclusive, as datetime64[D]."""
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    return days[np.is_busday(days)]
+
+
+def dated_series(values: Dict[str, float | None], positive: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    {YYYY-MM-DD: value} as date-sorted arrays. Missing values become NaN, as do non-positive
+    ones when `positive` (price quotes, where they are unusable).
+    """
+    dates = to_dates(list(values.keys()))
+    v = np.array([np.nan if x is None else x for x in values.values()], dtype=np.float64)
+    if positive:
+        v[~(v > 0)] = np.nan
+    order = np.argsort(dates, kind="stable")
+    return dates[order], v[order]
+
+
+def first_on_or_after(dates: np.ndarray, values: np.ndarray, baseline: np.datetime64) -> float | None:
+    """First finite, positive value dated on or after `baseline` (dates sorted), or None."""
+    v = values[np.searchsorted(dates, baseline):]
+    usable = np.flatnonzero(np.isfinite(v) & (v > 0))
+    return float(v[usable[0]]) if len(usable) else None
+
+
+def observed_index(axis: np.ndarray, dates: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Values placed on `axis` by exact date and carried forward, plus the axis position each
+    carried value was observed at (-1 before the first). NaN values count as gaps; when a
+    date repeats, its first value is used.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype=np.float64)
+    pos = np.searchsorted(axis, dates)
+    ok = pos < len(axis)
+    ok[ok] = axis[pos[ok]] == dates[ok]
+    placed = np.full(len(axis), np.nan)
+    placed[pos[ok][::-1]] = values[ok][::-1]
+    last = np.where(np.isfinite(placed), np.arange(len(axis)), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, placed[np.maximum(last, 0)], np.nan), last
+
+
+def rebase(filled: np.ndarray, last: np.ndarray, start: int, base: float) -> np.ndarray:
+    """
+    Growth of 1 from axis position `start` on: carried levels divided by `base`, and 1 where
+    nothing has been observed since `start`. One vector division per baseline.
+    """
+    return np.where(last[start:] >= start, filled[start:] / base, 1.0)
+
+
+def normalize(axis: np.ndarray, series: Dict[str, tuple[np.ndarray, np.ndarray]], baseline: np.datetime64,
+              bases: Dict[str, float | None] | None = None) -> Dict[str, np.ndarray]:
+    """
+    Align date-indexed series on a sorted date `axis` and express each as growth of 1 from
+    `baseline`, over the axis dates on or after it. Values observed since the baseline are
+    carried forward (1 until the first), divided by the series' base: `bases[name]` when
+    given, else its first usable value on or after the baseline. Series whose base is
+    missing or non-positive are left out.
+    """
+    bases = bases or {}
+    start = int(np.searchsorted(axis, baseline))
+    out = {}
+    for name, (dates, values) in series.items():
+        base = bases[name] if name in bases else first_on_or_after(dates, values, baseline)
+        if base is None or not base > 0:
+            continue
+        out[name] = rebase(*observed_index(axis, dates, values), start, base)
+    return out
+
+
+def window_starts(as_of: np.datetime64, inception: np.datetime64) -> Dict[str, np.datetime64]:
+    """Start date of each trailing window ending at `as_of`. YTD starts at the prior year end."""
+    end = pd.Timestamp(as_of)
+    starts = {}
+    for key, offset in TRAILING_WINDOWS:
+        if key == "ITD":
+            start = pd.Timestamp(inception)
+        elif key == "YTD":
+            start = pd.Timestamp(year=end.year - 1, month=12, day=31)
+        else:
+            start = end - offset
+        starts[key] = np.datetime64(start.date(), "D")
+    return starts
+
+
+def trailing_returns(dates: np.ndarray, levels: np.ndarray) -> Dict[str, dict]:
+    """
+    Trailing-window returns for every level series at once.
+
+    `levels` is (n_series, n_dates). Each window's base is the last date on or before its
+    start; windows that start before the first date are not covered (None), except YTD,
+    which falls back to inception for histories that began this year, and ITD.
+    Returns {window: {"start": date, "returns": [fraction or None per series]}}.
+    """
+    levels = np.atleast_2d(np.asarray(levels, dtype=np.float64))
+    if len(dates) < 2:
+        return {}
+    starts = window_starts(dates[-1], dates[0])
+    keys = list(starts)
+    start_dates = np.array([starts[k] for k in keys], dtype="datetime64[D]")
+    base_idx = np.searchsorted(dates, start_dates, side="right") - 1
+    covered = base_idx >= 0
+    ytd = keys.index("YTD")
+    if not covered[ytd]:
+        base_idx[ytd], covered[ytd] = 0, True
+    base_idx = np.clip(base_idx, 0, None)
+
+    base = levels[:, base_idx]  # (n_series, n_windows)
+    end = levels[:, -1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = end / base - 1.0
+    ratios[:, ~covered | (base_idx == len(dates) - 1)] = np.nan
+    ratios[~np.isfinite(ratios) | ~(base > 0)] = np.nan
+
+    return {
+        key: {
+            "start": str(dates[base_idx[i]]) if covered[i] else None,
+            "returns": [None if np.isnan(r) else float(r) for r in ratios[:, i]],
+        }
+        for i, key in enumerate(keys)
+    }
+
+
+def _npv(rates: np.ndarray, years: np.ndarray, flows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Row-wise NPV of padded cash-flow schedules at `rates` and its derivative in the rate."""
+    base = (1.0 + rates)[:, None]
+    discount = base ** -years
+    npv = (flows * discount).sum(axis=1)
+    d_npv = (-years * flows * discount / base).sum(axis=1)
+    return npv, d_npv
+
+
+def xirr(schedules: List[tuple[np.ndarray, np.ndarray]], tol: float = 1e-10, max_iter: int = 100) -> np.ndarray:
+    """
+    Money-weighted (internal) rate of return for many cash-flow schedules at once.
+
+    Each schedule is (datetime64[D] dates, amounts) from the investor's point of view:
+    contributions negative, withdrawals and the ending value positive. Schedules are padded
+    into one matrix and solved together with a safeguarded Newton iteration: each row keeps
+    a sign-change bracket and falls back to bisection whenever the Newton step leaves it.
+    Returns annualized rates (NaN where no root exists, e.g. all flows of one sign).
+    """
+    n = len(schedules)
+    if n == 0:
+        return np.empty(0)
+    width = max(len(amounts) for _, amounts in schedules)
+    years = np.zeros((n, width))
+    flows = np.zeros((n, width))
+    for i, (dates, amounts) in enumerate(schedules):
+        if len(amounts) == 0:
+            continue
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        years[i, :len(amounts)] = (dates - dates.min()).astype(np.float64) / 365.0
+        flows[i, :len(amounts)] = amounts
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        lo = np.full(n, -0.9999)
+        hi = np.full(n, 100.0)
+        f_lo, _ = _npv(lo, years, flows)
+        f_hi, _ = _npv(hi, years, flows)
+        solvable = np.isfinite(f_lo) & np.isfinite(f_hi) & (np.sign(f_lo) != np.sign(f_hi))
+        rate = np.full(n, 0.1)
+        for _ in range(max_iter):
+            f, df = _npv(rate, years, flows)
+            on_lo_side = np.sign(f) == np.sign(f_lo)
+            lo = np.where(on_lo_side, rate, lo)
+            f_lo = np.where(on_lo_side, f, f_lo)
+            hi = np.where(on_lo_side, hi, rate)
+            newton = rate - f / df
+            step = np.where(np.isfinite(newton) & (newton > lo) & (newton < hi), newton, (lo + hi) / 2.0)
+            converged = np.abs(step - rate) <= tol * (1.0 + np.abs(rate))
+            rate = step
+            if np.all(converged | ~solvable):
+                break
+    rate[~solvable] = np.nan
+    return rate
+
+
+def _finite_or_none(value: float) -> float | None:
+    return float(value) if np.isfinite(value) else None
+
+
+def drawdown(level: np.ndarray) -> np.ndarray:
+    """Underwater series: level / running peak - 1 (0 at new highs and where there is no level yet)."""
+    level = np.asarray(level, dtype=np.float64)
+    peaks = np.fmax.accumulate(level)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peaks > 0, level / peaks - 1.0, 0.0)
+    return np.minimum(np.nan_to_num(dd, nan=0.0), 0.0)
+
+
+def drawdown_episodes(dates: np.ndarray, level: np.ndarray, top_n: int | None = None) -> List[dict]:
+    """
+    Drawdown episodes, deepest first: each maximal underwater run with its peak (last high
+    before it), trough, recovery (first day back at the peak, None if still underwater),
+    depth and duration in calendar days from peak to recovery (or to the last date).
+    """
+    dd = drawdown(level)
+    underwater = dd < 0
+    if not underwater.any():
+        return []
+    edges = np.diff(np.concatenate(([False], underwater, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exclusive: the recovery index, or len(dd)
+    # Minimum of each run [start, end) in one reduceat over interleaved boundaries
+    bounds = np.column_stack([starts, ends]).ravel()
+    depths = np.minimum.reduceat(np.append(dd, 0.0), bounds)[::2]
+    order = np.argsort(depths, kind="stable")[: top_n if top_n else None]
+    episodes = []
+    for i in order:
+        start, end = int(starts[i]), int(ends[i])
+        trough = start + int(np.argmin(dd[start:end]))
+        peak = max(start - 1, 0)
+        recovery = end if end < len(dd) else None
+        until = dates[recovery] if recovery is not None else dates[-1]
+        episodes.append({
+            "peak_date": str(dates[peak]),
+            "trough_date": str(dates[trough]),
+            "recovery_date": str(dates[recovery]) if recovery is not None else None,
+            "depth": float(depths[i]),
+            "duration_days": int((until - dates[peak]).astype(np.int64)),
+            "days_to_trough": int((dates[trough] - dates[peak]).astype(np.int64)),
+        })
+    return episodes
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int, keep: Iterable[int] = ()) -> np.ndarray:
+    """
+    Sorted indices of about `max_points` points chosen by Largest-Triangle-Three-Buckets: the
+    first and last point, plus from each of max_points - 2 equal buckets the point forming the
+    largest triangle with the previous pick and the next bucket's average. `y` may be
+    (n_series, n); areas are then summed so all series share one selection. Every index in
+    `keep` is added on top (e.g. drawdown troughs).
+
+    The triangle area is linear in the previous pick, so the walk is vectorized: with small
+    buckets (the usual chart case), every candidate is scored against every candidate of the
+    bucket before it at once and the walk is a chain of table lookups; larger buckets take
+    one array expression per bucket.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n <= max(max_points, 2):
+        return np.arange(n)
+    keep = np.asarray(list(keep), dtype=np.int64)
+    if max_points < 3:
+        return np.union1d([0, n - 1], keep)
+    y = np.nan_to_num(np.atleast_2d(np.asarray(y, dtype=np.float64)))
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)  # bucket b is [edges[b], edges[b + 1])
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[:, 1:n - 1], edges[:-1] - 1, axis=1) / counts
+    # Each point is scored against the average of the bucket after its own (the last point for the last bucket)
+    bucket = np.repeat(np.arange(len(counts)), counts)
+    cx = np.append(avg_x[1:], x[-1])[bucket]
+    cy = np.hstack([avg_y[:, 1:], y[:, -1:]])[:, bucket]
+    bx, by = x[1:n - 1], y[:, 1:n - 1]
+    # 2 × area = |ax (by - cy) + ay (cx - bx) + (bx cy - cx by)| for a previous pick (ax, ay)
+    p = np.pad(by - cy, ((0, 0), (1, 1)))
+    q = np.pad(cx - bx, (1, 1))
+    r = np.pad(bx * cy - cx * by, ((0, 0), (1, 1)))
+
+    width = int(counts.max())
+    if width * len(y) <= 32:
+        # Candidates padded to (bucket, width); the previous bucket of bucket 0 is the first point
+        cand = np.minimum(edges[:-1, None] + np.arange(width), n - 2)
+        valid = np.arange(width) < counts[:, None]
+        prev = np.vstack([np.zeros((1, width), dtype=np.int64), cand[:-1]])
+        # areas[b, i, j]: candidate j of bucket b after candidate i of bucket b - 1
+        areas = np.abs(
+            p[:, cand][:, :, None, :] * x[prev][None, :, :, None]
+            + q[cand][None, :, None, :] * y[:, prev][:, :, :, None]
+            + r[:, cand][:, :, None, :]
+        ).sum(axis=0)
+        best = np.where(valid[:, None, :], areas, -1.0).argmax(axis=2).tolist()
+        picks, j = [0], 0
+        for start, table in zip(edges.tolist(), best):
+            j = table[j]
+            picks.append(start + j)
+    else:
+        picks = [0]
+        for lo, hi in zip(edges[:-1].tolist(), edges[1:].tolist()):
+            a = picks[-1]
+            area = np.abs(p[:, lo:hi] * x[a] + q[lo:hi] * y[:, a:a + 1] + r[:, lo:hi]).sum(axis=0)
+            picks.append(lo + int(np.argmax(area)))
+    picks.append(n - 1)
+    return np.union1d(picks, keep)
+
+
+def _max_drawdown(dates: np.ndarray, level: np.ndarray) -> dict:
+    """Deepest peak-to-trough decline of one level series, with its peak, trough and recovery dates."""
+    episodes = drawdown_episodes(dates, level, top_n=1)
+    if not episodes:
+        return {"max_drawdown": 0.0, "peak_date": None, "trough_date": None, "recovery_date": None}
+    deepest = episodes[0]
+    return {
+        "max_drawdown": deepest["depth"],
+        "peak_date": deepest["peak_date"],
+        "trough_date": deepest["trough_date"],
+        "recovery_date": deepest["recovery_date"],
+    }
+
+
+def risk_metrics(dates: np.ndarray, levels: np.ndarray, risk_free: float = 0.0, periods_per_year: int = 252) -> Dict[str, Any]:
+    """
+    Risk statistics of a portfolio level series against a benchmark, from daily returns.
+
+    `levels` is (2, n_dates): the portfolio growth index, then the benchmark price, both on
+    the same date axis. Only days where both series have a return enter the statistics.
+    `risk_free` is an annual rate. Volatility, Sharpe, Sortino and max drawdown are returned
+    for both series; beta, alpha (Jensen's, annualized), correlation and tracking error
+    relate the portfolio to the benchmark. Undefined statistics are None.
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    if levels.shape[1] < 3:
+        return {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = levels[:, 1:] / levels[:, :-1] - 1.0
+    valid = np.all(np.isfinite(returns) & (levels[:, :-1] > 0), axis=0)
+    returns = returns[:, valid]
+    n = returns.shape[1]
+    if n < 2:
+        return {}
+
+    rf = risk_free / periods_per_year
+    mean = returns.mean(axis=1)
+    std = returns.std(axis=1, ddof=1)
+    excess = mean - rf
+    downside = np.sqrt((np.minimum(returns - rf, 0.0) ** 2).mean(axis=1))
+    cov = np.cov(returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = excess / std * np.sqrt(periods_per_year)
+        sortino = excess / downside * np.sqrt(periods_per_year)
+        beta = cov[0, 1] / cov[1, 1]
+        correlation = cov[0, 1] / np.sqrt(cov[0, 0] * cov[1, 1])
+    alpha = (excess[0] - beta * excess[1]) * periods_per_year
+    tracking_error = (returns[0] - returns[1]).std(ddof=1) * np.sqrt(periods_per_year)
+
+    series = {}
+    for i, name in enumerate(("portfolio", "benchmark")):
+        series[name] = {
+            "volatility": float(std[i] * np.sqrt(periods_per_year)),
+            "sharpe": _finite_or_none(sharpe[i]),
+            "sortino": _finite_or_none(sortino[i]),
+            **_max_drawdown(dates, levels[i]),
+        }
+    return {
+        **series,
+        "beta": _finite_or_none(beta),
+        "alpha": _finite_or_none(alpha),
+        "correlation": _finite_or_none(correlation),
+        "tracking_error": float(tracking_error),
+        "observations": int(n),
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+    }
+
+
+def position_attribution(shares: np.ndarray, prices: np.ndarray) -> Dict[str, Any]:
+    """
+    Each holding's contribution to the portfolio return over a window of daily snapshots.
+
+    `shares` and `prices` are (n_dates, n_assets); NaN prices mean not held or not priced that
+    day (value 0). A holding's daily contribution is its value change over the previous
+    day's total, i.e. previous weight × return, and the contributions of a day sum to the
+    portfolio return r_t (days whose previous total is not positive are skipped, as in the
+    growth index). Days are linked by scaling each one by the portfolio growth before it, so
+    the linked contributions add up exactly to Π(1+r_t) - 1.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    values = np.nan_to_num(np.asarray(shares, dtype=np.float64) * prices, nan=0.0)
+    n_dates, n_assets = values.shape
+    if n_dates < 2:
+        return {}
+    total = values.sum(axis=1)
+    prev_total = total[:-1]
+    valid = prev_total > 0
+    weights = np.zeros((n_dates - 1, n_assets))
+    weights[valid] = values[:-1][valid] / prev_total[valid, None]
+    daily = np.zeros((n_dates - 1, n_assets))
+    daily[valid] = np.diff(values, axis=0)[valid] / prev_total[valid, None]
+    growth = np.cumprod(1.0 + daily.sum(axis=1))
+    growth_before = np.concatenate(([1.0], growth[:-1]))
+
+    # Price return of each holding between its first and last quote in the window
+    priced = np.isfinite(prices) & (prices > 0)
+    first = np.argmax(priced, axis=0)
+    last = n_dates - 1 - np.argmax(priced[::-1], axis=0)
+    cols = np.arange(n_assets)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        holding_return = np.where(priced.any(axis=0) & (last > first), prices[last, cols] / prices[first, cols] - 1.0, np.nan)
+
+    return {
+        "contribution": (daily * growth_before[:, None]).sum(axis=0),
+        "holding_return": holding_return,
+        "average_weight": weights[valid].mean(axis=0) if valid.any() else np.zeros(n_assets),
+        "start_value": values[0],
+        "end_value": values[-1],
+        "portfolio_return": float(growth[-1] - 1.0),
+        "days": int(valid.sum()),
+    }
@@ -0,0 +1,285 @@
+"""
+Broker CSV parser registry shared by the personal and group weekly upload endpoints
+(accurate_main.py) and the Supabase upload endpoint (supabase_main.py).
+
+The header is fingerprinted once per file, a compiled column mapping is picked from the
+registry, and every chunk is mapped column-wise into a TransactionBatch of NumPy arrays.
+New brokers plug in by registering another BrokerParser.
+"""
+
+import csv
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import IO, Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+# Explicit formats seen in broker exports, tried in order when inferring a column's format
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y", "%Y/%m/%d")
+
+# Bytes sniffed from the top of a file to locate the header row (Fidelity exports carry a preamble)
+HEADER_SNIFF_BYTES = 64 * 1024
+
+TRANSACTION_FIELDS = ("date", "action", "symbol", "quantity", "price", "amount")
+
+
+def normalize_date_column(values: pd.Series) -> pd.Series:
+    """Strip whitespace and Schwab's "MM/DD/YYYY as of MM/DD/YYYY" prefix (the as-of date is the trade date)."""
+    s = values.fillna("").astype(str).str.strip()
+    return s.str.replace(r"^.*\bas of\s+", "", regex=True)
+
+
+def infer_date_format(values: pd.Series, sample_size: int = 100) -> str | None:
+    """Pick the explicit format that parses the most of a sample of the (normalized) column."""
+    sample = values[values != ""].head(sample_size)
+    if sample.empty:
+        return None
+    best_fmt, best_hits = None, 0
+    for fmt in DATE_FORMATS:
+        hits = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if hits > best_hits:
+            best_fmt, best_hits = fmt, hits
+        if hits == len(sample):
+            break
+    return best_fmt
+
+
+def parse_date_column(values: pd.Series, fmt: str | None = None) -> tuple[pd.Series, pd.Series]:
+    """
+    Parse a whole date column with a single explicit format (inferred once from a sample
+    when not given). Returns (YYYY-MM-DD strings, boolean mask of rows that failed to parse).
+    Failed rows are never defaulted to a date; callers decide how to report them.
+    """
+    normalized = normalize_date_column(values)
+    fmt = fmt or infer_date_format(normalized)
+    if fmt is None:
+        parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    else:
+        parsed = pd.to_datetime(normalized, format=fmt, errors="coerce")
+    return parsed.dt.strftime('%Y-%m-%d'), parsed.isna()
+
+
+def parse_number_column(values: pd.Series) -> np.ndarray:
+    """Column-wise version of the scalar number parser: commas, dollar signs and (negative) parentheses."""
+    s = values.fillna("").astype(str).str.strip()
+    negative = (s.str.startswith("(") & s.str.endswith(")")).to_numpy()
+    s = s.str.replace(r"[()$,+\s]", "", regex=True)
+    nums = pd.to_numeric(s, errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    return np.where(negative, -nums, nums)
+
+
+@dataclass
+class TransactionBatch:
+    """Typed columnar batch of parsed transactions. String columns are object arrays, numbers float64."""
+    date: np.ndarray
+    action: np.ndarray
+    symbol: np.ndarray
+    quantity: np.ndarray
+    price: np.ndarray
+    amount: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    @classmethod
+    def concat(cls, batches: List["TransactionBatch"]) -> "TransactionBatch":
+        if not batches:
+            strings, numbers = np.array([], dtype=object), np.array([], dtype=np.float64)
+            return cls(strings, strings, strings, numbers, numbers, numbers)
+        return cls(*(np.concatenate([getattr(b, f) for b in batches]) for f in TRANSACTION_FIELDS))
+
+    def select(self, mask: np.ndarray) -> "TransactionBatch":
+        return TransactionBatch(*(getattr(self, f)[mask] for f in TRANSACTION_FIELDS))
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Row dicts keyed like TransactionRecord columns, for DB writes."""
+        return [
+            {"date": d, "action": a, "symbol": s, "quantity": float(q), "price": float(p), "amount": float(m)}
+            for d, a, s, q, p, m in zip(self.date, self.action, self.symbol, self.quantity, self.price, self.amount)
+        ]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({f: getattr(self, f) for f in TRANSACTION_FIELDS})
+
+
+@dataclass(frozen=True)
+class ColumnMapping:
+    """A BrokerParser resolved against one concrete header: which source column feeds each field."""
+    parser: "BrokerParser"
+    date: tuple[str, ...]  # coalesced left to right: first non-empty value wins
+    action: str
+    symbol: str
+    quantity: str | None
+    price: str | None
+    amount: str | None
+
+    def raw_dates(self, df: pd.DataFrame) -> pd.Series:
+        raw = df[self.date[0]]
+        for col in self.date[1:]:
+            raw = raw.where(raw.str.strip() != "", df[col])
+        return raw
+
+    def infer_date_format(self, df: pd.DataFrame) -> str | None:
+        return infer_date_format(normalize_date_column(self.raw_dates(df.fillna(""))))
+
+    def parse(self, df: pd.DataFrame, date_format: str | None = None, line_offset: int = 2) -> tuple[TransactionBatch, list[dict]]:
+        """
+        Map one chunk to a TransactionBatch. Rows whose date cannot be parsed are dropped and
+        described in the returned skipped list (line numbers are 1-based; `line_offset` is
+        the CSV line of index 0). Rows without a symbol are dropped when the broker requires one.
+        """
+        df = df.fillna("")
+        raw_dates = self.raw_dates(df)
+        dates, bad_dates = parse_date_column(raw_dates, date_format)
+        symbols = df[self.symbol].astype(str).str.strip()
+        keep = ~bad_dates
+        candidates = bad_dates
+        if self.parser.require_symbol:
+            keep &= symbols != ""
+            candidates = bad_dates & (symbols != "")
+        skipped = [{"row": int(idx) + line_offset, "value": str(val)} for idx, val in raw_dates[candidates].head(20).items()]
+
+        def numbers(col: str | None) -> np.ndarray:
+            return parse_number_column(df[col]) if col else np.zeros(len(df), dtype=np.float64)
+
+        mask = keep.to_numpy()
+        batch = TransactionBatch(
+            date=dates.to_numpy(dtype=object),
+            action=df[self.action].astype(str).str.strip().to_numpy(dtype=object),
+            symbol=symbols.to_numpy(dtype=object),
+            quantity=numbers(self.quantity),
+            price=numbers(self.price),
+            amount=numbers(self.amount),
+        ).select(mask)
+        return batch, skipped
+
+
+@dataclass(frozen=True)
+class BrokerParser:
+    """
+    Declarative description of one broker's export. Each field lists candidate column
+    names; the first one present in the header is used. A header matches when all
+    `required` columns are present and every field in `required_fields` resolves.
+    """
+    name: str
+    required: tuple[str, ...]
+    date: tuple[str, ...]
+    action: tuple[str, ...] = ("Action",)
+    symbol: tuple[str, ...] = ("Symbol",)
+    quantity: tuple[str, ...] = ("Quantity",)
+    price: tuple[str, ...] = ()
+    amount: tuple[str, ...] = ()
+    required_fields: tuple[str, ...] = ()
+    require_symbol: bool = False
+    label: str = field(default="", compare=False)
+
+    def matches(self, columns: tuple[str, ...]) -> bool:
+        present = set(columns)
+        if not all(c in present for c in self.required):
+            return False
+        return all(any(c in present for c in getattr(self, f)) for f in self.required_fields)
+
+    def compile(self, columns: tuple[str, ...]) -> ColumnMapping:
+        present = set(columns)
+
+        def first(candidates: tuple[str, ...]) -> str | None:
+            return next((c for c in candidates if c in present), None)
+
+        return ColumnMapping(
+            parser=self,
+            date=tuple(c for c in self.date if c in present),
+            action=first(self.action),
+            symbol=first(self.symbol),
+            quantity=first(self.quantity),
+            price=first(self.price),
+            amount=first(self.amount),
+        )
+
+
+FIDELITY = BrokerParser(
+    name="fidelity",
+    label="Fidelity",
+    required=("Run Date", "Action", "Symbol"),
+    date=("Settlement Date", "Run Date"),
+    price=("Price ($)",),
+    amount=("Amount ($)",),
+    require_symbol=True,
+)
+
+SCHWAB = BrokerParser(
+    name="schwab",
+    label="Schwab",
+    required=("Date", "Action", "Symbol"),
+    date=("Date",),
+    quantity=("Quantity", "Qty"),
+    price=("Price", "Price ($)"),
+    amount=("Amount", "Amount ($)"),
+    required_fields=("amount",),
+)
+
+PARSERS: List[BrokerParser] = [FIDELITY, SCHWAB]
+
+
+def register_parser(parser: BrokerParser) -> None:
+    """Add a broker format; earlier registrations win when several match a header."""
+    PARSERS.append(parser)
+    detect_parser.cache_clear()
+
+
+@lru_cache(maxsize=256)
+def detect_parser(columns: tuple[str, ...]) -> ColumnMapping | None:
+    """Fingerprint a header and return the compiled mapping for the first matching broker."""
+    columns = tuple(str(c).strip() for c in columns)
+    for parser in PARSERS:
+        if parser.matches(columns):
+            return parser.compile(columns)
+    return None
+
+
+def find_header_row(lines: List[str]) -> tuple[int, ColumnMapping | None]:
+    """Locate the first line that parses as a supported header (skipping export preambles)."""
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            columns = next(csv.reader([line]))
+        except csv.Error:
+            continue
+        mapping = detect_parser(tuple(columns))
+        if mapping:
+            return i, mapping
+    return 0, None
+
+
+class TransactionStream:
+    """
+    Chunked reader over an uploaded CSV file object. `mapping` is None when no registered
+    broker matches. Iterating yields (TransactionBatch, skipped_rows) per chunk; the date
+    format is inferred once from the first chunk and reused for the rest of the file.
+    """
+
+    def __init__(self, fileobj: IO[bytes], chunk_rows: int = 5000) -> None:
+        fileobj.seek(0)
+        head = fileobj.read(HEADER_SNIFF_BYTES).decode("utf-8-sig", errors="replace")
+        fileobj.seek(0)
+        self.header_row, self.mapping = find_header_row(head.splitlines())
+        self.date_format: str | None = None
+        self._fileobj = fileobj
+        self._chunk_rows = chunk_rows
+
+    @property
+    def source(self) -> str:
+        return self.mapping.parser.name if self.mapping else "unknown"
+
+    def __iter__(self) -> Iterator[tuple[TransactionBatch, list[dict]]]:
+        if self.mapping is None:
+            return
+        reader = pd.read_csv(
+            self._fileobj, dtype=str, chunksize=self._chunk_rows, encoding="utf-8-sig", skiprows=self.header_row,
+        )
+        for df in reader:
+            df.columns = [str(c).strip() for c in df.columns]
+            if self.date_format is None:
+                self.date_format = self.mapping.infer_date_format(df)
+            yield self.mapping.parse(df, self.date_format, line_offset=self.header_row + 2)
@@ -0,0 +1,149 @@
+"""
+Position lots rebuilt from a user's stored stock transactions (accurate_main.py).
+
+Trades are replayed in date order into one deque of lots per symbol, buys before sells on
+the same date: broker exports list a day's rows in either order, and a sell replayed before
+the buy it closes would find no shares to sell. Sells close lots first-in first-out
+("fifo") or against the pooled average cost ("average", the method cost basis has always
+been reported with, which keeps a single lot per symbol). A LotBook answers cost basis and
+realized P&L, and unrealized P&L given current prices.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Tuple
+
+LOT_METHODS = ("average", "fifo")
+
+# Quantities at or below this are treated as zero (fractional shares leave float dust)
+EPSILON = 1e-9
+
+
+def trade_side(action: str) -> str | None:
+    """"buy", "sell" or None for an action string, using the markers the app has always matched."""
+    action = action or ""
+    if "BOUGHT" in action or "Buy" in action:
+        return "buy"
+    if "SOLD" in action or "Sell" in action:
+        return "sell"
+    if "REINVESTMENT" in action:
+        return "buy"
+    return None
+
+
+def replay_key(tx: Any) -> tuple[str, int]:
+    """Sort key that replays a day's buys (and anything else) before its sells."""
+    return (tx.date or "", 1 if trade_side(tx.action) == "sell" else 0)
+
+
+@dataclass
+class Lot:
+    date: str
+    shares: float
+    cost_per_share: float
+    # What the lot is attributed to, e.g. the deposit that funded it; opaque to the book
+    tag: Any = None
+
+
+@dataclass
+class Position:
+    """Open lots of one symbol plus running totals, so totals never rescan the deque."""
+    symbol: str
+    lots: Deque[Lot] = field(default_factory=deque)
+    shares: float = 0.0
+    cost: float = 0.0
+    realized_pnl: float = 0.0
+
+    def buy(self, date: str, shares: float, cost: float, pooled: bool, tag: Any = None) -> None:
+        if shares <= EPSILON:
+            return
+        if pooled and self.lots:
+            lot = self.lots[0]
+            lot.shares += shares
+            lot.cost_per_share = (self.cost + cost) / lot.shares
+        else:
+            self.lots.append(Lot(date, shares, cost / shares, tag))
+        self.shares += shares
+        self.cost += cost
+
+    def sell(self, shares: float, proceeds: float) -> List[Tuple[Lot, float]]:
+        """
+        Close up to `shares` from the oldest lots; shares not held are ignored. Returns the
+        realized P&L taken from each lot touched, for callers that attribute it by lot tag.
+        """
+        price = proceeds / shares if shares > EPSILON else 0.0
+        remaining = shares
+        closed: List[Tuple[Lot, float]] = []
+        while remaining > EPSILON and self.lots:
+            lot = self.lots[0]
+            take = min(lot.shares, remaining)
+            cost_removed = take * lot.cost_per_share
+            self.realized_pnl += take * price - cost_removed
+            closed.append((lot, take * price - cost_removed))
+            self.shares -= take
+            self.cost -= cost_removed
+            lot.shares -= take
+            remaining -= take
+            if lot.shares <= EPSILON:
+                self.lots.popleft()
+        if not self.lots:
+            self.shares, self.cost = 0.0, 0.0
+        return closed
+
+    def unrealized_pnl(self, price: float | None) -> float:
+        if not price or price <= 0 or self.shares <= EPSILON:
+            return 0.0
+        return self.shares * price - self.cost
+
+
+class LotBook:
+    """All positions of one user under one lot method."""
+
+    def __init__(self, method: str = "average") -> None:
+        if method not in LOT_METHODS:
+            raise ValueError(f"Unknown lot method {method!r}; expected one of {LOT_METHODS}")
+        self.method = method
+        self.positions: Dict[str, Position] = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Any], method: str = "average") -> "LotBook":
+        """Build a book from stock transaction rows (date, action, symbol, quantity, amount)."""
+        book = cls(method)
+        for tx in sorted(transactions, key=replay_key):
+            book.apply(tx)
+        return book
+
+    def apply(self, tx: Any) -> None:
+        if not tx.symbol:
+            return
+        position = self.positions.get(tx.symbol)
+        if position is None:
+            position = self.positions[tx.symbol] = Position(tx.symbol)
+        side = trade_side(tx.action)
+        if side == "buy":
+            position.buy(tx.date, abs(float(tx.quantity or 0.0)), abs(float(tx.amount or 0.0)), self.method == "average")
+        elif side == "sell":
+            position.sell(abs(float(tx.quantity or 0.0)), abs(float(tx.amount or 0.0)))
+
+    def cost_basis(self) -> Dict[str, Dict[str, float]]:
+        """{symbol: {"total_cost", "total_shares"}} for every symbol traded, as fresh dicts."""
+        return {s: {"total_cost": p.cost, "total_shares": p.shares} for s, p in self.positions.items()}
+
+    def realized_pnl(self) -> float:
+        return sum(p.realized_pnl for p in self.positions.values())
+
+    def unrealized_pnl(self, prices: Dict[str, float]) -> float:
+        return sum(p.unrealized_pnl(prices.get(s)) for s, p in self.positions.items())
+
+    def summary(self, prices: Dict[str, float]) -> Dict[str, Dict[str, float]]:
+        """Per-symbol shares, cost basis, average cost and realized/unrealized P&L at `prices`."""
+        return {
+            s: {
+                "shares": p.shares,
+                "cost_basis": p.cost,
+                "avg_cost": p.cost / p.shares if p.shares > EPSILON else 0.0,
+                "realized_pnl": p.realized_pnl,
+                "unrealized_pnl": p.unrealized_pnl(prices.get(s)),
+            }
+            for s, p in self.positions.items()
+        }
@@ -0,0 +1,183 @@
+"""
+Versioned memoization for per-user analytics (accurate_main.py).
+
+Entries are keyed by (namespace, user_id, data_version, function, arguments). A user's
+data_version is bumped whenever their transactions or history change, so entries are never
+invalidated explicitly: lookups simply move on to the new version and stale entries age out
+of the LRU. The namespace identifies the database the results were computed from; user ids
+and versions restart when a database is recreated, so entries from another database must
+never match. Users without a version yet (no summary row) are not memoized at all.
+
+The in-process LRU can be backed by a shared store so several workers reuse each other's
+results. The "sqlite" backend keeps JSON values in a table of a local SQLite file; only
+results marked shared (plain JSON data) are written there.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+MEMO_BACKENDS = ("memory", "sqlite")
+
+_MISSING = object()
+
+
+def memo_key(namespace: str, user_id: int, data_version: int, name: str, args: tuple = ()) -> str:
+    """Stable string key; arguments must be JSON-serializable (anything else is stringified)."""
+    return json.dumps([namespace, user_id, data_version, name, list(args)], default=str, separators=(",", ":"), sort_keys=True)
+
+
+class SQLiteMemoStore:
+    """Shared JSON store in a local SQLite file, safe to open from several processes."""
+
+    def __init__(self, path: str, max_rows: int = 100_000) -> None:
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analytics_memo ("
+                "key TEXT PRIMARY KEY, user_id INTEGER, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_analytics_memo_created_at ON analytics_memo (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = self._connect().execute("SELECT value FROM analytics_memo WHERE key = ?", (key,)).fetchone()
+        return _MISSING if row is None else json.loads(row[0])
+
+    def set(self, key: str, user_id: int, value: Any) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO analytics_memo (key, user_id, value, created_at) VALUES (?, ?, ?, ?)",
+            (key, user_id, json.dumps(value), time.time()),
+        )
+
+    def prune(self) -> int:
+        """Drop the oldest rows beyond max_rows; returns the number removed."""
+        conn = self._connect()
+        cur = conn.execute(
+            "DELETE FROM analytics_memo WHERE key IN ("
+            "SELECT key FROM analytics_memo ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+        return cur.rowcount
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM analytics_memo")
+
+
+class VersionedMemo:
+    """
+    In-process LRU of analytics results with an optional shared store behind it.
+
+    Shared values are plain JSON data and are deep-copied on every hit, so callers may
+    mutate what they get back. Non-shared values (e.g. lot books) are returned as stored
+    and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = 4096, store: SQLiteMemoStore | None = None, namespace: str = "") -> None:
+        self.maxsize = maxsize
+        self.store = store
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, Tuple[bool, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+        self._writes_since_prune = 0
+
+    def _count(self, name: str, outcome: str) -> None:
+        stats = self._stats.setdefault(name, {"hits": 0, "shared_hits": 0, "misses": 0})
+        stats[outcome] += 1
+
+    def bind(self, namespace: str) -> None:
+        """Key entries by `namespace` (the database identity) from now on, dropping local entries."""
+        with self._lock:
+            self.namespace = namespace
+            self._entries.clear()
+
+    def get(self, user_id: int, data_version: int | None, name: str, args: tuple = ()) -> Tuple[bool, Any]:
+        """(True, value) on a hit in the LRU or the shared store, else (False, None)."""
+        if data_version is None:
+            return False, None
+        key = memo_key(self.namespace, user_id, data_version, name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count(name, "hits")
+        if entry is not None:
+            shared, value = entry
+            return True, copy.deepcopy(value) if shared else value
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not _MISSING:
+                self._remember(key, True, value)
+                with self._lock:
+                    self._count(name, "shared_hits")
+                return True, copy.deepcopy(value)
+        with self._lock:
+            self._count(name, "misses")
+        return False, None
+
+    def put(self, user_id: int, data_version: int | None, name: str, args: tuple, value: Any, shared: bool = True) -> None:
+        if data_version is None:
+            return
+        key = memo_key(self.namespace, user_id, data_version, name, args)
+        if shared:
+            value = copy.deepcopy(value)
+        self._remember(key, shared, value)
+        if shared and self.store is not None:
+            self.store.set(key, user_id, value)
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 1000:
+                self._writes_since_prune = 0
+                self.store.prune()
+
+    def _remember(self, key: str, shared: bool, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (shared, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters overall and per function; hit_rate counts LRU and shared-store hits."""
+        def with_rate(counts: Dict[str, int]) -> Dict[str, Any]:
+            lookups = counts["hits"] + counts["shared_hits"] + counts["misses"]
+            hit_rate = (counts["hits"] + counts["shared_hits"]) / lookups if lookups else 0.0
+            return {**counts, "lookups": lookups, "hit_rate": round(hit_rate, 4)}
+
+        with self._lock:
+            per_function = {name: with_rate(dict(counts)) for name, counts in sorted(self._stats.items())}
+            total = {"hits": 0, "shared_hits": 0, "misses": 0}
+            for counts in self._stats.values():
+                for k in total:
+                    total[k] += counts[k]
+            return {
+                "backend": "sqlite" if self.store is not None else "memory",
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "evictions": self.evictions,
+                **with_rate(total),
+                "functions": per_function,
+            }
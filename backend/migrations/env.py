@@ -0,0 +1,69 @@
+"""
+Alembic environment for the accurate_main.py schema.
+
+On app startup `create_db_and_tables()` hands over its own connection and metadata through
+`config.attributes`; from the command line the URL is read from DATABASE_URL and the models
+are imported from accurate_main.
+"""
+
+import os
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+config = context.config
+
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name)
+
+
+def _target_metadata():
+    metadata = config.attributes.get("target_metadata")
+    if metadata is None:
+        from dotenv import load_dotenv
+        from sqlmodel import SQLModel
+
+        load_dotenv()
+        import accurate_main  # noqa: F401  (registers the table models)
+
+        metadata = SQLModel.metadata
+    return metadata
+
+
+def _configure(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=_target_metadata(),
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=os.getenv("DATABASE_URL", "sqlite:///./portfolio.db"),
+        target_metadata=_target_metadata(),
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection)
+        return
+    engine = create_engine(os.getenv("DATABASE_URL", "sqlite:///./portfolio.db"))
+    with engine.connect() as connection:
+        _configure(connection)
+        connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,183 @@
+"""initial schema
+
+Tables as they were created by SQLModel.metadata.create_all() before migrations were
+introduced. Tables that already exist are left alone so databases created that way can
+adopt the migration chain without a manual `alembic stamp`.
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-19 00:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001_initial_schema"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _id() -> sa.Column:
+    return sa.Column("id", sa.Integer(), primary_key=True)
+
+
+TABLES = {
+    "users": ([
+        _id(),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["email"]),
+    "transactions": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+    ], ["user_id"]),
+    "portfolio_history": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("total_value", sa.Float(), nullable=False),
+        sa.Column("spy_price", sa.Float(), nullable=True),
+        sa.Column("positions_json", sa.String(), nullable=False),
+    ], ["user_id"]),
+    "user_profiles": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("display_name", sa.String(), nullable=True),
+        sa.Column("is_public", sa.Boolean(), nullable=False),
+        sa.Column("share_performance_only", sa.Boolean(), nullable=False),
+        sa.Column("anonymize_symbols", sa.Boolean(), nullable=False),
+    ], ["user_id"]),
+    "groups": ([
+        _id(),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("code", sa.String(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("is_public", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["code", "owner_id"]),
+    "group_members": ([
+        _id(),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("joined_at", sa.DateTime(), nullable=False),
+    ], ["group_id", "user_id"]),
+    "weekly_uploads": ([
+        _id(),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("week_start", sa.String(), nullable=False),
+        sa.Column("uploaded_at", sa.DateTime(), nullable=False),
+        sa.Column("source", sa.String(), nullable=True),
+        sa.Column("transactions_count", sa.Integer(), nullable=False),
+    ], ["group_id", "user_id", "week_start"]),
+    "weekly_transactions": ([
+        _id(),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("week_start", sa.String(), nullable=False),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+    ], ["group_id", "user_id", "week_start"]),
+    "weekly_stats": ([
+        _id(),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("week_start", sa.String(), nullable=False),
+        sa.Column("twr_week_pct", sa.Float(), nullable=False),
+        sa.Column("start_value", sa.Float(), nullable=False),
+        sa.Column("end_value", sa.Float(), nullable=False),
+        sa.Column("invested_week", sa.Float(), nullable=False),
+        sa.Column("pnl_week", sa.Float(), nullable=False),
+        sa.Column("best_trade_json", sa.String(), nullable=True),
+        sa.Column("worst_trade_json", sa.String(), nullable=True),
+        sa.Column("badges_json", sa.String(), nullable=True),
+    ], ["group_id", "user_id", "week_start"]),
+    "price_cache_daily": ([
+        _id(),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("close", sa.Float(), nullable=False),
+    ], ["symbol", "date"]),
+    "stock_list_items": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("list_type", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["user_id", "symbol", "list_type"]),
+    "stock_notes": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("labels_json", sa.String(), nullable=False),
+        sa.Column("screenshot_url", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["user_id", "symbol"]),
+    "preference_votes": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("symbol_a", sa.String(), nullable=False),
+        sa.Column("symbol_b", sa.String(), nullable=False),
+        sa.Column("winner", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["user_id"]),
+    "social_actions": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=True),
+        sa.Column("quantity", sa.Float(), nullable=True),
+        sa.Column("amount", sa.Float(), nullable=True),
+        sa.Column("note", sa.String(), nullable=True),
+        sa.Column("group_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["user_id", "type", "group_id", "created_at"]),
+    "streaks": ([
+        _id(),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("current_streak", sa.Integer(), nullable=False),
+        sa.Column("longest_streak", sa.Integer(), nullable=False),
+        sa.Column("last_date", sa.String(), nullable=True),
+    ], ["user_id", "kind"]),
+    "group_notes": ([
+        _id(),
+        sa.Column("group_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    ], ["group_id", "user_id", "symbol"]),
+}
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    for name, (columns, indexed) in TABLES.items():
+        if name in existing:
+            continue
+        op.create_table(name, *columns)
+        for column in indexed:
+            op.create_index(f"ix_{name}_{column}", name, [column])
+
+
+def downgrade() -> None:
+    for name in reversed(list(TABLES)):
+        op.drop_table(name)
@@ -0,0 +1,52 @@
+"""upload dedup: row fingerprints, source accounts and the upload ledger
+
+Revision ID: 0002_upload_dedup
+Revises: 0001_initial_schema
+Create Date: 2026-10-19 00:00:01
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002_upload_dedup"
+down_revision: Union[str, Sequence[str], None] = "0001_initial_schema"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("transactions")}
+    with op.batch_alter_table("transactions") as batch:
+        for name in ("account", "row_hash"):
+            if name not in columns:
+                batch.add_column(sa.Column(name, sa.String(), nullable=True))
+                batch.create_index(f"ix_transactions_{name}", [name])
+
+    if not inspector.has_table("transaction_uploads"):
+        op.create_table(
+            "transaction_uploads",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("file_hash", sa.String(), nullable=False),
+            sa.Column("filename", sa.String(), nullable=True),
+            sa.Column("account", sa.String(), nullable=True),
+            sa.Column("uploaded_at", sa.DateTime(), nullable=False),
+            sa.Column("rows_total", sa.Integer(), nullable=False),
+            sa.Column("rows_inserted", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_transaction_uploads_user_id", "transaction_uploads", ["user_id"])
+        op.create_index("ix_transaction_uploads_file_hash", "transaction_uploads", ["file_hash"])
+    elif "account" not in {c["name"] for c in inspector.get_columns("transaction_uploads")}:
+        with op.batch_alter_table("transaction_uploads") as batch:
+            batch.add_column(sa.Column("account", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_table("transaction_uploads")
+    with op.batch_alter_table("transactions") as batch:
+        batch.drop_index("ix_transactions_row_hash")
+        batch.drop_index("ix_transactions_account")
+        batch.drop_column("row_hash")
+        batch.drop_column("account")
@@ -0,0 +1,43 @@
+"""composite indexes for the hot query shapes
+
+Per-user history and transaction reads filter on user_id and order or range on date;
+weekly data is read per (group_id, user_id, week_start); membership checks hit
+(group_id, user_id); the price cache is probed by (symbol, date) and upload dedup by
+(user_id, row_hash) / (user_id, file_hash).
+
+Revision ID: 0003_composite_indexes
+Revises: 0002_upload_dedup
+Create Date: 2026-10-19 00:00:02
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0003_composite_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_upload_dedup"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_transactions_user_date", "transactions", ["user_id", "date"]),
+    ("ix_transactions_user_row_hash", "transactions", ["user_id", "row_hash"]),
+    ("ix_transaction_uploads_user_file_hash", "transaction_uploads", ["user_id", "file_hash"]),
+    ("ix_portfolio_history_user_date", "portfolio_history", ["user_id", "date"]),
+    ("ix_group_members_group_user", "group_members", ["group_id", "user_id"]),
+    ("ix_weekly_uploads_group_user_week", "weekly_uploads", ["group_id", "user_id", "week_start"]),
+    ("ix_weekly_transactions_group_user_week", "weekly_transactions", ["group_id", "user_id", "week_start"]),
+    ("ix_price_cache_daily_symbol_date", "price_cache_daily", ["symbol", "date"]),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,47 @@
+"""portfolio_latest: one row per user mirroring their newest history snapshot
+
+Revision ID: 0004_portfolio_latest
+Revises: 0003_composite_indexes
+Create Date: 2026-10-19 00:00:03
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0004_portfolio_latest"
+down_revision: Union[str, Sequence[str], None] = "0003_composite_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("portfolio_latest"):
+        return
+    op.create_table(
+        "portfolio_latest",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("date", sa.String(), nullable=False),
+        sa.Column("total_value", sa.Float(), nullable=False),
+        sa.Column("spy_price", sa.Float(), nullable=True),
+        sa.Column("positions_json", sa.String(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    # Backfill from the newest stored snapshot of every user
+    op.execute(
+        """
+        INSERT INTO portfolio_latest (user_id, date, total_value, spy_price, positions_json, updated_at)
+        SELECT h.user_id, h.date, h.total_value, h.spy_price, h.positions_json, CURRENT_TIMESTAMP
+        FROM portfolio_history h
+        WHERE h.id = (
+            SELECT h2.id FROM portfolio_history h2
+            WHERE h2.user_id = h.user_id
+            ORDER BY h2.date DESC, h2.id DESC
+            LIMIT 1
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("portfolio_latest")
@@ -0,0 +1,42 @@
+"""portfolio_summary: precomputed per-user dashboard numbers
+
+Rows are computed by the app after each upload; users whose data predates this table get
+their row filled on the first /api/portfolio/status read, so no backfill is done here.
+
+Revision ID: 0005_portfolio_summary
+Revises: 0004_portfolio_latest
+Create Date: 2026-10-19 00:00:04
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005_portfolio_summary"
+down_revision: Union[str, Sequence[str], None] = "0004_portfolio_latest"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("portfolio_summary"):
+        return
+    op.create_table(
+        "portfolio_summary",
+        sa.Column("user_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("transaction_count", sa.Integer(), nullable=False),
+        sa.Column("positions_count", sa.Integer(), nullable=False),
+        sa.Column("latest_value", sa.Float(), nullable=False),
+        sa.Column("twr", sa.Float(), nullable=False),
+        sa.Column("twr_pct", sa.Float(), nullable=False),
+        sa.Column("twr_days", sa.Integer(), nullable=False),
+        sa.Column("annualized_pct", sa.Float(), nullable=False),
+        sa.Column("history_start", sa.String(), nullable=True),
+        sa.Column("history_end", sa.String(), nullable=True),
+        sa.Column("data_version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("portfolio_summary")
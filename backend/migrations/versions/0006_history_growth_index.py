@@ -0,0 +1,68 @@
+"""prefix growth index on portfolio_history
+
+growth_index is Π(1+r_t) from a user's first snapshot through each row (days whose previous
+value is not positive are skipped) and growth_steps counts the compounded returns, so the
+TWR of any window is growth_index[last] / growth_index[first] - 1.
+
+Revision ID: 0006_history_growth_index
+Revises: 0005_portfolio_summary
+Create Date: 2026-10-19 00:00:05
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006_history_growth_index"
+down_revision: Union[str, Sequence[str], None] = "0005_portfolio_summary"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_ROWS = 5000
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {c["name"] for c in sa.inspect(bind).get_columns("portfolio_history")}
+    with op.batch_alter_table("portfolio_history") as batch:
+        if "growth_index" not in columns:
+            batch.add_column(sa.Column("growth_index", sa.Float(), nullable=True))
+        if "growth_steps" not in columns:
+            batch.add_column(sa.Column("growth_steps", sa.Integer(), nullable=True))
+
+    history = sa.table(
+        "portfolio_history",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("date", sa.String),
+        sa.column("total_value", sa.Float),
+        sa.column("growth_index", sa.Float),
+        sa.column("growth_steps", sa.Integer),
+    )
+    rows = bind.execute(
+        sa.select(history.c.id, history.c.user_id, history.c.total_value)
+        .order_by(history.c.user_id, history.c.date, history.c.id)
+    ).all()
+    stmt = history.update().where(history.c.id == sa.bindparam("row_id"))
+    updates = []
+    user_id, prev, index, steps = None, None, 1.0, 0
+    for row in rows:
+        if row.user_id != user_id:
+            user_id, prev, index, steps = row.user_id, None, 1.0, 0
+        value = float(row.total_value or 0.0)
+        if prev is not None and prev > 0:
+            index *= value / prev
+            steps += 1
+        prev = value
+        updates.append({"row_id": row.id, "growth_index": index, "growth_steps": steps})
+        if len(updates) >= BATCH_ROWS:
+            bind.execute(stmt, updates)
+            updates = []
+    if updates:
+        bind.execute(stmt, updates)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("portfolio_history") as batch:
+        batch.drop_column("growth_steps")
+        batch.drop_column("growth_index")
@@ -0,0 +1,35 @@
+"""database_identity: a random id minted with the database
+
+The analytics memo keys entries by this id, so results cached against a database that was
+since recreated (user ids and data versions restart) are never served for the new one.
+
+Revision ID: 0007_database_identity
+Revises: 0006_history_growth_index
+Create Date: 2026-10-19 00:00:06
+"""
+import uuid
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0007_database_identity"
+down_revision: Union[str, Sequence[str], None] = "0006_history_growth_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("database_identity"):
+        return
+    table = op.create_table(
+        "database_identity",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.bulk_insert(table, [{"id": uuid.uuid4().hex, "created_at": datetime.utcnow()}])
+
+
+def downgrade() -> None:
+    op.drop_table("database_identity")
@@ -0,0 +1,76 @@
+"""account-scoped row fingerprints
+
+Row fingerprints now include the account and number identical rows per account, so the
+same transaction in two accounts is stored once per account whichever file is uploaded
+first. Stored fingerprints are recomputed the way a fresh upload of each account's rows (in
+insertion order) would compute them; rows without a fingerprint are left alone.
+
+Revision ID: 0008_account_row_hash
+Revises: 0007_database_identity
+Create Date: 2026-10-19 00:00:07
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0008_account_row_hash"
+down_revision: Union[str, Sequence[str], None] = "0007_database_identity"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_ROWS = 5000
+
+
+def _fingerprint(row, occurrence: int, with_account: bool) -> str:
+    # Frozen copy of accurate_main._transaction_fingerprint as of this revision (and before it)
+    key = f"{row.date}|{row.action}|{row.symbol}|{float(row.quantity or 0):.6f}|{float(row.amount or 0):.2f}|{occurrence}"
+    if with_account:
+        key = f"{row.account}|{key}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _rehash(with_account: bool) -> None:
+    bind = op.get_bind()
+    transactions = sa.table(
+        "transactions",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("account", sa.String),
+        sa.column("date", sa.String),
+        sa.column("action", sa.String),
+        sa.column("symbol", sa.String),
+        sa.column("quantity", sa.Float),
+        sa.column("amount", sa.Float),
+        sa.column("row_hash", sa.String),
+    )
+    c = transactions.c
+    rows = bind.execute(
+        sa.select(c.id, c.user_id, c.account, c.date, c.action, c.symbol, c.quantity, c.amount)
+        .where(c.row_hash.is_not(None))
+        .order_by(c.user_id, c.id)
+    )
+    stmt = transactions.update().where(c.id == sa.bindparam("row_id"))
+    updates = []
+    user_id, occurrences = None, {}
+    for row in rows.all():
+        if row.user_id != user_id:
+            user_id, occurrences = row.user_id, {}
+        base = _fingerprint(row, 0, with_account)
+        occurrence = occurrences.get(base, 0)
+        occurrences[base] = occurrence + 1
+        updates.append({"row_id": row.id, "row_hash": base if occurrence == 0 else _fingerprint(row, occurrence, with_account)})
+        if len(updates) >= BATCH_ROWS:
+            bind.execute(stmt, updates)
+            updates = []
+    if updates:
+        bind.execute(stmt, updates)
+
+
+def upgrade() -> None:
+    _rehash(with_account=True)
+
+
+def downgrade() -> None:
+    _rehash(with_account=False)
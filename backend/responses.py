@@ -0,0 +1,58 @@
+"""
+Encoders for the chart series endpoints (accurate_main.py).
+
+Series payloads are rendered with orjson, which writes NumPy float arrays directly (NaN as
+null) instead of going through Python floats and the stdlib encoder. Clients that send
+`Accept: application/msgpack` get the same payload as MessagePack when the optional msgpack
+package is installed; without it they get JSON, which the Accept header allows for.
+"""
+
+from typing import Any
+
+import numpy as np
+import orjson
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # listed in requirements.txt; without it MessagePack is simply not offered
+    msgpack = None
+
+# "rows": [{date, a, b}, ...] as the endpoints have always returned; "columnar": {dates: [...], a: [...], b: [...]}
+SERIES_FORMATS = ("rows", "columnar")
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+class ORJSONSeriesResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot encode {type(value).__name__} as MessagePack")
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default)
+
+
+def accepts_msgpack(accept: str | None) -> bool:
+    return msgpack is not None and MSGPACK_MEDIA_TYPE in (accept or "")
+
+
+def series_response(content: Any, accept: str | None = None) -> Response:
+    """`content` as MessagePack when the client accepts it (and msgpack is installed), else JSON."""
+    headers = {"Vary": "Accept"}
+    if accepts_msgpack(accept):
+        return MsgPackResponse(content=content, headers=headers)
+    return ORJSONSeriesResponse(content=content, headers=headers)
@@ -10,6 +10,7 @@ import os
 import yfinance as yf
 import uvicorn
 from supabase_client import get_supabase_admin, get_supabase_user
+from broker_parsers import TransactionBatch, TransactionStream
 from pydantic import BaseModel, EmailStr
 import random
 import string
@@ -156,67 +157,32 @@ async def upload_csv(file: UploadFile = File(...), current_user = Depends(get_cu
         raise HTTPException(status_code=400, detail="File must be a CSV")
     
     try:
-        # Read and process CSV
-        content = await file.read()
-        
-        # Handle BOM and decode content
-        text_content = content.decode('utf-8-sig')  # Handle BOM
-        from io import StringIO
-        
-        # Find the header row that contains our expected columns
-        lines = text_content.strip().split('\n')
-        header_row_index = 0
-        for i, line in enumerate(lines):
-            if 'Run Date' in line and 'Action' in line and 'Symbol' in line:
-                header_row_index = i
-                break
-        
-        # Read CSV starting from the header row
-        df = pd.read_csv(StringIO(text_content), skiprows=header_row_index)
-        
-        # Remove any rows that don't have proper transaction data
-        # Filter out rows where 'Run Date' doesn't look like a date
-        df = df[df['Run Date'].str.contains(r'\d{2}/\d{2}/\d{4}', na=False)].copy()
-        
-        # Log available columns for debugging
-        print(f"Available columns: {list(df.columns)}")
-        print(f"First few rows after filtering: {df.head()}")
-        print(f"Total rows: {len(df)}")
-        
-        # Map Fidelity CSV columns to expected columns  
-        column_mapping = {
-            'Run Date': 'Date',
-            'Price ($)': 'Price'
-        }
-        
-        # Rename columns to match expected format
-        df = df.rename(columns=column_mapping)
-        
-        # Validate required columns after mapping
-        required_columns = ['Date', 'Action', 'Symbol', 'Quantity', 'Price']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
+        # Match the header against the shared broker parser registry (skips export preambles)
+        stream = TransactionStream(file.file)
+        if stream.mapping is None:
             raise HTTPException(
-                status_code=400, 
-                detail=f"Missing required columns: {missing_columns}. Available columns: {list(df.columns)}"
+                status_code=400,
+                detail="Unsupported CSV format. Expected a Fidelity or Schwab transaction export."
             )
+        batch = TransactionBatch.concat([b for b, _ in stream])
         
-        # Clean and process data
-        # Convert dates with error handling
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.strftime('%Y-%m-%d')
-        
-        # Remove rows with invalid dates
-        df = df.dropna(subset=['Date']).copy()
+        df = batch.to_frame().rename(columns={
+            'date': 'Date', 'action': 'Action', 'symbol': 'Symbol',
+            'quantity': 'Quantity', 'price': 'Price', 'amount': 'Amount',
+        })
         
         # Normalize action types
-        df['Action'] = df['Action'].apply(lambda x: 'BUY' if 'BOUGHT' in str(x).upper() else 
-                                                   'SELL' if 'SOLD' in str(x).upper() else 
-                                                   'DIVIDEND' if 'DIVIDEND' in str(x).upper() else str(x))
+        upper_action = df['Action'].str.upper()
+        df['Action'] = (
+            df['Action']
+            .mask(upper_action.str.contains('DIVIDEND'), 'DIVIDEND')
+            .mask(upper_action.str.contains('SOLD'), 'SELL')
+            .mask(upper_action.str.contains('BOUGHT'), 'BUY')
+        )
         
         # Filter out rows with invalid data (like dividends with 0 quantity)
         # Keep dividends but exclude them from position calculations
-        df = df[df['Quantity'] != 0].copy()
-        df = df.dropna(subset=['Date', 'Symbol', 'Quantity', 'Price']).copy()
+        df = df[(df['Quantity'] != 0) & (df['Symbol'] != '')].copy()
         
         # Calculate amount
         df['Amount'] = df['Quantity'] * df['Price']
@@ -245,18 +211,9 @@ async def upload_csv(file: UploadFile = File(...), current_user = Depends(get_cu
         supabase.table('transactions').delete().eq('user_id', current_user.id).execute()
         
         # Insert new transactions
-        transactions = []
-        for _, row in df.iterrows():
-            transaction = {
-                'user_id': current_user.id,
-                'date': row['Date'],
-                'action': row['Action'],
-                'symbol': row['Symbol'],
-                'quantity': float(row['Quantity']),
-                'price': float(row['Price']),
-                'amount': float(row['Amount'])
-            }
-            transactions.append(transaction)
+        transactions = df.assign(user_id=current_user.id)[
+            ['user_id', 'Date', 'Action', 'Symbol', 'Quantity', 'Price', 'Amount']
+        ].rename(columns=str.lower).to_dict('records')
         
         if transactions:
             supabase.table('transactions').insert(transactions).execute()
@@ -267,16 +224,9 @@ async def upload_csv(file: UploadFile = File(...), current_user = Depends(get_cu
         
         # Generate portfolio history
         portfolio_history = []
-        running_positions = {}
-        
-        for _, row in df.iterrows():
-            symbol = row['Symbol']
-            quantity = row['Quantity']
-            
-            if row['Action'].upper() == 'BUY':
-                running_positions[symbol] = running_positions.get(symbol, 0) + quantity
-            elif row['Action'].upper() == 'SELL':
-                running_positions[symbol] = running_positions.get(symbol, 0) - quantity
+        signed = df['Quantity'].where(df['Action'].str.upper() == 'BUY', -df['Quantity'])
+        trades = df['Action'].str.upper().isin(['BUY', 'SELL'])
+        running_positions = signed[trades].groupby(df['Symbol'][trades]).sum().to_dict()
         
         # Calculate portfolio value over time - handle future dates
         start_date_str = df['Date'].min()
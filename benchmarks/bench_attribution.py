@@ -0,0 +1,46 @@
+"""
+Return attribution on five years of weekday snapshots holding 50 positions: the one-off
+decode of every positions_json into (dates, symbols) matrices, then one
+analytics.position_attribution call per window over slices of those matrices.
+"""
+
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from common import best_ms, report, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+
+N_SYMBOLS = 50
+
+
+def snapshots(seed: int = 0) -> list[SimpleNamespace]:
+    rng = np.random.default_rng(seed)
+    dates = m.analytics.session_axis(np.datetime64("2021-01-04"), np.datetime64("2025-12-31"))
+    prices = 100.0 * np.cumprod(1.0 + rng.normal(0.0003, 0.015, (len(dates), N_SYMBOLS)), axis=0)
+    shares = rng.uniform(1, 50, N_SYMBOLS)
+    return [
+        SimpleNamespace(date=str(d), positions_json=json.dumps([
+            {"symbol": f"SYM{j}", "shares": float(shares[j]), "price": float(p[j]), "value": float(shares[j] * p[j])}
+            for j in range(N_SYMBOLS)
+        ]))
+        for d, p in zip(dates, prices)
+    ]
+
+
+def main() -> None:
+    rows = snapshots()
+    dates, symbols, shares, prices = m._position_matrix_from_rows(rows)
+    assert shares.shape == (len(rows), N_SYMBOLS)
+    print(f"attribution, {len(rows):,} snapshots x {N_SYMBOLS} positions")
+    report("decode positions_json into matrices", best_ms(lambda: m._position_matrix_from_rows(rows)))
+    for label, lo in (("whole history", 0), ("last year", len(dates) - 261)):
+        report(f"position_attribution, {label}", best_ms(lambda: m.analytics.position_attribution(shares[lo:], prices[lo:]), 20))
+
+
+if __name__ == "__main__":
+    main()
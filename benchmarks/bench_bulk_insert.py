@@ -0,0 +1,80 @@
+"""
+Writing parsed transactions: _bulk_insert (one Core executemany of plain dict rows on
+SQLite, COPY ... FROM STDIN on Postgres) against building TransactionRecord instances and
+flushing them through the ORM, as the upload path did before. Each run inserts into a
+fresh user and commits.
+
+Runs on a temp SQLite file, and also on Postgres when DATABASE_URL points at one, e.g.
+`DATABASE_URL=postgresql://localhost/tickker_bench python benchmarks/bench_bulk_insert.py`.
+Missing tables are created there, and the rows written (all under negative user ids, which
+no real user has) are deleted afterwards.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+from common import best_ms, report, use_temp_database
+
+POSTGRES_URL = os.environ.get("DATABASE_URL", "")
+if POSTGRES_URL.partition("://")[0].split("+")[0] not in ("postgres", "postgresql"):
+    POSTGRES_URL = ""
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from sqlmodel import Session, delete  # noqa: E402
+
+_user_ids = itertools.count(-1, -1)
+
+
+def transactions(n: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    dates = (np.datetime64("2016-01-04") + rng.integers(0, 3650, n)).astype(str)
+    return [
+        {"date": str(d), "action": "Buy", "symbol": f"SYM{int(s)}", "quantity": float(q), "price": float(p),
+         "amount": float(-q * p), "account": "bench.csv", "row_hash": f"{i:032x}"}
+        for i, (d, s, q, p) in enumerate(zip(dates, rng.integers(0, 40, n), rng.uniform(1, 50, n), rng.uniform(20, 500, n)))
+    ]
+
+
+def bulk(engine, rows: list[dict]) -> None:
+    user_id = next(_user_ids)
+    with Session(engine) as session:
+        m._bulk_insert(session, m.TransactionRecord, [{**r, "user_id": user_id} for r in rows])
+        session.commit()
+
+
+def orm(engine, rows: list[dict]) -> None:
+    user_id = next(_user_ids)
+    with Session(engine) as session:
+        session.add_all([m.TransactionRecord(user_id=user_id, **r) for r in rows])
+        session.commit()
+
+
+def run(label: str, engine) -> None:
+    print(f"transaction inserts, {label}")
+    try:
+        for n in (10_000, 100_000):
+            rows = transactions(n)
+            for name, write in (("_bulk_insert", bulk), ("ORM add_all", orm)):
+                ms = best_ms(lambda: write(engine, rows), 3)
+                report(f"{n:,} rows, {name}, {n / ms * 1000:,.0f} rows/s", ms)
+    finally:
+        with Session(engine) as session:
+            session.exec(delete(m.TransactionRecord).where(m.TransactionRecord.user_id < 0))
+            session.commit()
+
+
+def main() -> None:
+    m.create_db_and_tables()
+    run("SQLite", m.engine)
+    if POSTGRES_URL:
+        engine = m._create_engine(POSTGRES_URL)
+        m.SQLModel.metadata.create_all(engine)
+        run(f"Postgres ({engine.dialect.driver}: COPY for _bulk_insert)", engine)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
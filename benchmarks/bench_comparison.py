@@ -0,0 +1,60 @@
+"""
+Request latency of the comparison endpoints through TestClient, for three users with about
+ten years of daily history (ten holdings each) and warm price caches: the SPY comparison at
+the default and full resolution, a scrub over 50 baselines, custom symbols, and the social
+and group comparisons of all three users.
+"""
+
+import numpy as np
+
+from common import best_ms, fake_stock_data, register_and_upload, report, schwab_csv, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+SYMBOLS = ["AAPL", "MSFT", "AMZN", "GOOG", "META", "NVDA", "JPM", "XOM", "KO", "PG"]
+
+
+def main() -> None:
+    m.get_real_stock_data = fake_stock_data
+    with TestClient(m.app) as client:
+        users = [register_and_upload(client, f"bench{i}@tickker-bench.com", schwab_csv(SYMBOLS[i:] + SYMBOLS[:i])) for i in range(3)]
+        headers = users[0]
+        for h in users:
+            client.put("/api/social/profile", json={"is_public": True}, headers=h)
+        user_ids = ",".join(str(client.get("/api/me", headers=h).json()["id"]) for h in users)
+        group = client.post("/api/groups", json={"name": "bench"}, headers=headers).json()
+        for h in users[1:]:
+            client.post("/api/groups/join", json={"code": group["code"]}, headers=h)
+        rows = client.get("/api/portfolio/history?max_points=10000&format=columnar", headers=headers).json()["history"]["dates"]
+        baselines = [rows[i] for i in np.linspace(0, len(rows) - 1, 50).astype(int)]
+
+        def get(path: str):
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, response.text
+            return response
+
+        def scrub():
+            for baseline in baselines:
+                get(f"/api/comparison/spy?baseline_date={baseline}")
+
+        paths = [
+            "/api/comparison/spy",
+            "/api/comparison/spy?max_points=10000",
+            "/api/comparison/custom?symbols=QQQ,IWM,DIA",
+            f"/api/social/comparison?user_ids={user_ids}",
+            f"/api/groups/{group['id']}/comparison",
+        ]
+        for path in paths:
+            get(path)
+        scrub()
+        print(f"comparison endpoints, {len(rows):,} days of history per user, warm caches")
+        for path in paths:
+            report(path.replace(user_ids, "<3 users>").replace(f"/{group['id']}/", "/{id}/"), best_ms(lambda: get(path)))
+        report("/api/comparison/spy, per baseline of a scrub", best_ms(scrub, 3) / len(baselines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Concurrent read load: 200 clients, each its own thread, send their requests at once to one
+app instance (one event loop plus the threadpool for sync routes, as in a single uvicorn
+worker), spread over the dashboard reads (status, weights, history, performance) of three
+users with ten years of history. Reports wall time, throughput and per-request latency
+percentiles up to p99.
+
+Pass a git revision to run the same load against that commit's backend instead; it is
+checked out in a temporary worktree, which is removed afterwards. The baseline before the
+async database layer is the parent of the commit that added it:
+
+    python benchmarks/bench_concurrency.py "$(git log -1 --format=%h -F --grep='[user-034] Add an async')^"
+"""
+
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+CLIENTS = 200
+REQUESTS_PER_CLIENT = 5
+SYMBOLS = ["AAPL", "MSFT", "AMZN", "GOOG", "META", "NVDA", "JPM", "XOM", "KO", "PG"]
+PATHS = ["/api/portfolio/status", "/api/portfolio/weights", "/api/portfolio/history", "/api/performance/net"]
+
+
+def run_load() -> None:
+    from common import fake_stock_data, register_and_upload, schwab_csv, use_temp_database
+
+    use_temp_database()
+    import accurate_main as m
+    from fastapi.testclient import TestClient
+
+    m.get_real_stock_data = fake_stock_data
+    with TestClient(m.app, raise_server_exceptions=False) as client:
+        users = [register_and_upload(client, f"bench{i}@tickker-bench.com", schwab_csv(SYMBOLS[i:] + SYMBOLS[:i])) for i in range(3)]
+        jobs = list(itertools.product(PATHS, users))
+        for path, headers in jobs:
+            assert client.get(path, headers=headers).status_code == 200  # warm the per-version caches
+
+        def client_session(n: int, ready: threading.Barrier, failures: list[int]) -> list[float]:
+            latencies = []
+            ready.wait()
+            for path, headers in itertools.islice(itertools.cycle(jobs), n, n + REQUESTS_PER_CLIENT):
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+            return latencies
+
+        total = CLIENTS * REQUESTS_PER_CLIENT
+        print(f"{CLIENTS} concurrent clients x {REQUESTS_PER_CLIENT} requests over {', '.join(PATHS)}")
+        for run in range(3):
+            ready = threading.Barrier(CLIENTS + 1)
+            failures: list[int] = []
+            with ThreadPoolExecutor(CLIENTS) as pool:
+                futures = [pool.submit(client_session, n, ready, failures) for n in range(CLIENTS)]
+                ready.wait()
+                start = time.perf_counter()
+                latencies = np.concatenate([f.result() for f in futures])
+                wall = time.perf_counter() - start
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"  run {run + 1}: {wall * 1000:7.0f} ms wall, {total / wall:6.0f} req/s, "
+                  f"p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, p99 {p99:7.1f} ms, {len(failures)} failed")
+
+
+def run_at_revision(rev: str) -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    worktree = os.path.join(tempfile.mkdtemp(prefix="tickker-bench-"), "tree")
+    subprocess.run(["git", "-C", root, "worktree", "add", "--detach", "-q", worktree, rev], check=True)
+    try:
+        print(f"backend at {rev}")
+        env = {**os.environ, "BENCH_BACKEND_DIR": os.path.join(worktree, "backend")}
+        subprocess.run([sys.executable, os.path.abspath(__file__)], check=True, env=env)
+    finally:
+        subprocess.run(["git", "-C", root, "worktree", "remove", "--force", worktree], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_at_revision(sys.argv[1])
+    else:
+        run_load()
@@ -0,0 +1,101 @@
+"""
+DB_PROFILE=basic (SQLite defaults, rollback journal) against DB_PROFILE=production (WAL and
+tuned pragmas) under concurrent uploads and reads. For each profile, in its own process
+and database: one writer uploads new transactions for its account again and again while
+eight reader threads request the dashboard reads (status, weights, history, performance)
+of four users, the writer included. This is run twice, with small uploads (20 rows) and
+with large ones (20,000 rows, so each upload holds its write transaction much longer).
+Reports the upload times and the read latency percentiles and failures while uploads ran.
+"""
+
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+PROFILES = ("basic", "production")
+SIZES = (("small", 20, 10), ("large", 20_000, 3))  # (label, rows per upload, uploads)
+READERS = 8
+SYMBOLS = ["AAPL", "MSFT", "AMZN", "GOOG", "META", "NVDA", "JPM", "XOM", "KO", "PG"]
+PATHS = ["/api/portfolio/status", "/api/portfolio/weights", "/api/portfolio/history", "/api/performance/net"]
+
+
+def upload_csv(n: int, seed: int) -> bytes:
+    """n buys on random weekdays since 2024, with prices that make every row new."""
+    rng = np.random.default_rng(seed)
+    days = np.busday_offset(np.datetime64("2024-01-02"), rng.integers(0, 600, n), roll="forward").astype(object)
+    symbols = rng.integers(0, len(SYMBOLS), n)
+    price = rng.uniform(20, 500, n).round(2)
+    lines = ["Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount"]
+    lines += [f"{d:%m/%d/%Y},Buy,{SYMBOLS[s]},{SYMBOLS[s]},1,${p:.2f},,-${p:.2f}" for d, s, p in zip(days, symbols, price)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def run_profile() -> None:
+    from common import fake_stock_data, register_and_upload, schwab_csv, use_temp_database
+
+    use_temp_database()
+    import accurate_main as m
+    from fastapi.testclient import TestClient
+
+    m.get_real_stock_data = fake_stock_data
+    print(f"DB_PROFILE={m.DB_PROFILE}")
+    with TestClient(m.app) as client:
+        users = [
+            register_and_upload(client, f"bench{i}@tickker-bench.com", schwab_csv(SYMBOLS[i:] + SYMBOLS[:i], start="2024-01-02"))
+            for i in range(4)
+        ]
+        writer = users[0]
+        seeds = itertools.count()
+        for label, rows, uploads in SIZES:
+            done = threading.Event()
+            latencies: list[float] = []
+            failures: list[int] = []
+
+            def read(reader: int) -> None:
+                for path, headers in itertools.cycle(itertools.product(PATHS, users[reader % 4:] + users[:reader % 4])):
+                    if done.is_set():
+                        return
+                    start = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+
+            upload_ms = []
+            readers = [threading.Thread(target=read, args=(i,)) for i in range(READERS)]
+            for thread in readers:
+                thread.start()
+            try:
+                for _ in range(uploads):
+                    csv = upload_csv(rows, next(seeds))
+                    start = time.perf_counter()
+                    response = client.post("/api/upload", files={"file": ("schwab.csv", csv, "text/csv")}, headers=writer)
+                    upload_ms.append((time.perf_counter() - start) * 1000.0)
+                    assert response.status_code == 200, response.text
+            finally:
+                done.set()
+                for thread in readers:
+                    thread.join()
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"  {label} uploads ({rows:,} rows): {uploads} uploads, mean {np.mean(upload_ms):6.0f} ms, "
+                  f"max {max(upload_ms):6.0f} ms")
+            print(f"    {len(latencies):5d} reads meanwhile: p50 {p50:6.1f} ms, p95 {p95:6.1f} ms, p99 {p99:7.1f} ms, "
+                  f"{len(failures)} failed")
+
+
+def main() -> None:
+    # DB_PROFILE is read when accurate_main is imported, so each profile runs in its own process
+    for profile in PROFILES:
+        subprocess.run([sys.executable, __file__, profile], check=True, env={**os.environ, "DB_PROFILE": profile})
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run_profile()
+    else:
+        main()
@@ -0,0 +1,53 @@
+"""
+Deposit-averaged returns (_deposit_averaged_from_rows) on synthetic accounts of 5k, 10k and
+20k transactions: one deposit every ~34 transactions, buys and sells over 40 symbols. Sells
+close lots from the symbol's own queue, so the time should roughly double with the account.
+"""
+
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from common import best_ms, report, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+
+SYMBOLS = [f"SYM{i}" for i in range(40)]
+
+
+def account(n: int, seed: int = 0) -> tuple[SimpleNamespace, list[SimpleNamespace]]:
+    rng = np.random.default_rng(seed)
+    days = np.datetime64("2010-01-04") + np.sort(rng.integers(0, 5000, n))
+    held = dict.fromkeys(SYMBOLS, 0.0)
+    txs = []
+    for i, day in enumerate(days.astype(str)):
+        symbol = SYMBOLS[int(rng.integers(len(SYMBOLS)))]
+        price = float(rng.uniform(20, 500))
+        if i % 34 == 0:
+            txs.append(SimpleNamespace(date=day, action="MoneyLink Transfer", symbol="", quantity=0.0, amount=float(rng.uniform(1_000, 20_000))))
+        elif held[symbol] > 1 and rng.random() < 0.4:
+            qty = held[symbol] * float(rng.uniform(0.1, 0.9))
+            held[symbol] -= qty
+            txs.append(SimpleNamespace(date=day, action="Sell", symbol=symbol, quantity=-qty, amount=qty * price))
+        else:
+            qty = float(rng.uniform(1, 20))
+            held[symbol] += qty
+            txs.append(SimpleNamespace(date=day, action="Buy", symbol=symbol, quantity=qty, amount=-qty * price))
+    positions = json.dumps([{"symbol": s, "shares": 1.0, "price": float(rng.uniform(20, 500))} for s in SYMBOLS])
+    return SimpleNamespace(date=str(days[-1]), positions_json=positions), txs
+
+
+def main() -> None:
+    print("deposit-averaged returns")
+    for n in (5_000, 10_000, 20_000):
+        latest, txs = account(n)
+        deposits = sum(1 for tx in txs if tx.action == "MoneyLink Transfer")
+        assert m._deposit_averaged_from_rows(latest, txs)["periods"]
+        report(f"{n:,} transactions, {deposits} deposits", best_ms(lambda: m._deposit_averaged_from_rows(latest, txs)))
+
+
+if __name__ == "__main__":
+    main()
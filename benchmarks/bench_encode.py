@@ -0,0 +1,44 @@
+"""
+Encoding a ten-year SPY comparison payload (2,608 dated points of portfolio and SPY values):
+stdlib json over the row format, as the endpoints did before responses.py, against the
+orjson renderer over rows and columnar, and MessagePack over columnar when msgpack is
+installed. Labels carry the encoded size.
+"""
+
+import json
+
+import numpy as np
+
+from common import best_ms, report
+
+import analytics
+import responses
+
+
+def payloads() -> tuple[dict, dict]:
+    rng = np.random.default_rng(0)
+    dates = analytics.session_axis(np.datetime64("2016-01-04"), np.datetime64("2025-12-31"))
+    portfolio, spy = 10_000.0 * np.cumprod(1.0 + rng.normal(0.0004, 0.01, (2, len(dates))), axis=1)
+    rows = [{"date": str(d), "portfolio": float(p), "spy": float(s)} for d, p, s in zip(dates, portfolio, spy)]
+    columnar = {"dates": dates.astype(str).tolist(), "portfolio": portfolio, "spy": spy}
+    return {"comparison": rows}, {"comparison": columnar}
+
+
+def main() -> None:
+    rows, columnar = payloads()
+    orjson_response = responses.ORJSONSeriesResponse(content=None)
+    encoders = [
+        ("stdlib json, rows", lambda: json.dumps(rows).encode()),
+        ("orjson, rows", lambda: orjson_response.render(rows)),
+        ("orjson, columnar", lambda: orjson_response.render(columnar)),
+    ]
+    if responses.msgpack is not None:
+        msgpack_response = responses.MsgPackResponse(content=None)
+        encoders.append(("msgpack, columnar", lambda: msgpack_response.render(columnar)))
+    print(f"comparison payload, {len(rows['comparison']):,} points")
+    for label, encode in encoders:
+        report(f"{label} ({len(encode()) / 1024:.0f} KiB)", best_ms(encode, 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-user queries on a 10,000-user SQLite database (250 weekly snapshots and 50
+transactions each, 3M rows in all) with the composite (user_id, date) indexes, then again
+after dropping them so only the single-column user_id indexes remain. Each query runs for
+200 random users in a fresh session.
+"""
+
+import numpy as np
+
+from common import best_ms, report, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+N_USERS = 10_000
+SNAPSHOTS = 250
+TRANSACTIONS = 50
+COMPOSITE = ["ix_portfolio_history_user_date", "ix_transactions_user_date", "ix_transactions_user_row_hash"]
+
+
+def seed() -> None:
+    dates = (np.datetime64("2021-01-04") + 7 * np.arange(SNAPSHOTS)).astype(str).tolist()
+    rng = np.random.default_rng(0)
+    with Session(m.engine) as session:
+        for first in range(1, N_USERS + 1, 500):
+            users = range(first, min(first + 500, N_USERS + 1))
+            # Interleave users the way uploads arrive, so one user's rows are spread over the table
+            m._bulk_insert(session, m.PortfolioHistoryRecord, [
+                {"user_id": u, "date": d, "total_value": 1000.0 + i, "spy_price": 400.0, "positions_json": "[]",
+                 "growth_index": 1.0, "growth_steps": i}
+                for i, d in enumerate(dates) for u in users
+            ])
+            m._bulk_insert(session, m.TransactionRecord, [
+                {"user_id": u, "date": dates[int(j)], "action": "Buy", "symbol": "SYM", "quantity": 1.0, "price": 1.0,
+                 "amount": -1.0, "account": None, "row_hash": f"{u:08x}{k:024x}"}
+                for k, j in enumerate(rng.integers(0, SNAPSHOTS, TRANSACTIONS)) for u in users
+            ])
+        session.commit()
+
+
+def queries(user_ids: list[int]) -> dict:
+    def run(build):
+        def go():
+            with Session(m.engine) as session:
+                for u in user_ids:
+                    session.exec(build(u)).all()
+        return go
+
+    h = m.PortfolioHistoryRecord
+    return {
+        "newest snapshot": run(m._latest_history_statement),
+        "first snapshot on or after a date": run(lambda u: m._history_edge_statement(u, "2023-01-01", None, newest=False)),
+        "one year of history": run(lambda u: m._history_statement(u).where((h.date >= "2023-01-01") & (h.date < "2024-01-01"))),
+        "transactions in date order": run(lambda u: m._transactions_statement(u).order_by(m.TransactionRecord.date)),
+    }
+
+
+def main() -> None:
+    m.create_db_and_tables()
+    seed()
+    user_ids = np.random.default_rng(1).integers(1, N_USERS + 1, 200).tolist()
+    timings = {label: best_ms(q) for label, q in queries(user_ids).items()}
+    with m.engine.begin() as conn:
+        for name in COMPOSITE:
+            conn.execute(text(f"DROP INDEX {name}"))
+    print(f"{N_USERS:,} users, 200 lookups per query: composite indexes vs user_id only")
+    for label, q in queries(user_ids).items():
+        report(f"{label}, composite", timings[label])
+        report(f"{label}, user_id only", best_ms(q))
+
+
+if __name__ == "__main__":
+    main()
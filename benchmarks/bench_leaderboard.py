@@ -0,0 +1,86 @@
+"""
+Group leaderboard cost by group size: groups of 3, 6 and 12 members with about two years
+of daily history each, every member with a weekly upload of three trades. For every size
+and each of /api/groups/{id}/leaderboard, /weekly/leaderboard and /weekly/summary, the SQL
+statements issued by one request (sync and async engines, authentication included) and its
+best request time, with the analytics memo cleared before each request so every return is
+computed. Weekly price changes read closes seeded into the daily price cache.
+"""
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from common import best_ms, fake_stock_data, register_and_upload, report, schwab_csv, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+SYMBOLS = ["AAPL", "MSFT", "AMZN", "GOOG", "META", "NVDA", "JPM", "XOM", "KO", "PG", "V", "MA"]
+SIZES = (3, 6, 12)
+WEEK = "2025-03-10"
+
+
+def weekly_csv(buy: str, sell: str) -> bytes:
+    lines = ["Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount",
+             f"03/11/2025,Buy,{buy},{buy},5,$100.00,,-$500.00",
+             f"03/12/2025,Sell,{sell},{sell},2,$100.00,,$200.00",
+             "03/13/2025,Buy,PENY,PENNY CORP,100,$3.00,,-$300.00"]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def seed_week_closes() -> None:
+    with Session(m.engine) as session:
+        for i, symbol in enumerate([*SYMBOLS, "PENY", "SPY"]):
+            for day in range(10, 15):
+                session.add(m.PriceCacheDaily(symbol=symbol, date=f"2025-03-{day}", close=100.0 + i + (day - 10) * (i - 6)))
+        session.commit()
+
+
+def main() -> None:
+    m.get_real_stock_data = fake_stock_data
+    statements = []
+    for engine in (m.engine, m.async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with TestClient(m.app) as client:
+        users = [
+            register_and_upload(client, f"bench{i}@tickker-bench.com", schwab_csv(SYMBOLS[i:i + 3], start="2024-01-02"))
+            for i in range(max(SIZES))
+        ]
+        for h in users:
+            client.put("/api/social/profile", json={"is_public": True}, headers=h)
+        seed_week_closes()
+        owner = users[0]
+        groups = {}
+        for size in SIZES:
+            group = client.post("/api/groups", json={"name": f"bench{size}"}, headers=owner).json()
+            for h in users[1:size]:
+                client.post("/api/groups/join", json={"code": group["code"]}, headers=h)
+            for i, h in enumerate(users[:size]):
+                client.post(f"/api/groups/{group['id']}/weekly/upload?week={WEEK}",
+                            files={"file": ("week.csv", weekly_csv(SYMBOLS[(i + 3) % len(SYMBOLS)], SYMBOLS[i]), "text/csv")}, headers=h)
+            groups[size] = group["id"]
+
+        for label, path, key in (
+            ("group leaderboard", "/api/groups/{}/leaderboard", "leaderboard"),
+            ("weekly leaderboard", f"/api/groups/{{}}/weekly/leaderboard?week={WEEK}", "leaderboard"),
+            ("weekly summary", f"/api/groups/{{}}/weekly/summary?week={WEEK}", "users"),
+        ):
+            print(f"{label}, memo cleared before each request")
+            for size in SIZES:
+                url = path.format(groups[size])
+
+                def cold():
+                    m.analytics_memo.clear()
+                    response = client.get(url, headers=owner)
+                    assert response.status_code == 200, response.text
+                    assert len(response.json()[key]) == size
+
+                statements.clear()
+                cold()
+                report(f"{size} members, {len(statements)} SQL statements", best_ms(cold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Largest-Triangle-Three-Buckets downsampling of ten years of daily portfolio and SPY levels
+(2,608 points x 2 series) to the default CHART_MAX_POINTS and a few other chart widths,
+which covers both of analytics.lttb_indices' walks (table lookups for small buckets, one
+array expression per bucket for large ones).
+"""
+
+import numpy as np
+
+from common import best_ms, report
+
+import analytics
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    dates = analytics.session_axis(np.datetime64("2016-01-04"), np.datetime64("2025-12-31"))
+    x = dates.astype(np.int64).astype(np.float64)
+    y = np.cumprod(1.0 + rng.normal(0.0004, 0.01, (2, len(dates))), axis=1)
+    print(f"lttb_indices, {len(dates):,} points x 2 series")
+    for max_points in (2_000, 800, 200, 50):
+        assert len(analytics.lttb_indices(x, y, max_points)) == max_points
+        report(f"down to {max_points:,} points", best_ms(lambda: analytics.lttb_indices(x, y, max_points), 20))
+
+
+if __name__ == "__main__":
+    main()
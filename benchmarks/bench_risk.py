@@ -0,0 +1,31 @@
+"""
+Risk statistics (volatility, Sharpe, Sortino, max drawdown, beta, alpha, correlation,
+tracking error) for ten years of daily portfolio and benchmark levels in one
+analytics.risk_metrics call, the per-request cost of /api/performance/risk on a cache miss.
+"""
+
+import numpy as np
+
+from common import best_ms, report
+
+import analytics
+
+
+def levels(n: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    dates = analytics.session_axis(np.datetime64("2016-01-04"), np.datetime64("2016-01-04") + int(n * 1.45))[:n]
+    market = rng.normal(0.0004, 0.011, len(dates))
+    portfolio = 0.9 * market + rng.normal(0.0001, 0.006, len(dates))
+    return dates, np.cumprod(1.0 + np.vstack([portfolio, market]), axis=1)
+
+
+def main() -> None:
+    print("risk_metrics, portfolio + benchmark")
+    for n in (252, 2_609, 10_000):
+        dates, both = levels(n)
+        assert analytics.risk_metrics(dates, both)["observations"] == len(dates) - 1
+        report(f"{len(dates):,} daily levels", best_ms(lambda: analytics.risk_metrics(dates, both, 0.04), 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Window TWR on 10 years of daily history (2,608 snapshots with 10 positions each): the
+stored prefix growth index (two indexed lookups) against loading the snapshots and
+compounding them row by row, which is what every TWR request did before the index.
+"""
+
+import json
+
+import numpy as np
+
+from common import best_ms, report, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+USER_ID = 1
+WINDOWS = [(None, None), ("2020-01-01", "2022-12-31"), ("2024-06-01", None)]
+
+
+def seed(session: Session) -> None:
+    dates = m.analytics.session_axis(np.datetime64("2016-01-04"), np.datetime64("2025-12-31"))
+    rng = np.random.default_rng(0)
+    values = 100_000 * np.cumprod(1 + rng.normal(0.0004, 0.01, len(dates)))
+    positions = json.dumps([{"symbol": f"SYM{i}", "shares": 10.0, "price": 100.0, "value": 1000.0} for i in range(10)])
+    growth, steps = m._growth_index(values.tolist())
+    m._bulk_insert(session, m.PortfolioHistoryRecord, [
+        {"user_id": USER_ID, "date": str(d), "total_value": float(v), "spy_price": 400.0,
+         "positions_json": positions, "growth_index": float(g), "growth_steps": int(n)}
+        for d, v, g, n in zip(dates, values, growth, steps)
+    ])
+    session.commit()
+
+
+def main() -> None:
+    m.create_db_and_tables()
+    with Session(m.engine) as session:
+        seed(session)
+        for start, end in WINDOWS:
+            twr = m._compute_time_weighted_return.__wrapped__(session, USER_ID, start, end)
+            rows = session.exec(m._history_statement(USER_ID)).all()
+            assert abs(twr["twr"] - m._twr_from_history(rows, start, end)["twr"]) < 1e-9
+
+    def indexed(start, end):
+        with Session(m.engine) as session:
+            return m._compute_time_weighted_return.__wrapped__(session, USER_ID, start, end)
+
+    def row_loop(start, end):
+        with Session(m.engine) as session:
+            return m._twr_from_history(session.exec(m._history_statement(USER_ID)).all(), start, end)
+
+    print("window TWR, 2,608 snapshots, one session per call")
+    for start, end in WINDOWS:
+        label = f"{start or 'start'}..{end or 'end'}"
+        report(f"{label} growth index", best_ms(lambda: indexed(start, end), 20))
+        report(f"{label} load + row loop", best_ms(lambda: row_loop(start, end)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Peak memory of one large CSV upload: a Schwab export of about 200 MB (4.8M rows over ten
+symbols) is written to a temp file in blocks and handed to upload_csv as an UploadFile on
+disk, the way the server spools a large request body, so no copy of the file sits in
+memory. The growth of the process's peak RSS during the upload is reported with its wall
+time. Pass a row count to run a smaller file, e.g. `python benchmarks/bench_upload_memory.py 200000`.
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import fake_stock_data, use_temp_database
+
+use_temp_database()
+
+import accurate_main as m  # noqa: E402
+from fastapi import UploadFile  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+N_ROWS = 4_800_000
+BLOCK_ROWS = 100_000
+SYMBOLS = ["AAPL", "MSFT", "AMZN", "GOOG", "META", "NVDA", "JPM", "XOM", "KO", "PG"]
+
+
+def write_large_csv(path: str, n: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount\n")
+        f.write("01/04/2016,MoneyLink Transfer,,Tfr BANK,,,,$1000000000.00\n")
+        for first in range(0, n, BLOCK_ROWS):
+            size = min(BLOCK_ROWS, n - first)
+            days = (np.datetime64("2016-01-04") + rng.integers(0, 3650, size)).astype("datetime64[D]").astype(object)
+            symbols = rng.integers(0, len(SYMBOLS), size)
+            qty = rng.integers(1, 5, size)
+            price = rng.uniform(20, 500, size).round(2)
+            f.writelines(
+                f"{d:%m/%d/%Y},Buy,{SYMBOLS[s]},{SYMBOLS[s]},{q},${p:.2f},,-${q * p:.2f}\n"
+                for d, s, q, p in zip(days, symbols, qty, price)
+            )
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main() -> None:
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    m.get_real_stock_data = fake_stock_data
+    m.create_db_and_tables()
+    with Session(m.engine) as session:
+        session.add(m.User(email="bench@tickker-bench.com", password_hash="-"))
+        session.commit()
+    path = os.path.join(tempfile.mkdtemp(prefix="tickker-bench-"), "schwab.csv")
+    write_large_csv(path, n_rows)
+    size_mb = os.path.getsize(path) / 2**20
+    with Session(m.engine) as session, open(path, "rb") as f:
+        user = session.exec(select(m.User)).one()
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        response = m.upload_csv(file=UploadFile(f, filename="schwab.csv"), files=None, current_user=user, session=session)
+        elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.body
+    os.remove(path)
+    print(f"upload of {n_rows:,} rows ({size_mb:.0f} MB)")
+    print(f"  peak RSS {before:.0f} MB -> {peak_rss_mb():.0f} MB (+{peak_rss_mb() - before:.0f} MB), {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Helpers for the benchmarks in this directory. Each script is standalone and run from the
+repository root, e.g. `python benchmarks/bench_twr.py`; numbers are best-of-N wall times on
+synthetic data, so compare them on one machine rather than across machines.
+"""
+
+import functools
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Callable
+
+import numpy as np
+
+# BENCH_BACKEND_DIR runs a benchmark against another checkout's backend (see bench_concurrency.py)
+BACKEND_DIR = os.environ.get("BENCH_BACKEND_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def use_temp_database() -> str:
+    """Point accurate_main at a fresh SQLite file; call before importing it."""
+    path = os.path.join(tempfile.mkdtemp(prefix="tickker-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["ANALYTICS_CACHE_BACKEND"] = "memory"
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def fake_stock_data(symbol, start_date, end_date):
+    """
+    Deterministic weekday closes standing in for get_real_stock_data, so no network is used.
+    Cached per (symbol, start, end) and returned shared, like the real function's price cache.
+    """
+    seed = sum(ord(c) for c in symbol)
+    prices = {}
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end_date:
+        if day.weekday() < 5:
+            t = day.toordinal()
+            prices[day.strftime("%Y-%m-%d")] = round(100.0 + seed % 50 + 10.0 * np.sin(t / 17.0 + seed) + t % 3650 / 100.0, 2)
+        day += timedelta(days=1)
+    return prices
+
+
+def schwab_csv(symbols: list[str], start: str = "2016-01-04") -> bytes:
+    """A Schwab export: one deposit, then a buy of each symbol on the following weekdays."""
+    day = np.datetime64(start)
+    lines = ["Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount",
+             f"{day.item():%m/%d/%Y},MoneyLink Transfer,,Tfr BANK,,,,$100000.00"]
+    for i, symbol in enumerate(symbols):
+        day = np.busday_offset(day, 1, roll="forward")
+        lines.append(f"{day.item():%m/%d/%Y},Buy,{symbol},{symbol},{10 + i},$100.00,,-${(10 + i) * 100:.2f}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def register_and_upload(client, email: str, csv: bytes) -> dict:
+    """Register a user, upload `csv` for them and return their bearer-token headers."""
+    client.post("/api/auth/register", json={"email": email, "password": "pw"})
+    token = client.post("/api/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/api/upload", files={"file": ("schwab.csv", csv, "text/csv")}, headers=headers)
+    assert response.status_code == 200, response.text
+    return headers
+
+
+def best_ms(fn: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """Best of `repeat` runs of `number` calls, in milliseconds per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1000.0
+
+
+def report(label: str, ms: float) -> None:
+    print(f"  {label:<44} {ms:10.3f} ms")
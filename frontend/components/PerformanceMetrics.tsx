@@ -31,10 +31,15 @@ export default function PerformanceMetrics() {
   }
 
   const periods = [
+    { key: '1W', label: '1 Week', icon: Calendar },
     { key: '1M', label: '1 Month', icon: Calendar },
     { key: '3M', label: '3 Months', icon: Target },
     { key: '6M', label: '6 Months', icon: BarChart3 },
+    { key: 'YTD', label: 'Year to Date', icon: Calendar },
     { key: '1Y', label: '1 Year', icon: Award },
+    { key: '3Y', label: '3 Years', icon: Award },
+    { key: '5Y', label: '5 Years', icon: Award },
+    { key: 'ITD', label: 'Since Inception', icon: TrendingUp },
   ]
 
   const getPerformanceIcon = (outperformance: number) => {
@@ -33,14 +33,21 @@ export interface PortfolioWeight {
 export interface PerformanceMetric {
   portfolio_return: number
   spy_return: number
+  benchmark_return?: number
   outperformance: number
+  start_date?: string
 }
 
 export interface PerformanceMetrics {
+  '1W'?: PerformanceMetric
   '1M'?: PerformanceMetric
   '3M'?: PerformanceMetric
   '6M'?: PerformanceMetric
+  'YTD'?: PerformanceMetric
   '1Y'?: PerformanceMetric
+  '3Y'?: PerformanceMetric
+  '5Y'?: PerformanceMetric
+  'ITD'?: PerformanceMetric
 }
 
 export interface ComparisonData {
@@ -97,4 +104,37 @@ export interface PerformanceResponse {
     periods: { start: string; end: string; begin: number; end: number; net_contrib: number; return_pct: number }[]
     avg_return_pct: number
   }
-}
\ No newline at end of file
+}
+export interface ComparisonIndexResponse {
+  dates: string[]
+  portfolio: (number | null)[]
+  spy: (number | null)[]
+  portfolio_start: string | null
+  data_version?: number
+}
+
+export interface DrawdownEpisode {
+  peak_date: string
+  trough_date: string
+  recovery_date: string | null
+  depth_pct: number
+  duration_days: number
+  days_to_trough: number
+}
+
+export interface DrawdownStats {
+  current_drawdown_pct: number
+  current_peak_date: string | null
+  max_drawdown_pct: number
+  episodes: DrawdownEpisode[]
+}
+
+export interface DrawdownResponse {
+  series: { date: string; portfolio: number; spy: number }[]
+  portfolio: DrawdownStats
+  spy: DrawdownStats
+  points?: number
+  total_points?: number
+  as_of?: string
+  data_version?: number
+}
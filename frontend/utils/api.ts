@@ -5,9 +5,11 @@ import {
   PortfolioWeight, 
   PerformanceMetrics, 
   ComparisonData,
+  ComparisonIndexResponse,
   StockSearchResult,
   ApiResponse,
-  PerformanceResponse
+  PerformanceResponse,
+  DrawdownResponse
 } from '@/types'
 
 const api = axios.create({
@@ -84,6 +86,15 @@ export const portfolioApi = {
     return (response.data as PerformanceResponse).deposit_avg
   },
 
+  // maxPoints defaults to the server's CHART_MAX_POINTS, like the other chart series
+  getDrawdown: async (topN: number = 5, maxPoints?: number): Promise<DrawdownResponse> => {
+    const params = new URLSearchParams({ top_n: String(topN) })
+    if (maxPoints) params.append('max_points', String(maxPoints))
+
+    const response = await api.get(`/portfolio/drawdown?${params}`)
+    return response.data
+  },
+
   getSpyComparison: async (baselineDate?: string): Promise<{ comparison: ComparisonData[] }> => {
     const params = new URLSearchParams()
     if (baselineDate) params.append('baseline_date', baselineDate)
@@ -92,6 +103,12 @@ export const portfolioApi = {
     return response.data
   },
 
+  // Growth-of-1 levels for every reachable baseline; $10k from b to t is level[t] / level[b] * 10000
+  getSpyComparisonIndex: async (): Promise<ComparisonIndexResponse> => {
+    const response = await api.get('/comparison/spy/index')
+    return response.data
+  },
+
   searchStocks: async (query: string): Promise<{ results: StockSearchResult[] }> => {
     const response = await api.get(`/search/stocks?query=${encodeURIComponent(query)}`)
     return response.data
@@ -0,0 +1,89 @@
+"""
+Shared fixtures for the backend tests. The API tests run accurate_main against a throwaway
+SQLite database and a deterministic price feed, so no network access is needed.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# The suite runs on its own SQLite file. A Postgres DATABASE_URL set by the caller is kept
+# for the tests of Postgres-only code paths (see the postgres_engine fixture).
+CALLER_DATABASE_URL = os.environ.get("DATABASE_URL", "")
+
+_TMP_DIR = tempfile.mkdtemp(prefix="tickker-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'portfolio.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["ANALYTICS_CACHE_BACKEND"] = "memory"
+os.environ["ANALYTICS_CACHE_PATH"] = os.path.join(_TMP_DIR, "analytics_cache.db")
+
+
+def fake_stock_data(symbol, start_date, end_date):
+    """
+    Weekday closes that depend only on the symbol and the date, like a real price feed, with
+    a "market holiday" (no quote) every 19th day.
+    """
+    seed = sum(ord(c) for c in symbol)
+    prices = {}
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end_date:
+        t = day.toordinal()
+        if day.weekday() < 5 and t % 19:
+            prices[day.strftime("%Y-%m-%d")] = round(100.0 + seed % 50 + 10.0 * np.sin(t / 17.0 + seed), 2)
+        day += timedelta(days=1)
+    return prices
+
+
+@pytest.fixture(scope="session")
+def main():
+    import accurate_main
+
+    return accurate_main
+
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def postgres_engine(main):
+    """Engine on the caller's Postgres DATABASE_URL; tests that use it are skipped without one."""
+    if CALLER_DATABASE_URL.partition("://")[0].split("+")[0] not in ("postgres", "postgresql"):
+        pytest.skip("DATABASE_URL does not point at a Postgres database")
+    pytest.importorskip("psycopg")
+    engine = main._create_engine(CALLER_DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def _fake_prices(request, monkeypatch):
+    if "main" in request.fixturenames:
+        main = request.getfixturevalue("main")
+        monkeypatch.setattr(main, "get_real_stock_data", fake_stock_data)
+        main.portfolio_data["price_cache"] = {}
+
+
+_user_ids = itertools.count(1)
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register a fresh user and return their bearer-token headers."""
+    email = f"user{next(_user_ids)}@tickker-tests.com"
+    client.post("/api/auth/register", json={"email": email, "password": "pw"})
+    token = client.post("/api/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,180 @@
+"""Vectorized return, drawdown and chart kernels in analytics.py."""
+
+import numpy as np
+import pytest
+
+import analytics
+
+
+def dates(*values: str) -> np.ndarray:
+    return np.array(values, dtype="datetime64[D]")
+
+
+def npv(rate: float, schedule: tuple[np.ndarray, np.ndarray]) -> float:
+    when, amounts = schedule
+    years = (when - when.min()).astype(np.float64) / 365.0
+    return float(np.sum(amounts / (1.0 + rate) ** years))
+
+
+def test_xirr_of_a_single_period_is_its_return():
+    schedule = (dates("2023-01-01", "2024-01-01"), np.array([-1000.0, 1100.0]))
+    assert analytics.xirr([schedule])[0] == pytest.approx(0.1, abs=1e-9)
+
+
+def test_xirr_converges_for_irregular_flows_and_batches_like_single_solves():
+    rng = np.random.default_rng(7)
+    schedules = []
+    for _ in range(200):
+        n = int(rng.integers(2, 30))
+        offsets = np.sort(rng.choice(3650, size=n, replace=False))
+        amounts = -rng.uniform(100, 5000, size=n)
+        amounts[-1] = -amounts[:-1].sum() * rng.uniform(0.05, 4.0)  # from -95% to +300% overall
+        schedules.append((np.datetime64("2015-01-01") + offsets, amounts))
+    rates = analytics.xirr(schedules)
+    assert np.isfinite(rates).all()
+    for schedule, rate in zip(schedules, rates):
+        # NPV is far too steep near -100% for a residual check: test for the root's sign change
+        eps = 1e-8 * (1.0 + abs(rate))
+        assert np.sign(npv(rate - eps, schedule)) != np.sign(npv(rate + eps, schedule))
+    np.testing.assert_allclose([analytics.xirr([s])[0] for s in schedules[:20]], rates[:20], rtol=1e-9)
+
+
+def test_xirr_is_nan_without_a_sign_change():
+    schedules = [
+        (dates("2024-01-01", "2024-06-01"), np.array([-100.0, -50.0])),
+        (dates("2024-01-01"), np.array([100.0])),
+        (dates("2024-01-01", "2025-01-01"), np.array([-100.0, 50.0])),
+    ]
+    rates = analytics.xirr(schedules)
+    assert np.isnan(rates[:2]).all()
+    assert rates[2] == pytest.approx(50.0 ** (365.0 / 366.0) / 100.0 ** (365.0 / 366.0) - 1.0, rel=1e-9)
+    assert analytics.xirr([]).shape == (0,)
+
+
+def test_drawdown_series_and_episodes():
+    days = dates("2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05", "2024-01-08", "2024-01-09")
+    level = np.array([100.0, 110.0, 99.0, 88.0, 110.0, 105.0, 108.0])
+    np.testing.assert_allclose(analytics.drawdown(level), [0, 0, -0.1, -0.2, 0, -5 / 110, -2 / 110])
+    assert analytics.drawdown_episodes(days, level) == [
+        {"peak_date": "2024-01-02", "trough_date": "2024-01-04", "recovery_date": "2024-01-05",
+         "depth": pytest.approx(-0.2), "duration_days": 3, "days_to_trough": 2},
+        {"peak_date": "2024-01-05", "trough_date": "2024-01-08", "recovery_date": None,
+         "depth": pytest.approx(-5 / 110), "duration_days": 4, "days_to_trough": 3},
+    ]
+    assert len(analytics.drawdown_episodes(days, level, top_n=1)) == 1
+    assert analytics.drawdown_episodes(days, np.arange(1.0, 8.0)) == []
+
+
+def _episodes_brute_force(level: np.ndarray) -> list[tuple[int, int, int | None, float]]:
+    """(peak, trough, recovery, depth) of every underwater run, scanning day by day."""
+    episodes, peak_i, run = [], 0, None
+    for i, v in enumerate(level):
+        if v >= level[peak_i]:
+            if run is not None:
+                episodes.append((*run, i))
+                run = None
+            peak_i = i
+        else:
+            depth = v / level[peak_i] - 1
+            if run is None:
+                run = [peak_i, i, depth]
+            elif depth < run[2]:
+                run[1:] = [i, depth]
+    if run is not None:
+        episodes.append((*run, None))
+    return sorted(((p, t, r, d) for p, t, d, r in episodes), key=lambda e: e[3])
+
+
+def test_drawdown_episodes_match_a_day_by_day_scan():
+    rng = np.random.default_rng(3)
+    for _ in range(100):
+        n = int(rng.integers(2, 300))
+        level = 100 * np.cumprod(1 + rng.normal(0, 0.02, n))
+        days = np.datetime64("2020-01-01") + np.arange(n)
+        found = analytics.drawdown_episodes(days, level)
+        expected = _episodes_brute_force(level)
+        assert [(e["peak_date"], e["trough_date"], e["recovery_date"]) for e in found] == [
+            (str(days[p]), str(days[t]), None if r is None else str(days[r])) for p, t, r, _ in expected
+        ]
+        np.testing.assert_allclose([e["depth"] for e in found], [d for *_, d in expected])
+
+
+def _lttb_brute_force(x: np.ndarray, y: np.ndarray, max_points: int) -> list[int]:
+    """Textbook LTTB over the same buckets, one triangle at a time (areas summed over series)."""
+    n = len(x)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    picks = [0]
+    for b in range(len(edges) - 1):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            nxt = slice(edges[b + 1], edges[b + 2])
+            cx, cy = x[nxt].mean(), y[:, nxt].mean(axis=1)
+        else:
+            cx, cy = x[-1], y[:, -1]
+        a = picks[-1]
+        areas = [
+            sum(abs((x[a] - cx) * (y[s, i] - y[s, a]) - (x[a] - x[i]) * (cy[s] - y[s, a])) for s in range(len(y)))
+            for i in range(lo, hi)
+        ]
+        picks.append(lo + int(np.argmax(areas)))
+    return picks + [n - 1]
+
+
+@pytest.mark.parametrize("n,max_points,n_series", [(50, 10, 1), (2609, 800, 2), (1000, 30, 1), (997, 101, 3)])
+def test_lttb_matches_a_textbook_walk(n, max_points, n_series):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.integers(1, 4, n)).astype(np.float64)
+    y = np.cumsum(rng.normal(0, 1, (n_series, n)), axis=1)
+    picked = analytics.lttb_indices(x, y if n_series > 1 else y[0], max_points)
+    assert picked.tolist() == _lttb_brute_force(x, y, max_points)
+
+
+def test_lttb_keeps_endpoints_and_requested_indices():
+    y = np.sin(np.arange(500) / 7.0)
+    picked = analytics.lttb_indices(np.arange(500), y, 40, keep=[3, 250, 251])
+    assert picked[0] == 0 and picked[-1] == 499
+    assert {3, 250, 251} <= set(picked.tolist())
+    assert np.all(np.diff(picked) > 0)
+    assert len(picked) <= 43
+    assert analytics.lttb_indices(np.arange(10), y[:10], 40).tolist() == list(range(10))
+    assert analytics.lttb_indices(np.arange(500), y, 2, keep=[7]).tolist() == [0, 7, 499]
+
+
+def test_alignment_kernel_carries_values_and_rebases_from_a_baseline():
+    axis = analytics.session_axis(np.datetime64("2024-01-04"), np.datetime64("2024-01-10"))
+    assert axis.astype(str).tolist() == ["2024-01-04", "2024-01-05", "2024-01-08", "2024-01-09", "2024-01-10"]
+
+    quotes, prices = analytics.dated_series(
+        {"2024-01-10": 12.0, "2024-01-05": 10.0, "2024-01-06": 99.0, "2024-01-08": 0.0, "2024-01-03": 8.0},
+        positive=True,
+    )
+    assert quotes.astype(str).tolist() == ["2024-01-03", "2024-01-05", "2024-01-06", "2024-01-08", "2024-01-10"]
+    assert analytics.first_on_or_after(quotes, prices, np.datetime64("2024-01-07")) == 12.0
+    assert analytics.first_on_or_after(quotes, prices, np.datetime64("2024-01-11")) is None
+
+    # Off-axis dates (before the axis, a Saturday) are ignored; a zero quote is a gap
+    filled, last = analytics.observed_index(axis, quotes, prices)
+    np.testing.assert_array_equal(filled, [np.nan, 10.0, 10.0, 10.0, 12.0])
+    assert last.tolist() == [-1, 1, 1, 1, 4]
+    # From 2024-01-08 on: flat until something is observed since the baseline, then value / base
+    np.testing.assert_allclose(analytics.rebase(filled, last, 2, 10.0), [1.0, 1.0, 1.2])
+
+
+def test_observed_index_keeps_the_first_of_repeated_dates_and_zero_values():
+    axis = analytics.session_axis(np.datetime64("2024-01-01"), np.datetime64("2024-01-03"))
+    filled, last = analytics.observed_index(axis, dates("2024-01-02", "2024-01-02", "2024-01-03"), np.array([5.0, 6.0, 0.0]))
+    np.testing.assert_array_equal(filled, [np.nan, 5.0, 0.0])
+    assert last.tolist() == [-1, 1, 2]
+
+
+def test_normalize_uses_given_bases_and_drops_unusable_series():
+    axis = analytics.session_axis(np.datetime64("2024-01-01"), np.datetime64("2024-01-05"))
+    series = {
+        "a": (dates("2024-01-01", "2024-01-03", "2024-01-05"), np.array([1.0, 2.0, 4.0])),
+        "b": (dates("2024-01-02", "2024-01-04"), np.array([10.0, 5.0])),
+        "c": (dates("2024-01-01"), np.array([3.0])),
+    }
+    out = analytics.normalize(axis, series, np.datetime64("2024-01-02"), bases={"b": 20.0})
+    np.testing.assert_allclose(out["a"], [1.0, 1.0, 1.0, 2.0])  # base: first value on or after 01-02
+    np.testing.assert_allclose(out["b"], [0.5, 0.5, 0.25, 0.25])
+    assert "c" not in out  # nothing on or after the baseline
@@ -0,0 +1,134 @@
+"""Header detection, column mapping, date inference and skipped rows in broker_parsers.py."""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from broker_parsers import (
+    PARSERS,
+    BrokerParser,
+    TransactionStream,
+    detect_parser,
+    infer_date_format,
+    normalize_date_column,
+    parse_date_column,
+    parse_number_column,
+    register_parser,
+)
+
+SCHWAB_HEADER = "Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount\n"
+
+
+def stream(text: str, chunk_rows: int = 5000) -> TransactionStream:
+    return TransactionStream(io.BytesIO(text.encode()), chunk_rows)
+
+
+def parse_all(text: str, chunk_rows: int = 5000):
+    batches, skipped = [], []
+    for batch, rows in stream(text, chunk_rows):
+        batches.append(batch)
+        skipped.extend(rows)
+    return [d for b in batches for d in b.date], skipped
+
+
+def test_as_of_dates_keep_the_trade_date():
+    values = pd.Series([" 01/05/2024 as of 01/03/2024 ", "01/04/2024", None])
+    assert normalize_date_column(values).tolist() == ["01/03/2024", "01/04/2024", ""]
+
+
+def test_format_is_inferred_from_the_column():
+    assert infer_date_format(pd.Series(["01/31/2024", "02/01/2024"])) == "%m/%d/%Y"
+    assert infer_date_format(pd.Series(["2024-01-31", "2024-02-01"])) == "%Y-%m-%d"
+    assert infer_date_format(pd.Series(["01/31/24", "02/01/24"])) == "%m/%d/%y"
+    # The format that parses most of the sample wins over one stray value
+    assert infer_date_format(pd.Series(["2024-01-31", "01/31/2024", "2024-02-01"])) == "%Y-%m-%d"
+    assert infer_date_format(pd.Series(["", ""])) is None
+
+
+def test_unparseable_dates_are_flagged_not_defaulted():
+    dates, bad = parse_date_column(pd.Series(["01/31/2024", "Pending", "13/45/2024"]))
+    assert dates[0] == "2024-01-31"
+    assert bad.tolist() == [False, True, True]
+    assert dates[bad].isna().all()
+
+
+def test_skipped_rows_report_csv_line_and_value():
+    text = SCHWAB_HEADER + "\n".join([
+        "01/09/2024,Buy,AAPL,APPLE INC,20,$185.00,,-$3700.00",
+        "Pending,Buy,MSFT,MICROSOFT CORP,10,$380.00,,-$3800.00",
+        "01/11/2024,Sell,AAPL,APPLE INC,5,$190.00,,$950.00",
+    ]) + "\n"
+    dates, skipped = parse_all(text)
+    assert dates == ["2024-01-09", "2024-01-11"]
+    assert skipped == [{"row": 3, "value": "Pending"}]
+
+
+def test_format_inferred_once_per_file_and_line_numbers_span_chunks():
+    rows = [f"01/{day:02d}/2024,Buy,AAPL,APPLE INC,1,$1.00,,-$1.00" for day in range(2, 8)]
+    rows.append("2024-01-08,Buy,AAPL,APPLE INC,1,$1.00,,-$1.00")  # another format, in a later chunk
+    dates, skipped = parse_all(SCHWAB_HEADER + "\n".join(rows) + "\n", chunk_rows=3)
+    assert dates == [f"2024-01-{day:02d}" for day in range(2, 8)]
+    assert skipped == [{"row": 8, "value": "2024-01-08"}]
+
+
+FIDELITY_EXPORT = """Brokerage
+
+Run Date,Action,Symbol,Description,Type,Quantity,Price ($),Commission ($),Fees ($),Accrued Interest ($),Amount ($),Settlement Date
+03/15/2024,YOU BOUGHT APPLE INC (AAPL) (Cash),AAPL,APPLE INC,Cash,10,170.00,,,,"-1,700.00",03/18/2024
+03/20/2024,DIVIDEND RECEIVED,MSFT,MICROSOFT,Cash,,,,,,12.50,
+01/10/2024,ELECTRONIC FUNDS TRANSFER RECEIVED (Cash),,No Description,Cash,,,,,,5000.00,
+
+"Disclaimer text"
+"""
+
+
+def test_headers_are_matched_to_their_broker():
+    assert detect_parser(("Run Date", "Action", "Symbol", "Quantity")).parser.name == "fidelity"
+    assert detect_parser(tuple(SCHWAB_HEADER.strip().split(","))).parser.name == "schwab"
+    # Schwab needs an amount column; a bare Date/Action/Symbol header is not enough
+    assert detect_parser(("Date", "Action", "Symbol")) is None
+
+
+def test_fidelity_preamble_is_skipped_and_settlement_date_preferred():
+    s = stream(FIDELITY_EXPORT)
+    assert s.source == "fidelity"
+    batch = next(iter(s))[0]
+    # Rows without a symbol (cash transfers) are dropped for Fidelity
+    assert batch.records() == [
+        {"date": "2024-03-18", "action": "YOU BOUGHT APPLE INC (AAPL) (Cash)", "symbol": "AAPL",
+         "quantity": 10.0, "price": 170.0, "amount": -1700.0},
+        {"date": "2024-03-20", "action": "DIVIDEND RECEIVED", "symbol": "MSFT",
+         "quantity": 0.0, "price": 0.0, "amount": 12.5},
+    ]
+
+
+def test_unknown_format_has_no_mapping():
+    s = stream("when,what\n2024-01-01,x\n")
+    assert s.mapping is None
+    assert s.source == "unknown"
+    assert list(s) == []
+
+
+def test_numbers_accept_currency_and_parentheses():
+    values = pd.Series(["$1,234.50", "(12.00)", "+3", "", None, "n/a"])
+    np.testing.assert_array_equal(parse_number_column(values), [1234.5, -12.0, 3.0, 0.0, 0.0, 0.0])
+
+
+def test_registered_brokers_are_detected():
+    broker = BrokerParser(
+        name="vanguard", label="Vanguard", required=("Trade Date", "Transaction Type"),
+        date=("Trade Date",), action=("Transaction Type",), symbol=("Symbol",), quantity=("Shares",),
+        amount=("Net Amount",),
+    )
+    register_parser(broker)
+    try:
+        text = "Trade Date,Transaction Type,Symbol,Shares,Net Amount\n2024-02-01,Buy,VTI,3,-690.00\n"
+        s = stream(text)
+        assert s.source == "vanguard"
+        assert next(iter(s))[0].records()[0] == {
+            "date": "2024-02-01", "action": "Buy", "symbol": "VTI", "quantity": 3.0, "price": 0.0, "amount": -690.0,
+        }
+    finally:
+        PARSERS.remove(broker)
+        detect_parser.cache_clear()
@@ -0,0 +1,50 @@
+"""_bulk_insert round trips on SQLite (Core executemany) and on Postgres (COPY FROM STDIN)."""
+
+import pytest
+from sqlmodel import Session, select
+
+# No user has a negative id, and every test runs in a transaction that is rolled back
+USER_ID = -1
+
+ROWS = [
+    {"date": "2024-01-02", "action": "YOU BOUGHT APPLE INC (AAPL) (Cash)", "symbol": "AAPL", "quantity": 10.0,
+     "price": 170.25, "amount": -1702.5, "account": "taxable", "row_hash": "0123456789abcdef0123456789abcdef01234567"},
+    # NULLs next to values that COPY's text format has to escape: tab, newline, backslash, its own \N marker
+    {"date": "2024-01-03", "action": 'Tfr BANK\t"memo", née', "symbol": "", "quantity": 0.0,
+     "price": 0.0, "amount": 5000.0, "account": None, "row_hash": None},
+    {"date": "2024-01-04", "action": "Sell", "symbol": "BRK.B", "quantity": 1e-06,
+     "price": 412345.678901, "amount": 0.41, "account": "ira\\roth\nIRA", "row_hash": None},
+    {"date": "2024-01-05", "action": "Buy", "symbol": "VTI", "quantity": 2.5,
+     "price": 250.0, "amount": -625.0, "account": "\\N", "row_hash": ""},
+]
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def session(request, main, client):
+    engine = main.engine if request.param == "sqlite" else request.getfixturevalue("postgres_engine")
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        if request.param == "postgres":
+            # Postgres DDL is transactional, so tables this creates are rolled back too
+            main.SQLModel.metadata.create_all(conn)
+        try:
+            with Session(bind=conn) as session:
+                yield session
+        finally:
+            transaction.rollback()
+
+
+def test_bulk_insert_round_trips_values_and_nulls(main, session):
+    t = main.TransactionRecord
+    assert main._bulk_insert(session, t, [{"user_id": USER_ID, **row} for row in ROWS]) == len(ROWS)
+    stored = session.exec(
+        select(t.date, t.action, t.symbol, t.quantity, t.price, t.amount, t.account, t.row_hash)
+        .where(t.user_id == USER_ID)
+        .order_by(t.date)
+    ).all()
+    assert [dict(row._mapping) for row in stored] == ROWS
+    assert session.exec(select(t.id).where((t.user_id == USER_ID) & (t.account == None))).all()  # noqa: E711
+
+
+def test_bulk_insert_of_nothing_writes_nothing(main, session):
+    assert main._bulk_insert(session, main.TransactionRecord, []) == 0
@@ -0,0 +1,55 @@
+"""The SPY comparison index rebases to exactly the server's /api/comparison/spy series."""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+FIDELITY_CSV = """Run Date,Action,Symbol,Description,Type,Quantity,Price ($),Commission ($),Fees ($),Accrued Interest ($),Amount ($),Settlement Date
+03/15/2024,YOU BOUGHT APPLE INC (AAPL) (Cash),AAPL,APPLE INC,Cash,10,170.00,,,,-1700.00,03/18/2024
+02/01/2024,YOU BOUGHT MICROSOFT (MSFT) (Cash),MSFT,MICROSOFT,Cash,5,400.00,,,,-2000.00,02/05/2024
+"""
+
+
+@pytest.fixture
+def index(client, auth_headers):
+    response = client.post("/api/upload", files={"file": ("fidelity.csv", FIDELITY_CSV.encode(), "text/csv")}, headers=auth_headers)
+    assert response.status_code == 200
+    return client.get("/api/comparison/spy/index", headers=auth_headers).json()
+
+
+def _rebase_locally(index: dict, baseline: str) -> dict[str, np.ndarray]:
+    """What a client does with the index: level[t] / level[b], a null level counting as 1."""
+    b = index["dates"].index(baseline)
+    out = {}
+    for name in ("portfolio", "spy"):
+        levels = np.array([1.0 if v is None else v for v in index[name]])
+        out[name] = levels[b:] / levels[b] * 10000
+    return out
+
+
+def test_index_levels_carry_over_market_holidays(index):
+    spy = index["spy"]
+    quoted = [i for i, v in enumerate(spy) if v is not None]
+    assert quoted and quoted[-1] == len(spy) - 1
+    # Every weekday from the first quote on has a level, holidays included
+    assert all(v is not None for v in spy[quoted[0]:])
+
+
+def test_local_rebase_matches_server_at_every_baseline(client, auth_headers, index):
+    start = index["dates"].index(index["portfolio_start"])
+    baselines = index["dates"][max(0, start - 25):]
+    holidays = 0
+    for baseline in baselines:
+        holidays += date.fromisoformat(baseline).toordinal() % 19 == 0  # see fake_stock_data
+        body = client.get(
+            "/api/comparison/spy",
+            params={"baseline_date": baseline, "max_points": 10000, "format": "columnar"},
+            headers=auth_headers,
+        ).json()
+        comparison = body["comparison"]
+        assert comparison["dates"][0] == baseline
+        local = _rebase_locally(index, baseline)
+        for name in ("portfolio", "spy"):
+            np.testing.assert_allclose(comparison[name], local[name], atol=0.006, err_msg=f"{name} from {baseline}")
+    assert holidays > 10
@@ -0,0 +1,99 @@
+"""Lot replay, average and FIFO cost basis, and realized P&L in lots.py, and the deposit tranches built on it."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from lots import LotBook, Position
+
+
+def tx(date, action, symbol, quantity, amount):
+    return SimpleNamespace(date=date, action=action, symbol=symbol, quantity=quantity, amount=amount)
+
+
+def test_average_cost_pools_buys():
+    book = LotBook.from_transactions([
+        tx("2024-01-02", "YOU BOUGHT", "AAPL", 10, -1000.0),
+        tx("2024-02-01", "YOU BOUGHT", "AAPL", 10, -2000.0),
+        tx("2024-03-01", "YOU SOLD", "AAPL", -5, 1000.0),
+    ])
+    position = book.positions["AAPL"]
+    assert position.shares == pytest.approx(15)
+    assert position.cost == pytest.approx(2250.0)
+    assert book.realized_pnl() == pytest.approx(1000.0 - 5 * 150.0)
+    assert book.cost_basis() == {"AAPL": {"total_cost": pytest.approx(2250.0), "total_shares": pytest.approx(15)}}
+
+
+def test_fifo_closes_oldest_lots_first():
+    book = LotBook.from_transactions([
+        tx("2024-01-02", "Buy", "MSFT", 10, -1000.0),
+        tx("2024-02-01", "Buy", "MSFT", 10, -2000.0),
+        tx("2024-03-01", "Sell", "MSFT", 15, 3000.0),
+    ], method="fifo")
+    position = book.positions["MSFT"]
+    assert [(lot.date, lot.shares, lot.cost_per_share) for lot in position.lots] == [("2024-02-01", 5, 200.0)]
+    assert position.cost == pytest.approx(1000.0)
+    assert book.realized_pnl() == pytest.approx(3000.0 - (1000.0 + 5 * 200.0))
+
+
+def test_fifo_replays_same_day_buy_before_sell_in_newest_first_export():
+    # Newest-first export: the day's sell is listed above the buy it closes
+    rows = [
+        tx("2024-03-01", "YOU SOLD", "NVDA", -4, 1200.0),
+        tx("2024-03-01", "YOU BOUGHT", "NVDA", 4, -1000.0),
+        tx("2024-01-02", "YOU BOUGHT", "NVDA", 2, -400.0),
+    ]
+    book = LotBook.from_transactions(rows, method="fifo")
+    position = book.positions["NVDA"]
+    # The sell closes the January lot and two shares of the same-day lot
+    assert book.realized_pnl() == pytest.approx(1200.0 - (400.0 + 2 * 250.0))
+    assert [(lot.date, lot.shares) for lot in position.lots] == [("2024-03-01", 2)]
+    assert position.cost == pytest.approx(500.0)
+    assert LotBook.from_transactions(list(reversed(rows)), method="fifo").realized_pnl() == pytest.approx(book.realized_pnl())
+
+
+def test_sell_reports_pnl_per_tagged_lot():
+    position = Position("AAPL")
+    position.buy("2024-01-02", 10, 1000.0, pooled=False, tag="january")
+    position.buy("2024-02-01", 10, 2000.0, pooled=False, tag="february")
+    closed = position.sell(15, 3000.0)
+    assert [(lot.tag, pnl) for lot, pnl in closed] == [("january", pytest.approx(1000.0)), ("february", pytest.approx(0.0))]
+    assert sum(pnl for _, pnl in closed) == pytest.approx(position.realized_pnl)
+    assert [(lot.tag, lot.shares) for lot in position.lots] == [("february", 5)]
+
+
+def test_deposit_tranches_split_buys_and_attribute_sells(main):
+    latest = SimpleNamespace(date="2024-06-28", positions_json='[{"symbol": "AAPL", "price": 220.0}]')
+    result = main._deposit_averaged_from_rows(latest, [
+        tx("2024-01-02", "MoneyLink Transfer", "", 0, 1000.0),
+        tx("2024-02-01", "MoneyLink Transfer", "", 0, 1000.0),
+        # Funded half by each deposit, as two lots of 5 shares
+        tx("2024-02-05", "Buy", "AAPL", 10, -2000.0),
+        # Closes the first deposit's lot
+        tx("2024-03-01", "Sell", "AAPL", 5, 1500.0),
+    ])
+    first, second = result["periods"]
+    assert (first["invested"], first["realized_pnl"], first["unrealized_pnl"]) == (1000.0, 500.0, 0.0)
+    assert (second["invested"], second["realized_pnl"], second["unrealized_pnl"]) == (1000.0, 0.0, 100.0)
+    assert result["weighted_avg_return_pct"] == pytest.approx(30.0)
+
+
+def test_selling_everything_resets_the_position():
+    book = LotBook.from_transactions([
+        tx("2024-01-02", "Buy", "SPY", 3, -1500.0),
+        tx("2024-01-05", "Sell", "SPY", 3, 1560.0),
+    ], method="fifo")
+    assert book.positions["SPY"].shares == 0.0
+    assert book.positions["SPY"].cost == 0.0
+    assert book.summary({"SPY": 530.0})["SPY"]["unrealized_pnl"] == 0.0
+
+
+def test_unrealized_pnl_uses_current_prices():
+    book = LotBook.from_transactions([tx("2024-01-02", "REINVESTMENT", "VTI", 2, -400.0)])
+    assert book.unrealized_pnl({"VTI": 250.0}) == pytest.approx(100.0)
+    assert book.unrealized_pnl({}) == 0.0
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        LotBook("lifo")
@@ -0,0 +1,104 @@
+"""Versioned analytics memo and its shared SQLite store in memo.py."""
+
+import pytest
+
+from memo import SQLiteMemoStore, VersionedMemo
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteMemoStore(str(tmp_path / "memo.db"))
+
+
+def test_hit_after_put_and_miss_on_new_version():
+    memo = VersionedMemo(namespace="db1")
+    memo.put(7, 1, "twr", ("2024-01-01",), {"twr": 0.1})
+    assert memo.get(7, 1, "twr", ("2024-01-01",)) == (True, {"twr": 0.1})
+    assert memo.get(7, 2, "twr", ("2024-01-01",)) == (False, None)
+    assert memo.get(7, 1, "twr", ("2024-02-01",)) == (False, None)
+
+
+def test_users_without_a_version_are_not_memoized():
+    memo = VersionedMemo()
+    memo.put(7, None, "twr", (), {"twr": 0.1})
+    assert memo.get(7, None, "twr", ()) == (False, None)
+    assert memo.stats()["entries"] == 0
+
+
+def test_shared_values_are_copied():
+    memo = VersionedMemo()
+    value = {"series": [1, 2]}
+    memo.put(1, 1, "f", (), value)
+    value["series"].append(3)
+    _, cached = memo.get(1, 1, "f", ())
+    cached["series"].append(4)
+    assert memo.get(1, 1, "f", ()) == (True, {"series": [1, 2]})
+
+
+def test_unshared_values_stay_in_process(store):
+    memo = VersionedMemo(store=store)
+    book = object()
+    memo.put(1, 1, "lots", (), book, shared=False)
+    assert memo.get(1, 1, "lots", ())[1] is book
+    assert VersionedMemo(store=store).get(1, 1, "lots", ()) == (False, None)
+
+
+def test_shared_store_serves_other_workers_of_the_same_database(store):
+    VersionedMemo(store=store, namespace="db1").put(3, 1, "risk", ("SPY",), {"sharpe": 1.2})
+    worker = VersionedMemo(store=store, namespace="db1")
+    assert worker.get(3, 1, "risk", ("SPY",)) == (True, {"sharpe": 1.2})
+    assert worker.stats()["shared_hits"] == 1
+
+
+def test_recreated_database_does_not_see_old_entries(store):
+    memo = VersionedMemo(store=store, namespace="old-db")
+    memo.put(3, 1, "risk", ("SPY",), {"sharpe": 1.2})
+    # Same user id and data version, but computed against a database that no longer exists
+    memo.bind("new-db")
+    assert memo.get(3, 1, "risk", ("SPY",)) == (False, None)
+    assert VersionedMemo(store=store, namespace="new-db").get(3, 1, "risk", ("SPY",)) == (False, None)
+
+
+def test_lru_evicts_oldest_entries():
+    memo = VersionedMemo(maxsize=2)
+    for user_id in (1, 2, 3):
+        memo.put(user_id, 1, "f", (), user_id)
+    assert memo.get(1, 1, "f", ()) == (False, None)
+    assert memo.get(3, 1, "f", ()) == (True, 3)
+    assert memo.evictions == 1
+
+
+def test_stats_count_hits_and_misses_per_function():
+    memo = VersionedMemo()
+    memo.get(1, 1, "f", ())
+    memo.put(1, 1, "f", (), 1)
+    memo.get(1, 1, "f", ())
+    stats = memo.stats()
+    assert stats["functions"]["f"] == {"hits": 1, "shared_hits": 0, "misses": 1, "lookups": 2, "hit_rate": 0.5}
+
+
+def test_store_prune_caps_rows(tmp_path):
+    store = SQLiteMemoStore(str(tmp_path / "memo.db"), max_rows=2)
+    for i in range(4):
+        store.set(f"k{i}", 1, i)
+    assert store.prune() == 2
+    assert sum(store.get(f"k{i}") == i for i in range(4)) == 2
+
+
+def test_app_binds_memo_to_its_database_identity(client, main):
+    from sqlmodel import Session, select
+
+    with Session(main.engine) as session:
+        identity = session.exec(select(main.DatabaseIdentity)).one()
+    assert main.analytics_memo.namespace == identity.id
+
+
+def test_cache_metrics_are_internal_only(client, main, auth_headers, monkeypatch):
+    assert client.get("/api/metrics/cache", headers=auth_headers).status_code == 404
+    # Off unless a token is configured, and a logged-in user is not enough
+    assert client.get("/internal/metrics/cache", headers=auth_headers).status_code == 404
+    monkeypatch.setattr(main, "METRICS_TOKEN", "s3cret")
+    assert client.get("/internal/metrics/cache", headers={**auth_headers, "X-Metrics-Token": "guess"}).status_code == 404
+    response = client.get("/internal/metrics/cache", headers={"X-Metrics-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "hit_rate" in response.json()
@@ -0,0 +1,48 @@
+"""Chart series endpoints answer in columnar JSON, and in MessagePack for clients that ask for it."""
+
+import msgpack
+import pytest
+
+import responses
+
+SCHWAB_CSV = """Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount
+01/08/2024,MoneyLink Transfer,,Tfr BANK,,,,$10000.00
+01/09/2024,Buy,AAPL,APPLE INC,20,$185.00,,-$3700.00
+03/11/2024,Buy,MSFT,MICROSOFT CORP,10,$380.00,,-$3800.00
+"""
+
+SERIES_PATHS = [
+    "/api/comparison/spy?format=columnar",
+    "/api/portfolio/history?format=columnar",
+    "/api/portfolio/drawdown?format=columnar",
+]
+
+MSGPACK = {"Accept": responses.MSGPACK_MEDIA_TYPE}
+
+
+@pytest.fixture
+def headers(client, auth_headers):
+    response = client.post("/api/upload", files={"file": ("schwab.csv", SCHWAB_CSV.encode(), "text/csv")}, headers=auth_headers)
+    assert response.status_code == 200
+    return auth_headers
+
+
+@pytest.mark.parametrize("path", SERIES_PATHS)
+def test_msgpack_matches_columnar_json(client, headers, path):
+    as_json = client.get(path, headers=headers)
+    as_msgpack = client.get(path, headers={**headers, **MSGPACK})
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_msgpack.headers["content-type"] == responses.MSGPACK_MEDIA_TYPE
+    assert "Accept" in as_msgpack.headers["vary"].split(", ")
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+
+def test_msgpack_falls_back_to_json_when_not_installed(client, headers, monkeypatch):
+    monkeypatch.setattr(responses, "msgpack", None)
+    response = client.get(SERIES_PATHS[0], headers={**headers, **MSGPACK})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["comparison"]["dates"]
+
+
+def test_unknown_format_is_rejected(client, headers):
+    assert client.get("/api/comparison/spy?format=csv", headers=headers).status_code == 400
@@ -0,0 +1,65 @@
+"""The async return helpers query the async connection and agree with their sync counterparts."""
+
+import asyncio
+
+import pytest
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+SCHWAB_CSV = """Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount
+01/08/2024,MoneyLink Transfer,,Tfr BANK,,,,$10000.00
+01/09/2024,Buy,AAPL,APPLE INC,20,$185.00,,-$3700.00
+01/10/2024,Buy,MSFT,MICROSOFT CORP,10,$380.00,,-$3800.00
+06/03/2024,MoneyLink Transfer,,Tfr BANK,,,,$2500.00
+06/04/2024,Buy,SPY,SPDR S&P 500,4,$530.00,,-$2120.00
+09/16/2024,MoneyLink Transfer,,Tfr BANK,,,,-$1000.00
+"""
+
+WINDOWS = [(None, None), ("2024-03-01", "2024-12-31"), ("2024-06-01", None), ("2030-01-01", None)]
+
+
+@pytest.fixture
+def user_id(client, auth_headers):
+    response = client.post("/api/upload", files={"file": ("schwab.csv", SCHWAB_CSV.encode(), "text/csv")}, headers=auth_headers)
+    assert response.status_code == 200
+    return client.get("/api/me", headers=auth_headers).json()["id"]
+
+
+def _run_async(main, fn, *args):
+    async def run():
+        async with AsyncSession(main.async_engine, expire_on_commit=False) as session:
+            return await fn(session, *args)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("start_date,end_date", WINDOWS)
+def test_time_weighted_return_async_matches_sync(main, user_id, start_date, end_date):
+    main.analytics_memo.clear()
+    with Session(main.engine) as session:
+        expected = main._compute_time_weighted_return.__wrapped__(session, user_id, start_date, end_date)
+    assert _run_async(main, main._compute_time_weighted_return_async.__wrapped__, user_id, start_date, end_date) == expected
+    assert expected["days"] > 0
+
+
+@pytest.mark.parametrize("start_date,end_date", WINDOWS)
+def test_money_weighted_return_async_matches_sync(main, user_id, start_date, end_date):
+    with Session(main.engine) as session:
+        expected = main._compute_money_weighted_returns(session, [user_id], start_date, end_date)[user_id]
+    assert _run_async(main, main._compute_money_weighted_return_async.__wrapped__, user_id, start_date, end_date) == expected
+    assert expected["xirr"] is not None
+
+
+def test_performance_serves_money_weighted_return(client, main, auth_headers, user_id):
+    body = client.get("/api/performance", headers=auth_headers).json()
+    with Session(main.engine) as session:
+        assert body["money_weighted"] == main._compute_money_weighted_returns(session, [user_id])[user_id]
+    assert body["money_weighted"]["flows"] == 2
+
+
+@pytest.mark.parametrize("start_date,end_date", WINDOWS)
+def test_batch_time_weighted_returns_match_per_user(main, user_id, start_date, end_date):
+    no_history = user_id + 10_000
+    with Session(main.engine) as session:
+        batch = main._compute_time_weighted_returns(session, [user_id, no_history], start_date, end_date)
+        assert batch[user_id] == main._compute_time_weighted_return.__wrapped__(session, user_id, start_date, end_date)
+        assert batch[no_history] == main._twr_result(0.0, 0)
@@ -0,0 +1,172 @@
+"""Upload ledger and row de-duplication in /api/upload."""
+
+import pytest
+
+FIDELITY_CSV = """Brokerage
+
+Run Date,Action,Symbol,Description,Type,Quantity,Price ($),Commission ($),Fees ($),Accrued Interest ($),Amount ($),Settlement Date
+03/15/2024,YOU BOUGHT APPLE INC (AAPL) (Cash),AAPL,APPLE INC,Cash,10,170.00,,,,-1700.00,03/18/2024
+02/01/2024,YOU BOUGHT MICROSOFT (MSFT) (Cash),MSFT,MICROSOFT,Cash,5,400.00,,,,-2000.00,02/05/2024
+01/10/2024,ELECTRONIC FUNDS TRANSFER RECEIVED (Cash),,No Description,Cash,,,,,,5000.00,
+
+"Disclaimer text"
+"""
+
+EXTRA_ROW = "04/01/2024,YOU BOUGHT NVIDIA CORP (NVDA) (Cash),NVDA,NVIDIA CORP,Cash,2,900.00,,,,-1800.00,04/03/2024\n"
+
+
+def _with_extra_row(csv: str) -> str:
+    head, rows = csv.split("Settlement Date\n", 1)
+    return f"{head}Settlement Date\n{EXTRA_ROW}{rows}"
+
+
+def upload(client, headers, content: str, filename: str = "fidelity.csv"):
+    return client.post("/api/upload", files={"file": (filename, content.encode(), "text/csv")}, headers=headers)
+
+
+def test_identical_reupload_is_unchanged(client, auth_headers):
+    first = upload(client, auth_headers, FIDELITY_CSV)
+    assert first.status_code == 200
+    assert first.json()["rows_inserted"] == 2
+
+    again = upload(client, auth_headers, FIDELITY_CSV)
+    assert again.status_code == 200
+    assert again.json()["unchanged"] is True
+    assert again.json()["rows_inserted"] == 0
+
+
+def test_overlapping_export_inserts_only_new_rows(client, auth_headers):
+    upload(client, auth_headers, FIDELITY_CSV)
+    body = upload(client, auth_headers, _with_extra_row(FIDELITY_CSV)).json()
+    assert body["unchanged"] is False
+    assert body["transactions_count"] == 3
+    assert body["rows_inserted"] == 1
+    assert body["rebuild_from"] is not None
+
+
+def test_failed_rebuild_leaves_file_unrecorded(client, main, auth_headers, monkeypatch):
+    rebuild = main.rebuild_portfolio_history
+
+    def price_feed_down(positions, start_date):
+        raise RuntimeError("price feed down")
+
+    monkeypatch.setattr(main, "rebuild_portfolio_history", price_feed_down)
+    failed = upload(client, auth_headers, FIDELITY_CSV)
+    assert failed.status_code == 500
+    assert client.get("/api/portfolio/history", headers=auth_headers).json()["history"] == []
+
+    monkeypatch.setattr(main, "rebuild_portfolio_history", rebuild)
+    retry = upload(client, auth_headers, FIDELITY_CSV)
+    assert retry.status_code == 200
+    body = retry.json()
+    assert body["unchanged"] is False
+    assert body["rows_inserted"] == 2
+    assert body["rebuild_from"] == "2024-02-05"
+    assert client.get("/api/portfolio/history", headers=auth_headers).json()["history"]
+
+
+def _zip(files: dict[str, str]) -> bytes:
+    import io
+    import zipfile
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buf.getvalue()
+
+
+def test_failed_rebuild_leaves_every_archived_file_unrecorded(client, main, auth_headers, monkeypatch):
+    archive = _zip({"taxable.csv": FIDELITY_CSV, "ira.csv": _with_extra_row(FIDELITY_CSV)})
+    rebuild = main.rebuild_portfolio_history
+
+    def price_feed_down(positions, start_date):
+        raise RuntimeError("price feed down")
+
+    monkeypatch.setattr(main, "rebuild_portfolio_history", price_feed_down)
+    failed = client.post("/api/upload", files={"file": ("exports.zip", archive, "application/zip")}, headers=auth_headers)
+    assert failed.status_code == 500
+
+    monkeypatch.setattr(main, "rebuild_portfolio_history", rebuild)
+    # Each file on its own is still new, and so is the whole archive
+    single = upload(client, auth_headers, FIDELITY_CSV, filename="taxable.csv").json()
+    assert single["unchanged"] is False
+    assert single["rows_inserted"] == 2
+    retry = client.post("/api/upload", files={"file": ("exports.zip", archive, "application/zip")}, headers=auth_headers).json()
+    assert retry["unchanged"] is False
+    assert [f["unchanged"] for f in retry["files"]] == [False, True]
+    # taxable.csv is stored by now; every row of ira.csv is new to its account
+    assert retry["rows_inserted"] == 3
+
+
+def test_archive_streams_in_chunks(client, main, auth_headers, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_ROWS", 1)
+    archive = _zip({"taxable.csv": FIDELITY_CSV, "ira.csv": _with_extra_row(FIDELITY_CSV)})
+    body = client.post("/api/upload", files={"file": ("exports.zip", archive, "application/zip")}, headers=auth_headers).json()
+    assert [(f["transactions_count"], f["rows_inserted"]) for f in body["files"]] == [(2, 2), (3, 3)]
+    assert body["transactions_count"] == 5
+    assert body["date_range"] == {"start": "2024-02-05", "end": "2024-04-03"}
+    assert sorted(body["symbols_found"]) == ["AAPL", "MSFT", "NVDA"]
+
+
+def test_unparseable_dates_leave_nothing_recorded(client, auth_headers):
+    bad = FIDELITY_CSV.replace("03/18/2024", "someday").replace("02/05/2024", "never")
+    bad = bad.replace("03/15/2024", "someday").replace("02/01/2024", "never")
+    for _ in range(2):
+        response = upload(client, auth_headers, bad)
+        assert response.status_code == 400
+        assert [row["value"] for row in response.json()["detail"]["skipped_rows"]] == ["someday", "never"]
+
+
+def _stored_transactions(client, main, headers) -> list[tuple]:
+    from sqlmodel import Session, select
+
+    user_id = client.get("/api/me", headers=headers).json()["id"]
+    t = main.TransactionRecord
+    with Session(main.engine) as session:
+        rows = session.exec(
+            select(t.account, t.date, t.action, t.symbol, t.quantity, t.amount, t.row_hash).where(t.user_id == user_id)
+        ).all()
+    return sorted(tuple(row) for row in rows)
+
+
+def _register(client, email: str) -> dict:
+    client.post("/api/auth/register", json={"email": email, "password": "pw"})
+    token = client.post("/api/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("order", [["taxable.csv", "ira.csv"], ["ira.csv", "taxable.csv"]])
+def test_accounts_dedup_independently_of_upload_order(client, main, auth_headers, order):
+    # The funding transfer and the MSFT and AAPL buys appear in both accounts
+    files = {"taxable.csv": FIDELITY_CSV, "ira.csv": _with_extra_row(FIDELITY_CSV)}
+    for name in order:
+        assert upload(client, auth_headers, files[name], filename=name).status_code == 200
+    one_by_one = _stored_transactions(client, main, auth_headers)
+
+    together = _register(client, f"together-{order[0]}-{len(one_by_one)}@tickker-tests.com")
+    body = client.post("/api/upload", files={"file": ("exports.zip", _zip(files), "application/zip")}, headers=together).json()
+    assert body["rows_inserted"] == 5
+    assert [row[0] for row in one_by_one].count("ira") == 3
+    assert one_by_one == _stored_transactions(client, main, together)
+
+
+def test_occurrence_counter_spills_to_disk(main):
+    with main._OccurrenceCounter(max_keys=2) as counter:
+        assert counter.take(["a", "b", "a"]) == [0, 0, 1]
+        assert counter.take(["c"]) == [0]
+        assert counter.spill is not None and counter.counts == {}
+        assert counter.take(["a", "c", "d", "d"]) == [2, 1, 0, 1]
+    assert counter.spill is None
+
+
+def test_identical_rows_dedup_across_chunks_with_spilled_counts(client, main, auth_headers, monkeypatch):
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_ROWS", 1)
+    monkeypatch.setattr(main, "UPLOAD_OCCURRENCE_KEYS", 1)
+    # The same buy twice on one day is two transactions, not a duplicate
+    doubled = _with_extra_row(FIDELITY_CSV).replace(EXTRA_ROW, EXTRA_ROW * 2)
+    first = upload(client, auth_headers, doubled).json()
+    assert first["rows_inserted"] == 4
+    again = upload(client, auth_headers, _with_extra_row(doubled)).json()
+    assert again["transactions_count"] == 5
+    assert again["rows_inserted"] == 1
@@ -0,0 +1,121 @@
+"""Group weekly summary and leaderboard: contents, and a query count that does not grow with the group."""
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+WEEK = "2024-03-11"
+CLOSES = {
+    "AAPL": (170.0, 190.0),
+    "MSFT": (400.0, 380.0),
+    "NVDA": (900.0, 1000.0),
+    "PENY": (3.0, 2.0),
+    "SPY": (500.0, 505.0),
+}
+
+SCHWAB_CSV = """Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount
+01/08/2024,MoneyLink Transfer,,Tfr BANK,,,,$10000.00
+01/09/2024,Buy,AAPL,APPLE INC,20,$185.00,,-$3700.00
+02/12/2024,Buy,MSFT,MICROSOFT CORP,10,$380.00,,-$3800.00
+"""
+
+WEEKLY_CSV = """Date,Action,Symbol,Description,Quantity,Price,Fees & Comm,Amount
+03/12/2024,Buy,NVDA,NVIDIA CORP,1,$900.00,,-$900.00
+03/13/2024,Buy,PENY,PENNY CORP,100,$3.00,,-$300.00
+03/14/2024,Sell,AAPL,APPLE INC,5,$180.00,,$900.00
+"""
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _cached_closes(main, client):
+    # Weekly price changes read closes through the daily price cache, so no price feed is hit
+    with Session(main.engine) as session:
+        for symbol, (first, last) in CLOSES.items():
+            for day in range(11, 16):
+                close = first + (last - first) * (day - 11) / 4
+                session.add(main.PriceCacheDaily(symbol=symbol, date=f"2024-03-{day}", close=close))
+        session.commit()
+
+
+def _register(client, email: str) -> dict:
+    client.post("/api/auth/register", json={"email": email, "password": "pw"})
+    token = client.post("/api/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _group(client, name: str, size: int, weekly_uploads: int) -> tuple[int, list[dict]]:
+    members = [_register(client, f"{name}-{i}@tickker-tests.com") for i in range(size)]
+    for headers in members:
+        client.post("/api/upload", files={"file": ("schwab.csv", SCHWAB_CSV.encode(), "text/csv")}, headers=headers)
+    group = client.post("/api/groups", json={"name": name}, headers=members[0]).json()
+    for headers in members[1:]:
+        client.post("/api/groups/join", json={"code": group["code"]}, headers=headers)
+    for headers in members[:weekly_uploads]:
+        response = client.post(
+            f"/api/groups/{group['id']}/weekly/upload?week={WEEK}",
+            files={"file": ("week.csv", WEEKLY_CSV.encode(), "text/csv")},
+            headers=headers,
+        )
+        assert response.json()["count"] == 3
+    return group["id"], members
+
+
+def test_weekly_summary_and_badges(client):
+    group_id, members = _group(client, "weekly-summary", 3, 2)
+    body = client.get(f"/api/groups/{group_id}/weekly/summary?week={WEEK}", headers=members[0]).json()
+    assert sorted(body["symbol_changes"]) == ["AAPL", "NVDA", "PENY"]
+    assert body["symbol_changes"]["PENY"]["pct"] == pytest.approx(-33.3333)
+    assert len(body["users"]) == 2
+    for stats in body["users"].values():
+        assert [t["symbol"] for t in stats["trades"]] == ["NVDA", "PENY", "AAPL"]
+        assert stats["best"]["symbol"] == "AAPL"
+        badges = stats["weekly_badges"]
+        # Held AAPL and MSFT plus the week's trades
+        assert badges["biggest_gainer"]["symbol"] == "AAPL"
+        assert badges["biggest_loser"]["symbol"] == "PENY"
+        assert {"yolo", "paper_hands", "uh_oh"} <= {b["key"] for b in badges["badges"]}
+
+    leaderboard = client.get(f"/api/groups/{group_id}/weekly/leaderboard?week={WEEK}", headers=members[0]).json()["leaderboard"]
+    assert len(leaderboard) == 3
+    by_user = {entry["user_id"]: entry for entry in leaderboard}
+    for uid, stats in body["users"].items():
+        assert by_user[int(uid)]["weekly_badges"] == stats["weekly_badges"]
+    without_trades = [entry for uid, entry in by_user.items() if str(uid) not in body["users"]]
+    assert without_trades[0]["weekly_badges"]["biggest_loser"]["symbol"] == "MSFT"
+
+
+@pytest.mark.parametrize("path", ["summary", "leaderboard"])
+def test_weekly_query_count_is_flat(client, main, path):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    counts = []
+    for size in (2, 5):
+        group_id, members = _group(client, f"weekly-{path}-{size}", size, size)
+        event.listen(main.engine, "before_cursor_execute", count)
+        try:
+            statements.clear()
+            assert client.get(f"/api/groups/{group_id}/weekly/{path}?week={WEEK}", headers=members[0]).status_code == 200
+        finally:
+            event.remove(main.engine, "before_cursor_execute", count)
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_weekly_upload_inserts_per_chunk_and_caps_skipped_rows(client, main, monkeypatch):
+    group_id, members = _group(client, "weekly-chunks", 1, 0)
+    bad_rows = "".join(f"someday{i},Buy,AAPL,APPLE INC,1,$180.00,,-$180.00\n" for i in range(25))
+    inserts = []
+    bulk_insert = main._bulk_insert
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_ROWS", 2)
+    monkeypatch.setattr(main, "_bulk_insert", lambda session, model, rows: inserts.append(len(rows)) or bulk_insert(session, model, rows))
+    response = client.post(
+        f"/api/groups/{group_id}/weekly/upload?week={WEEK}",
+        files={"file": ("week.csv", (WEEKLY_CSV + bad_rows).encode(), "text/csv")},
+        headers=members[0],
+    ).json()
+    assert response["count"] == 3
+    assert len(response["skipped_rows"]) == 20
+    assert max(inserts) <= 2